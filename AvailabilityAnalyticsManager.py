@@ -0,0 +1,274 @@
+from array import array
+from collections.abc import Iterable
+
+import constants
+from AvailabilityStore import decode_timestamp, encode_timestamp
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class AvailabilityAnalyticsManager:
+    """
+    Class responsible for fleet-wide statistics over the device availability data.
+    The availability data is held in three typed arrays, one element per row, sorted by device and then by time:
+    the index of the device in 'device_ids' (int32), its status (bool) and its timestamp (int64 epoch microseconds).
+    Every statistic is computed with NumPy operations over those arrays or over the much smaller array of outages
+    derived from them, never with a Python loop over the rows. NumPy is optional: without it, creating an
+    AvailabilityAnalyticsManager raises ImportError.
+    A device's status holds from its row until its next row, so the statistics are time weighted and hold for data
+    recorded in both recording modes. An outage lasts from the first row where a device is down to the next row where
+    it is up; an outage still going on at the end of the data lasts until the last timestamp of the data.
+    Attributes:
+        device_ids (list[str]): The device IDs, indexed by the values of 'device_index'.
+        device_index (np.ndarray): The device of every row, as an index into 'device_ids'.
+        status (np.ndarray): The status of every row, True for active.
+        timestamps (np.ndarray): The timestamp of every row, in epoch microseconds.
+    Methods:
+        __init__(self, device_ids: list[str], device_index, status, timestamps) -> None:
+            Initialize AvailabilityAnalyticsManager with the availability data arrays.
+        __str__(self) -> str:
+            Return a string representation of the AvailabilityAnalyticsManager object.
+        __repr__(self) -> str:
+            Return a string representation that can be used to recreate the AvailabilityAnalyticsManager object.
+        from_rows(rows: Iterable[list], chunk_size: int) -> AvailabilityAnalyticsManager:
+            Load availability data rows into an AvailabilityAnalyticsManager.
+        get_device_uptime(self) -> np.ndarray:
+            Get the time-weighted uptime percentage of every device.
+        get_uptime_percentiles(self, percentiles: list[float]) -> np.ndarray:
+            Get percentiles of the uptime of the devices.
+        get_outages(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+            Get the device, start and duration of every outage.
+        get_outage_histogram(self, bins: list[float]) -> np.ndarray:
+            Count the outages by duration.
+        get_correlated_outages(self, window_seconds: float, min_devices: int) -> list[tuple[int, list[str]]]:
+            Find the time windows in which several devices went down.
+        print_fleet_report(self) -> None:
+            Print the fleet-wide statistics.
+    """
+
+    def __init__(self, device_ids: list[str], device_index, status, timestamps):
+        """
+        Initialize AvailabilityAnalyticsManager with the availability data arrays, sorting them by device and time.
+        Args:
+            device_ids (list[str]): The device IDs, indexed by the values of 'device_index'.
+            device_index (array-like): The device of every row, as an index into 'device_ids'.
+            status (array-like): The status of every row, 1 or True for active.
+            timestamps (array-like): The timestamp of every row, in epoch microseconds.
+        Raises:
+            ImportError: If NumPy is not installed.
+        """
+        if np is None:
+            raise ImportError("NumPy is required for the availability analytics")
+        self.device_ids: list[str] = device_ids
+        self.device_index = np.asarray(device_index, dtype=np.int32)
+        self.status = np.asarray(status, dtype=bool)
+        self.timestamps = np.asarray(timestamps, dtype=np.int64)
+        self._sort()
+
+    def __str__(self):
+        """
+        Return a string representation of the AvailabilityAnalyticsManager object.
+        Returns:
+            str: String representation of the object.
+        """
+        return f"AvailabilityAnalyticsManager with {len(self.timestamps)} rows of {len(self.device_ids)} devices"
+
+    def __repr__(self):
+        """
+        Return a string representation that can be used to recreate the AvailabilityAnalyticsManager object.
+        Returns:
+            str: String representation for recreation.
+        """
+        return (f"AvailabilityAnalyticsManager({self.device_ids!r}, {self.device_index!r}, {self.status!r}, "
+                f"{self.timestamps!r})")
+
+    @staticmethod
+    def from_rows(rows: Iterable[list], chunk_size: int = 1_000_000) -> "AvailabilityAnalyticsManager":
+        """
+        Load availability data rows, as yielded by DeviceAvailabilityDataManager.iter_device_availability_data, into
+        an AvailabilityAnalyticsManager. Rows are packed into typed arrays as they are read, so the rows are never
+        held in memory as Python lists.
+        Args:
+            rows (Iterable[list]): The [device_id, status, timestamp] rows.
+            chunk_size (int): The number of rows packed at a time.
+        Returns:
+            AvailabilityAnalyticsManager: The loaded availability data.
+        Raises:
+            ImportError: If NumPy is not installed.
+        """
+        if np is None:
+            raise ImportError("NumPy is required for the availability analytics")
+        device_indexes: dict[str, int] = {}
+        device_index_chunks, status_chunks, timestamp_chunks = [], [], []
+        device_index, status, timestamps = array("i"), array("b"), array("q")
+        for row in rows:
+            device_index.append(device_indexes.setdefault(row[0], len(device_indexes)))
+            status.append(int(row[1]))
+            timestamps.append(encode_timestamp(row[2]))
+            if len(timestamps) == chunk_size:
+                device_index_chunks.append(np.frombuffer(device_index, dtype=np.int32))
+                status_chunks.append(np.frombuffer(status, dtype=np.int8).astype(bool))
+                timestamp_chunks.append(np.frombuffer(timestamps, dtype=np.int64))
+                device_index, status, timestamps = array("i"), array("b"), array("q")
+        device_index_chunks.append(np.frombuffer(device_index, dtype=np.int32))
+        status_chunks.append(np.frombuffer(status, dtype=np.int8).astype(bool))
+        timestamp_chunks.append(np.frombuffer(timestamps, dtype=np.int64))
+        return AvailabilityAnalyticsManager(list(device_indexes), np.concatenate(device_index_chunks),
+                                            np.concatenate(status_chunks), np.concatenate(timestamp_chunks))
+
+    def _sort(self) -> None:
+        # The availability data is appended in time order, so a stable sort by device, which keeps the time order of
+        # the rows of every device, is usually enough.
+        if np.all(self.timestamps[1:] >= self.timestamps[:-1]):
+            order = np.argsort(self.device_index, kind="stable")
+        else:
+            order = np.lexsort((self.timestamps, self.device_index))
+        self.timestamps = self.timestamps[order]
+        self.device_index = self.device_index[order]
+        self.status = self.status[order]
+        del order
+        self.device_starts = np.flatnonzero(np.diff(self.device_index, prepend=-1))
+        self.end_timestamp: int = int(self.timestamps.max()) if len(self.timestamps) else 0
+
+    def get_outages(self):
+        """
+        Get every outage of every device.
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray]: The device index, the start timestamp (epoch microseconds) and
+                the duration (seconds) of every outage, sorted by device and start.
+        """
+        device_start = np.zeros(len(self.status), dtype=bool)
+        device_start[self.device_starts] = True
+        previous_status = np.empty_like(self.status)
+        previous_status[0:1] = True
+        previous_status[1:] = self.status[:-1]
+        outage_starts = np.flatnonzero(~self.status & (previous_status | device_start))
+        recoveries = np.flatnonzero(self.status & ~previous_status & ~device_start)
+        del device_start, previous_status
+        # The recovery of an outage is the next recovery row, if it belongs to the same device.
+        next_recoveries = np.searchsorted(recoveries, outage_starts)
+        recovered = next_recoveries < len(recoveries)
+        recovered[recovered] = (self.device_index[recoveries[next_recoveries[recovered]]]
+                                == self.device_index[outage_starts[recovered]])
+        end_timestamps = np.full(len(outage_starts), self.end_timestamp, dtype=np.int64)
+        end_timestamps[recovered] = self.timestamps[recoveries[next_recoveries[recovered]]]
+        start_timestamps = self.timestamps[outage_starts]
+        return (self.device_index[outage_starts], start_timestamps,
+                (end_timestamps - start_timestamps) / 1_000_000)
+
+    def get_device_uptime(self):
+        """
+        Get the time-weighted uptime of every device, from its first row to the last timestamp of the data.
+        Returns:
+            np.ndarray: The uptime percentage of every device, indexed like 'device_ids'.
+        """
+        outage_devices, _, outage_durations = self.get_outages()
+        device_count = len(self.device_ids)
+        down_seconds = np.bincount(outage_devices, weights=outage_durations, minlength=device_count)
+        first_timestamps = np.zeros(device_count, dtype=np.int64)
+        first_timestamps[self.device_index[self.device_starts]] = self.timestamps[self.device_starts]
+        total_seconds = (self.end_timestamp - first_timestamps) / 1_000_000
+        with np.errstate(invalid="ignore", divide="ignore"):
+            uptime = 100 * (1 - down_seconds / total_seconds)
+        # A device whose only rows are at the very end of the data is counted by its status.
+        device_lasts = np.append(self.device_starts, len(self.status))[1:] - 1
+        last_status = np.zeros(device_count, dtype=bool)
+        last_status[self.device_index[device_lasts]] = self.status[device_lasts]
+        return np.where(total_seconds > 0, uptime, 100.0 * last_status)
+
+    def get_uptime_percentiles(self, percentiles: list[float] = constants.analytics_uptime_percentiles):
+        """
+        Get percentiles of the uptime of the devices.
+        Args:
+            percentiles (list[float]): The percentiles to compute, between 0 and 100.
+        Returns:
+            np.ndarray: The uptime percentage at every percentile.
+        """
+        return np.percentile(self.get_device_uptime(), percentiles)
+
+    def get_outage_histogram(self, bins: list[float] = constants.analytics_outage_histogram_bins):
+        """
+        Count the outages by duration.
+        Args:
+            bins (list[float]): The edges of the duration bins in seconds, in increasing order. The last bin has no
+                upper edge.
+        Returns:
+            np.ndarray: The number of outages in every bin.
+        """
+        _, _, outage_durations = self.get_outages()
+        return np.bincount(np.searchsorted(bins, outage_durations, side="right") - 1, minlength=len(bins))
+
+    def get_correlated_outages(self, window_seconds: float = constants.ping_interval,
+                               min_devices: int | None = None) -> list[tuple[int, list[str]]]:
+        """
+        Find the time windows in which several devices went down, which points at a shared cause such as a switch or
+        an uplink rather than at the devices.
+        Args:
+            window_seconds (float): The length of the windows the outage starts are grouped in.
+            min_devices (int, optional): The number of devices that must go down in a window. Defaults to
+                'analytics_correlated_outage_fraction' of the devices, and at least 2.
+        Returns:
+            list[tuple[int, list[str]]]: The start of every such window in epoch microseconds with the IDs of the
+                devices that went down in it, largest first.
+        """
+        if min_devices is None:
+            min_devices = max(2, int(np.ceil(constants.analytics_correlated_outage_fraction * len(self.device_ids))))
+        outage_devices, outage_starts, _ = self.get_outages()
+        window_micros = int(window_seconds * 1_000_000)
+        windows = outage_starts // window_micros
+        # Each device counts once per window, however many times it went down in it.
+        keys = np.unique(windows * len(self.device_ids) + outage_devices)
+        windows, devices = np.divmod(keys, len(self.device_ids))
+        window_values, window_firsts, window_sizes = np.unique(windows, return_index=True, return_counts=True)
+        correlated = np.flatnonzero(window_sizes >= min_devices)
+        correlated = correlated[np.argsort(-window_sizes[correlated], kind="stable")]
+        return [(int(window_values[window]) * window_micros,
+                 [self.device_ids[device] for device in devices[window_firsts[window]:
+                                                                window_firsts[window] + window_sizes[window]]])
+                for window in correlated]
+
+    def print_fleet_report(self, correlated_outages_shown: int = 10) -> None:
+        """
+        Print the uptime percentiles of the devices, the histogram of the outage durations and the largest
+        correlated outages.
+        Args:
+            correlated_outages_shown (int): The number of correlated outages printed.
+        Returns:
+            None
+        """
+        print(f"{len(self.device_ids)} devices, {len(self.timestamps)} rows, from "
+              f"{decode_timestamp(int(self.timestamps.min()))} to {decode_timestamp(self.end_timestamp)}")
+        print()
+        row_template = "{:^20} {:^15}"
+        print(row_template.format("Uptime Percentile", "Uptime"))
+        percentiles = constants.analytics_uptime_percentiles
+        for percentile, uptime in zip(percentiles, self.get_uptime_percentiles(percentiles)):
+            print(row_template.format(f"p{percentile:g}", f"{uptime:.3f}%"))
+        print()
+        print(row_template.format("Outage Duration", "Outages"))
+        bins = constants.analytics_outage_histogram_bins
+        labels = [f">= {self._format_duration(low)}" if high is None else
+                  f"{self._format_duration(low)} - {self._format_duration(high)}"
+                  for low, high in zip(bins, bins[1:] + [None])]
+        for label, outages in zip(labels, self.get_outage_histogram(bins)):
+            print(row_template.format(label, int(outages)))
+        print()
+        correlated_outages = self.get_correlated_outages()
+        if not correlated_outages:
+            print("No correlated outages found")
+            return
+        print(f"{len(correlated_outages)} correlated outages, largest first:")
+        print("{:^30} {:^10} {}".format("Window Start", "Devices", "Device Ids"))
+        for window_start, device_ids in correlated_outages[:correlated_outages_shown]:
+            shown_ids = ", ".join(device_ids[:5]) + (", ..." if len(device_ids) > 5 else "")
+            print("{:^30} {:^10} {}".format(str(decode_timestamp(window_start)), len(device_ids), shown_ids))
+
+    @staticmethod
+    def _format_duration(seconds: float) -> str:
+        for unit, unit_seconds in (("d", 86400), ("h", 3600), ("m", 60)):
+            if seconds >= unit_seconds and seconds % unit_seconds == 0:
+                return f"{seconds // unit_seconds:g}{unit}"
+        return f"{seconds:g}s"
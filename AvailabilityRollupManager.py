@@ -0,0 +1,336 @@
+import sqlite3
+from collections.abc import Iterable
+from datetime import datetime, timedelta
+
+import constants
+from AvailabilityStore import decode_measurement, decode_timestamp, encode_timestamp
+
+
+class AvailabilityRollupManager:
+    """
+    Class responsible for the hourly and daily uptime rollups of every device.
+    Ping results are aggregated as they are saved, so an uptime report reads a few rollup rows per device and day
+    instead of scanning the availability data. For every device and every hour and day, a rollup holds the number of
+    samples, the number of samples where the device was up, the longest outage seen in that period, the sum and
+    count of the measured round-trip times, and the seconds observed and the seconds up in that period.
+    Every sample stands for the time until the next sample of its device, up to 'rollup_max_sample_interval' seconds
+    when the monitor stopped in between, and that time is split between the periods it spans. The uptime is the
+    share of the observed seconds where the device was up, so it stays right when devices are probed at uneven
+    intervals, such as down devices probed more often by the adaptive schedule. Rollups without observed seconds,
+    written before they were recorded, report the share of up samples instead.
+    Attributes:
+        rollups_filename (str): The filename of the SQLite database holding the rollups.
+        outages (dict[str, int | None] | None): For every device, the epoch microsecond timestamp of the first sample
+            of its current outage, or None if it is up. Loaded from the database on first use.
+        last_samples (dict[str, tuple[int, int]] | None): For every device, the epoch microsecond timestamp and the
+            status of its last sample, whose time is only known at the next one. Loaded from the database on first
+            use.
+    Methods:
+        __init__(self, rollups_filename: str) -> None:
+            Initialize AvailabilityRollupManager with the rollups database filename.
+        __str__(self) -> str:
+            Return a string representation of the AvailabilityRollupManager object.
+        __repr__(self) -> str:
+            Return a string representation that can be used to recreate the AvailabilityRollupManager object.
+        update_rollups(self, data: list[list]) -> None:
+            Add ping results to the rollups of their devices.
+        rebuild_rollups(self, rows: Iterable[list]) -> None:
+            Recompute all the rollups from the availability data.
+        get_rollups(self, device_id: str | None, period: str, start: datetime, end: datetime) -> list[list]:
+            Get the rollups of a period type between two times.
+        print_uptime_report(self, device_id: str, value: str | None) -> None:
+            Print the uptime of a device, or of every device, over a day or a range of days.
+        format_uptime(samples: int, up_samples: int, observed_seconds: float, up_seconds: float) -> str:
+            Format the uptime of rollups.
+    """
+
+    def __init__(self, rollups_filename: str = constants.device_availability_rollups_filename):
+        """
+        Initialize AvailabilityRollupManager with the rollups database filename, creating the tables if needed.
+        Args:
+            rollups_filename (str): The filename of the SQLite database holding the rollups.
+        """
+        self.rollups_filename: str = rollups_filename
+        self.outages: dict[str, int | None] | None = None
+        self.last_samples: dict[str, tuple[int, int]] | None = None
+        self.day_starts: dict[int, int] = {}
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute("CREATE TABLE IF NOT EXISTS rollups (device_id TEXT NOT NULL, "
+                                   "period TEXT NOT NULL, period_start INTEGER NOT NULL, samples INTEGER NOT NULL, "
+                                   "up_samples INTEGER NOT NULL, longest_outage REAL NOT NULL, "
+                                   "rtt_sum REAL NOT NULL, rtt_samples INTEGER NOT NULL, "
+                                   "observed_seconds REAL NOT NULL DEFAULT 0, up_seconds REAL NOT NULL DEFAULT 0, "
+                                   "PRIMARY KEY (device_id, period, period_start))")
+                columns = [column[1] for column in connection.execute("PRAGMA table_info(rollups)")]
+                if "observed_seconds" not in columns:
+                    # Rollups created before the observed time was recorded.
+                    connection.execute("ALTER TABLE rollups ADD COLUMN observed_seconds REAL NOT NULL DEFAULT 0")
+                    connection.execute("ALTER TABLE rollups ADD COLUMN up_seconds REAL NOT NULL DEFAULT 0")
+                connection.execute("CREATE INDEX IF NOT EXISTS rollups_period ON rollups (period, period_start)")
+                connection.execute("CREATE TABLE IF NOT EXISTS outages "
+                                   "(device_id TEXT PRIMARY KEY, down_since INTEGER)")
+                connection.execute("CREATE TABLE IF NOT EXISTS last_samples "
+                                   "(device_id TEXT PRIMARY KEY, timestamp INTEGER NOT NULL, status INTEGER NOT NULL)")
+        finally:
+            connection.close()
+
+    def __str__(self):
+        """
+        Return a string representation of the AvailabilityRollupManager object.
+        Returns:
+            str: String representation of the object.
+        """
+        return "AvailabilityRollupManager"
+
+    def __repr__(self):
+        """
+        Return a string representation that can be used to recreate the AvailabilityRollupManager object.
+        Returns:
+            str: String representation for recreation.
+        """
+        return f"AvailabilityRollupManager({self.rollups_filename!r})"
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.rollups_filename)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    def get_period_starts(self, timestamp_micros: int) -> tuple[int, int]:
+        """
+        Get the start of the local hour and of the local day a timestamp falls in.
+        Args:
+            timestamp_micros (int): The timestamp in epoch microseconds.
+        Returns:
+            tuple[int, int]: The epoch microsecond start of the hour and of the day.
+        """
+        hour_start = decode_timestamp(timestamp_micros).replace(minute=0, second=0, microsecond=0)
+        hour_start_micros = encode_timestamp(hour_start)
+        day_start_micros: int | None = self.day_starts.get(hour_start_micros)
+        if day_start_micros is None:
+            day_start_micros = encode_timestamp(hour_start.replace(hour=0))
+            self.day_starts[hour_start_micros] = day_start_micros
+        return hour_start_micros, day_start_micros
+
+    def _add_observed_time(self, rollups: dict[tuple[str, str, int], list], device_id: str, start: int, end: int,
+                           status: int) -> None:
+        # Split the time between two samples at the hour boundaries, and add every part to its hour and day.
+        while start < end:
+            period_starts = self.get_period_starts(start)
+            part_end = min(end, period_starts[0] + 3_600_000_000)
+            for period, period_start in zip(("hour", "day"), period_starts):
+                rollup: list = rollups.setdefault((device_id, period, period_start), [0, 0, 0.0, 0.0, 0, 0.0, 0.0])
+                rollup[5] += (part_end - start) / 1_000_000
+                if status:
+                    rollup[6] += (part_end - start) / 1_000_000
+            start = part_end
+
+    def update_rollups(self, data: list[list]) -> None:
+        """
+        Add ping results to the hourly and daily rollups of their devices, in one transaction.
+        Args:
+            data (list[list]): The [device_id, status, timestamp] rows of the ping results, optionally followed by the
+                average round-trip time in seconds (None or empty if there was no reply) and the other measurements,
+                in time order per device.
+        Returns:
+            None
+        """
+        if not data:
+            return
+        connection = self._connect()
+        try:
+            if self.outages is None:
+                self.outages = dict(connection.execute("SELECT device_id, down_since FROM outages"))
+            if self.last_samples is None:
+                self.last_samples = {device_id: (timestamp, status) for device_id, timestamp, status
+                                     in connection.execute("SELECT device_id, timestamp, status FROM last_samples")}
+            rollups: dict[tuple[str, str, int], list] = {}
+            changed_outages: dict[str, int | None] = {}
+            changed_last_samples: dict[str, tuple[int, int]] = {}
+            for row in data:
+                device_id, status, timestamp_micros = str(row[0]), int(row[1]), encode_timestamp(row[2])
+                rtt: float | None = decode_measurement(row[3]) if len(row) > 3 else None
+                last_sample: tuple[int, int] | None = self.last_samples.get(device_id)
+                if last_sample is None or last_sample[0] < timestamp_micros:
+                    if last_sample is not None:
+                        self._add_observed_time(rollups, device_id, last_sample[0],
+                                                min(timestamp_micros, last_sample[0]
+                                                    + constants.rollup_max_sample_interval * 1_000_000),
+                                                last_sample[1])
+                    self.last_samples[device_id] = changed_last_samples[device_id] = (timestamp_micros, status)
+                down_since: int | None = self.outages.get(device_id)
+                outage_seconds = 0.0
+                if status:
+                    if down_since is not None:
+                        outage_seconds = (timestamp_micros - down_since) / 1_000_000
+                        self.outages[device_id] = changed_outages[device_id] = None
+                else:
+                    if down_since is None:
+                        down_since = self.outages[device_id] = changed_outages[device_id] = timestamp_micros
+                    outage_seconds = (timestamp_micros - down_since) / 1_000_000
+                for period, period_start in zip(("hour", "day"), self.get_period_starts(timestamp_micros)):
+                    rollup: list = rollups.setdefault((device_id, period, period_start), [0, 0, 0.0, 0.0, 0, 0.0, 0.0])
+                    rollup[0] += 1
+                    rollup[1] += status
+                    rollup[2] = max(rollup[2], outage_seconds)
+                    if rtt is not None:
+                        rollup[3] += rtt
+                        rollup[4] += 1
+            with connection:
+                connection.executemany(
+                    "INSERT INTO rollups (device_id, period, period_start, samples, up_samples, longest_outage, "
+                    "rtt_sum, rtt_samples, observed_seconds, up_seconds) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (device_id, period, period_start) DO UPDATE SET "
+                    "samples = samples + excluded.samples, up_samples = up_samples + excluded.up_samples, "
+                    "longest_outage = MAX(longest_outage, excluded.longest_outage), "
+                    "rtt_sum = rtt_sum + excluded.rtt_sum, rtt_samples = rtt_samples + excluded.rtt_samples, "
+                    "observed_seconds = observed_seconds + excluded.observed_seconds, "
+                    "up_seconds = up_seconds + excluded.up_seconds",
+                    (key + tuple(rollup) for key, rollup in rollups.items()))
+                connection.executemany("INSERT OR REPLACE INTO outages VALUES (?, ?)", changed_outages.items())
+                connection.executemany("INSERT OR REPLACE INTO last_samples VALUES (?, ?, ?)",
+                                       ((device_id, *last_sample) for device_id, last_sample
+                                        in changed_last_samples.items()))
+        finally:
+            connection.close()
+
+    def rebuild_rollups(self, rows: Iterable[list], batch_size: int = 10000) -> None:
+        """
+        Discard the rollups and recompute them from the availability data, for example after importing history.
+        Args:
+            rows (Iterable[list]): The [device_id, status, timestamp] rows of the availability data, oldest first.
+            batch_size (int): The number of rows added to the rollups at a time.
+        Returns:
+            None
+        """
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute("DELETE FROM rollups")
+                connection.execute("DELETE FROM outages")
+                connection.execute("DELETE FROM last_samples")
+        finally:
+            connection.close()
+        self.outages = {}
+        self.last_samples = {}
+        batch: list[list] = []
+        rebuilt_rows = 0
+        for row in rows:
+            batch.append(row)
+            if len(batch) == batch_size:
+                self.update_rollups(batch)
+                rebuilt_rows += len(batch)
+                batch = []
+        self.update_rollups(batch)
+        rebuilt_rows += len(batch)
+        print(f"{rebuilt_rows} {constants.rollups_rebuilt_successfully}")
+
+    def get_rollups(self, device_id: str | None, period: str, start: datetime, end: datetime) -> list[list]:
+        """
+        Get the rollups of one period type that start between two times.
+        Args:
+            device_id (str | None): The device to get the rollups of, or None for every device.
+            period (str): "hour" or "day".
+            start (datetime): Only get the rollups of periods starting at or after this time.
+            end (datetime): Only get the rollups of periods starting before this time.
+        Returns:
+            list[list]: [device_id, period_start, samples, up_samples, longest_outage, rtt_sum, rtt_samples,
+                observed_seconds, up_seconds] rows, ordered by device and period start.
+        """
+        query = ("SELECT device_id, period_start, samples, up_samples, longest_outage, rtt_sum, rtt_samples, "
+                 "observed_seconds, up_seconds FROM rollups "
+                 "WHERE period = ? AND period_start >= ? AND period_start < ?")
+        parameters: list = [period, encode_timestamp(start), encode_timestamp(end)]
+        if device_id is not None:
+            query += " AND device_id = ?"
+            parameters.append(device_id)
+        connection = self._connect()
+        try:
+            return [list(row) for row in connection.execute(query + " ORDER BY device_id, period_start",
+                                                            parameters)]
+        finally:
+            connection.close()
+
+    def print_uptime_report(self, device_id: str, value: str | None = None) -> None:
+        """
+        Print the uptime of a device, or of every device, from the rollups.
+        For a single day the report has one line per hour, for a range of days one line per day; with 'all' as the
+        device ID it has one line per device covering the whole period.
+        Args:
+            device_id (str): The device to report on, or "all" for every device.
+            value (str, optional): A day as 'YYYY-MM-DD' or a range of days as 'YYYY-MM-DD..YYYY-MM-DD'. Defaults to
+                the last 7 days.
+        Returns:
+            None
+        """
+        try:
+            if value is None:
+                last_day = datetime.combine(datetime.now().date(), datetime.min.time())
+                first_day = last_day - timedelta(days=6)
+            else:
+                first_value, _, last_value = value.partition("..")
+                first_day = datetime.strptime(first_value, "%Y-%m-%d")
+                last_day = datetime.strptime(last_value or first_value, "%Y-%m-%d")
+        except ValueError:
+            print("Invalid date format. Please use 'YYYY-MM-DD' format, or 'YYYY-MM-DD..YYYY-MM-DD' for a range.")
+            return
+        single_day = first_day == last_day
+        period = "hour" if single_day else "day"
+        rollups = self.get_rollups(None if device_id == "all" else device_id, period, first_day,
+                                   last_day + timedelta(days=1))
+        if not rollups:
+            print(constants.no_device_availability_data_found)
+            return
+        row_template = "{:^20} {:^10} {:^10} {:^20} {:^15}"
+        if device_id == "all":
+            totals: dict[str, list] = {}
+            for rollup in rollups:
+                total = totals.setdefault(rollup[0], [rollup[0], 0, 0, 0.0, 0.0, 0, 0.0, 0.0])
+                total[1] += rollup[2]
+                total[2] += rollup[3]
+                total[3] = max(total[3], rollup[4])
+                total[4] += rollup[5]
+                total[5] += rollup[6]
+                total[6] += rollup[7]
+                total[7] += rollup[8]
+            print(row_template.format("Device Id", "Samples", "Uptime", "Longest Outage (s)", "Mean RTT (ms)"))
+            lines = totals.values()
+        else:
+            print(row_template.format("Hour" if single_day else "Day", "Samples", "Uptime", "Longest Outage (s)",
+                                      "Mean RTT (ms)"))
+            time_format = "%Y-%m-%d %H:00" if single_day else "%Y-%m-%d"
+            lines = [[decode_timestamp(rollup[1]).strftime(time_format)] + rollup[2:] for rollup in rollups]
+        samples, up_samples, rtt_sum, rtt_samples, observed_seconds, up_seconds = 0, 0, 0.0, 0, 0.0, 0.0
+        for (label, line_samples, line_up_samples, longest_outage, line_rtt_sum, line_rtt_samples,
+             line_observed_seconds, line_up_seconds) in lines:
+            samples += line_samples
+            up_samples += line_up_samples
+            rtt_sum += line_rtt_sum
+            rtt_samples += line_rtt_samples
+            observed_seconds += line_observed_seconds
+            up_seconds += line_up_seconds
+            print(row_template.format(label, line_samples,
+                                      self.format_uptime(line_samples, line_up_samples, line_observed_seconds,
+                                                         line_up_seconds), f"{longest_outage:.0f}",
+                                      f"{1000 * line_rtt_sum / line_rtt_samples:.2f}" if line_rtt_samples else "-"))
+        print(row_template.format("Total", samples,
+                                  self.format_uptime(samples, up_samples, observed_seconds, up_seconds), "",
+                                  f"{1000 * rtt_sum / rtt_samples:.2f}" if rtt_samples else "-"))
+
+    @staticmethod
+    def format_uptime(samples: int, up_samples: int, observed_seconds: float, up_seconds: float) -> str:
+        """
+        Format the uptime of rollups: the share of the observed seconds where the device was up, or of the samples
+        where it was up for rollups without observed seconds.
+        Args:
+            samples (int): The number of samples.
+            up_samples (int): The number of samples where the device was up.
+            observed_seconds (float): The number of seconds observed.
+            up_seconds (float): The number of seconds where the device was up.
+        Returns:
+            str: The uptime as a percentage, or "-" if there is neither observed time nor samples.
+        """
+        if observed_seconds:
+            return f"{100 * up_seconds / observed_seconds:.2f}%"
+        return f"{100 * up_samples / samples:.2f}%" if samples else "-"
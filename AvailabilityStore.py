@@ -0,0 +1,1216 @@
+import csv
+import gzip
+import heapq
+import io
+import locale
+import os
+import shutil
+import sqlite3
+import struct
+import sys
+import zlib
+from array import array
+from collections.abc import Iterator
+from datetime import date, datetime, timedelta
+from itertools import accumulate
+
+import constants
+
+
+class AvailabilityStore:
+    """
+    Base class of the storage backends used by the DeviceAvailabilityDataManager.
+    Each row of availability data is a [device_id, status, timestamp, rtt_avg, rtt_min, rtt_max, jitter, loss] list,
+    and every backend answers the same queries, so the manager can switch between them without changing its API.
+    Timestamps are stored as epoch microseconds; rows written before that hold str(datetime) timestamps and are still
+    read. The measurements are the round-trip times and jitter in seconds and the packet loss in percent of the probes
+    sent to the device, and are empty when the device did not reply. Rows written before the measurements were
+    recorded only have the first three columns, and are still read: CSV backends yield them as they are, SQLite
+    yields None measurements. The headers of their CSV files are replaced with the full headers before new rows are
+    appended.
+    Attributes:
+        headers (list[str]): The column names of the availability data.
+    Methods:
+        load_rows(self) -> list[list]:
+            Load all the availability data, headers first.
+        iter_rows(self, device_id: str | None, start: datetime | None, end: datetime | None,
+                  status: int | None) -> Iterator[list]:
+            Lazily yield the availability rows matching the given filters.
+        latest_rows(self, end: datetime | None) -> dict[str, list]:
+            Get the last row recorded for each device.
+        save_rows(self, data: list[list]) -> None:
+            Append availability data to the store.
+        open_writer(self, durability: str) -> AvailabilityStoreWriter:
+            Open a long-lived handle appending availability data to the store.
+        encode_row(row: list) -> list:
+            Convert a row into the form stored by the backends.
+        prune(self, compress_after_days: int, delete_after_days: int) -> None:
+            Apply the retention policy to the stored availability data.
+    """
+    headers: list[str] = ["Device Id", "Status", "Timestamp", "RTT Avg (s)", "RTT Min (s)", "RTT Max (s)", "Jitter (s)",
+                          "Loss (%)"]
+
+    def load_rows(self) -> list[list]:
+        """
+        Load all the availability data, headers first.
+        Returns:
+            list[list]: The headers followed by every availability row.
+        """
+        return [self.headers] + list(self.iter_rows())
+
+    def iter_rows(self, device_id: str | None = None, start: datetime | None = None, end: datetime | None = None,
+                  status: int | None = None) -> Iterator[list]:
+        """
+        Lazily yield the availability rows matching the given filters, so that callers never hold more than one row
+        of the availability data in memory.
+        Args:
+            device_id (str, optional): Only yield the rows of this device.
+            start (datetime, optional): Only yield the rows recorded at or after this time.
+            end (datetime, optional): Only yield the rows recorded before this time.
+            status (int, optional): Only yield the rows with this status, 1 for active and 0 for inactive.
+        Returns:
+            Iterator[list]: The matching [device_id, status, timestamp] rows.
+        """
+        raise NotImplementedError
+
+    def latest_rows(self, end: datetime | None = None) -> dict[str, list]:
+        """
+        Get the last row recorded for each device, optionally before a given time.
+        Args:
+            end (datetime, optional): Only consider the rows recorded before this time.
+        Returns:
+            dict[str, list]: The last [device_id, status, timestamp] row of every device, keyed by device ID.
+        """
+        latest: dict[str, list] = {}
+        latest_micros: dict[str, int] = {}
+        for row in self.iter_rows(end=end):
+            timestamp_micros = encode_timestamp(row[2])
+            if timestamp_micros >= latest_micros.get(row[0], timestamp_micros):
+                latest[row[0]] = row
+                latest_micros[row[0]] = timestamp_micros
+        return latest
+
+    @staticmethod
+    def row_filter(device_id: str | None, start: datetime | None, end: datetime | None,
+                   status: int | None) -> callable:
+        """
+        Build a predicate checking if a row read from a file matches the given filters.
+        Timestamps are compared without building datetime objects: epoch microsecond timestamps are compared as
+        integers and legacy ISO timestamps are compared as strings, which sort in time order.
+        Args:
+            device_id (str | None): The device ID to match, or None to match any device.
+            start (datetime | None): The earliest timestamp to match, or None.
+            end (datetime | None): The timestamp to match rows before, or None.
+            status (int | None): The status to match, or None to match any status.
+        Returns:
+            callable: A function taking a [device_id, status, timestamp] row of strings and returning True if it
+                matches every given filter.
+        """
+        status_field: str | None = None if status is None else str(status)
+        start_micros: int | None = None if start is None else encode_timestamp(start)
+        end_micros: int | None = None if end is None else encode_timestamp(end)
+        start_iso: str | None = None if start is None else str(start)
+        end_iso: str | None = None if end is None else str(end)
+        filter_time: bool = start is not None or end is not None
+
+        def matches(row: list) -> bool:
+            if device_id is not None and row[0] != device_id:
+                return False
+            if status_field is not None and row[1] != status_field:
+                return False
+            if filter_time:
+                timestamp = row[2]
+                if timestamp.isdigit():
+                    timestamp_micros = int(timestamp)
+                    return ((start_micros is None or timestamp_micros >= start_micros)
+                            and (end_micros is None or timestamp_micros < end_micros))
+                return (start_iso is None or timestamp >= start_iso) and (end_iso is None or timestamp < end_iso)
+            return True
+        return matches
+
+    def save_rows(self, data: list[list]) -> None:
+        """
+        Append availability data to the store.
+        Args:
+            data (list[list]): The [device_id, status, timestamp] rows to be saved, optionally followed by the
+                measurements.
+        Returns:
+            None
+        """
+        raise NotImplementedError
+
+    def open_writer(self, durability: str = constants.availability_writer_durability) -> "AvailabilityStoreWriter":
+        """
+        Open a long-lived handle appending availability data to the store, so that frequent small writes do not
+        reopen the store every time. Backends without a dedicated writer save every batch with save_rows.
+        Args:
+            durability (str): What flush() guarantees once it returns: "none" (the rows may still be buffered in
+                the process), "flush" (the rows were handed to the operating system) or "fsync" (the rows are on
+                disk).
+        Returns:
+            AvailabilityStoreWriter: The writer, to be closed when done.
+        """
+        return AvailabilityStoreWriter(self, durability)
+
+    @staticmethod
+    def encode_row(row: list) -> list:
+        """
+        Convert a row into the form stored by the backends: an epoch microsecond timestamp and all five
+        measurements, rounded to the microsecond, None where missing.
+        Args:
+            row (list): A [device_id, status, timestamp] row, optionally followed by some or all of the measurements.
+        Returns:
+            list: The [device_id, status, timestamp, rtt_avg, rtt_min, rtt_max, jitter, loss] row.
+        """
+        measurements = [decode_measurement(value) for value in row[3:8]]
+        measurements += [None] * (5 - len(measurements))
+        return ([str(row[0]), int(row[1]), encode_timestamp(row[2])]
+                + [None if value is None else round(value, 6) for value in measurements])
+
+    def prune(self, compress_after_days: int, delete_after_days: int) -> None:
+        """
+        Apply the retention policy to the stored availability data. Backends that cannot drop old data keep it all.
+        Args:
+            compress_after_days (int): Compress data older than this many days, where the backend supports it.
+            delete_after_days (int): Delete data older than this many days.
+        Returns:
+            None
+        """
+        print(constants.retention_not_supported)
+
+
+class CSVAvailabilityStore(AvailabilityStore):
+    """
+    Availability data stored in a single CSV file. Every query scans the whole file.
+    Attributes:
+        filename (str): The filename of the CSV file.
+    """
+
+    def __init__(self, filename: str = constants.device_data_availability_filename):
+        """
+        Initialize CSVAvailabilityStore with the CSV filename.
+        Args:
+            filename (str): The filename of the CSV file.
+        """
+        self.filename: str = filename
+
+    def __repr__(self):
+        """
+        Return a string representation that can be used to recreate the CSVAvailabilityStore object.
+        Returns:
+            str: String representation for recreation.
+        """
+        return f"CSVAvailabilityStore({self.filename!r})"
+
+    @staticmethod
+    def _migrate_headers(filename: str, headers: list[str]) -> None:
+        # CSV files created before the measurements were recorded have the headers of their first three columns only.
+        # Their headers are replaced before the first row with measurements is appended, so that they name every
+        # column: the file is copied with the new headers to a temporary file renamed over it, and its rows are kept
+        # as they are.
+        try:
+            with open(filename, newline="") as file:
+                file_headers: list[str] | None = next(csv.reader(file), None)
+        except FileNotFoundError:
+            return
+        if file_headers is None or len(file_headers) >= len(headers) or file_headers != headers[:len(file_headers)]:
+            return
+        temporary_filename = f"{filename}.tmp"
+        with open(filename, "rb") as source, open(temporary_filename, "wb", buffering=0) as target:
+            source.readline()
+            AvailabilityStoreWriter._append_rows(target, [headers])
+            shutil.copyfileobj(source, target)
+            os.fsync(target.fileno())
+        os.replace(temporary_filename, filename)
+
+    def load_rows(self) -> list[list]:
+        """
+        Load all the availability data from the CSV file, headers first.
+        Returns:
+            list[list]: The headers followed by every availability row.
+        Raises:
+            FileNotFoundError: If the CSV file is not found, a new CSV file will be created with headers and returned.
+        """
+        try:
+            with open(self.filename) as file:
+                reader = csv.reader(file)
+                device_availability_data: list[list] = list(reader)
+                return device_availability_data
+        except FileNotFoundError:
+            print("File Not Found")
+            print(f"Creating File {self.filename}")
+            with open(self.filename, "w", newline="") as file:
+                writer = csv.writer(file)
+                writer.writerow(self.headers)
+            return [self.headers]
+
+    def iter_rows(self, device_id: str | None = None, start: datetime | None = None, end: datetime | None = None,
+                  status: int | None = None) -> Iterator[list]:
+        """
+        Lazily yield the availability rows matching the given filters, reading the CSV file one row at a time.
+        Args:
+            device_id (str, optional): Only yield the rows of this device.
+            start (datetime, optional): Only yield the rows recorded at or after this time.
+            end (datetime, optional): Only yield the rows recorded before this time.
+            status (int, optional): Only yield the rows with this status.
+        Returns:
+            Iterator[list]: The matching [device_id, status, timestamp] rows, in file order.
+        """
+        matches = self.row_filter(device_id, start, end, status)
+        try:
+            with open(self.filename, newline="") as file:
+                reader = csv.reader(file)
+                next(reader, None)
+                yield from filter(matches, reader)
+        except FileNotFoundError:
+            return
+
+    def save_rows(self, data: list[list]) -> None:
+        """
+        Append availability data to the CSV file, writing the headers first if the file is new, and replacing the
+        headers of a file created before the measurements were recorded.
+        Args:
+            data (list[list]): The [device_id, status, timestamp] rows to be saved, optionally followed by the
+                measurements.
+        Returns:
+            None
+        """
+        self._migrate_headers(self.filename, self.headers)
+        file_exists = os.path.isfile(self.filename)
+        with open(self.filename, "a", newline="") as file:
+            writer_object = csv.writer(file, lineterminator='\n')
+            if not file_exists:
+                writer_object.writerow(self.headers)
+            writer_object.writerows(self.encode_row(row) for row in data)
+
+    def open_writer(self, durability: str = constants.availability_writer_durability) -> "AvailabilityStoreWriter":
+        """
+        Open the CSV file for appending, once, writing the headers first if the file is new.
+        Args:
+            durability (str): "none", "flush" or "fsync", see AvailabilityStore.open_writer.
+        Returns:
+            AvailabilityStoreWriter: The writer, to be closed when done.
+        """
+        return CSVAvailabilityStoreWriter(self, durability)
+
+
+class SQLiteAvailabilityStore(AvailabilityStore):
+    """
+    Availability data stored in an SQLite database, indexed on (device_id, timestamp) and on timestamp so that
+    id and date queries are index lookups instead of full scans.
+    Attributes:
+        filename (str): The filename of the SQLite database.
+    """
+    measurement_columns: list[str] = ["rtt_avg", "rtt_min", "rtt_max", "jitter", "loss"]
+    columns: str = "device_id, status, timestamp, rtt_avg, rtt_min, rtt_max, jitter, loss"
+
+    def __init__(self, filename: str = constants.device_availability_database_filename):
+        """
+        Initialize SQLiteAvailabilityStore with the database filename, creating the table and indexes if needed.
+        Args:
+            filename (str): The filename of the SQLite database.
+        """
+        self.filename: str = filename
+        connection = self._connect()
+        try:
+            with connection:
+                existing_columns = {column[1]: column[2]
+                                    for column in connection.execute("PRAGMA table_info(availability)")}
+                if existing_columns.get("timestamp") == "TEXT":
+                    self._migrate_text_timestamps(connection)
+                connection.execute("CREATE TABLE IF NOT EXISTS availability "
+                                   "(device_id TEXT NOT NULL, status INTEGER NOT NULL, timestamp INTEGER NOT NULL, "
+                                   "rtt_avg REAL, rtt_min REAL, rtt_max REAL, jitter REAL, loss REAL)")
+                # Tables created before the measurements were recorded get the measurement columns, NULL for the
+                # existing rows.
+                for column in self.measurement_columns:
+                    if existing_columns and column not in existing_columns:
+                        connection.execute(f"ALTER TABLE availability ADD COLUMN {column} REAL")
+                connection.execute("CREATE INDEX IF NOT EXISTS availability_device_id_timestamp "
+                                   "ON availability (device_id, timestamp)")
+                connection.execute("CREATE INDEX IF NOT EXISTS availability_timestamp ON availability (timestamp)")
+        finally:
+            connection.close()
+
+    def __repr__(self):
+        """
+        Return a string representation that can be used to recreate the SQLiteAvailabilityStore object.
+        Returns:
+            str: String representation for recreation.
+        """
+        return f"SQLiteAvailabilityStore({self.filename!r})"
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.filename)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    @staticmethod
+    def _migrate_text_timestamps(connection: sqlite3.Connection) -> None:
+        # Databases created before timestamps were stored as epoch microseconds hold them as TEXT, and a TEXT column
+        # would turn inserted integers back into text, so the table is rebuilt with an INTEGER column.
+        connection.create_function("encode_timestamp", 1, encode_timestamp, deterministic=True)
+        connection.execute("DROP INDEX IF EXISTS availability_device_id_timestamp")
+        connection.execute("DROP INDEX IF EXISTS availability_timestamp")
+        connection.execute("ALTER TABLE availability RENAME TO availability_text_timestamps")
+        connection.execute("CREATE TABLE availability "
+                           "(device_id TEXT NOT NULL, status INTEGER NOT NULL, timestamp INTEGER NOT NULL)")
+        connection.execute("INSERT INTO availability (device_id, status, timestamp) "
+                           "SELECT device_id, status, encode_timestamp(timestamp) FROM availability_text_timestamps "
+                           "ORDER BY rowid")
+        connection.execute("DROP TABLE availability_text_timestamps")
+
+    def iter_rows(self, device_id: str | None = None, start: datetime | None = None, end: datetime | None = None,
+                  status: int | None = None) -> Iterator[list]:
+        """
+        Lazily yield the availability rows matching the given filters. Device and time filters are answered with the
+        (device_id, timestamp) and timestamp indexes, and rows are fetched from the cursor as they are consumed.
+        Args:
+            device_id (str, optional): Only yield the rows of this device.
+            start (datetime, optional): Only yield the rows recorded at or after this time.
+            end (datetime, optional): Only yield the rows recorded before this time.
+            status (int, optional): Only yield the rows with this status.
+        Returns:
+            Iterator[list]: The matching [device_id, status, timestamp] rows, oldest first.
+        """
+        conditions: list[str] = []
+        parameters: list = []
+        for condition, value in (("device_id = ?", device_id), ("timestamp >= ?", start), ("timestamp < ?", end),
+                                 ("status = ?", status)):
+            if value is not None:
+                conditions.append(condition)
+                parameters.append(encode_timestamp(value) if isinstance(value, datetime) else value)
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        connection = self._connect()
+        try:
+            for row in connection.execute(f"SELECT {self.columns} FROM availability {where}ORDER BY timestamp, rowid",
+                                          parameters):
+                yield list(row)
+        finally:
+            connection.close()
+
+    def latest_rows(self, end: datetime | None = None) -> dict[str, list]:
+        """
+        Get the last row recorded for each device, optionally before a given time, with one grouped query on the
+        (device_id, timestamp) index.
+        Args:
+            end (datetime, optional): Only consider the rows recorded before this time.
+        Returns:
+            dict[str, list]: The last [device_id, status, timestamp] row of every device, keyed by device ID.
+        """
+        where = "" if end is None else "WHERE timestamp < ? "
+        connection = self._connect()
+        try:
+            # SQLite takes the other columns of a MAX() aggregate from the row holding the maximum.
+            rows = connection.execute(f"SELECT device_id, status, MAX(timestamp), "
+                                      f"{', '.join(self.measurement_columns)} FROM availability {where}"
+                                      "GROUP BY device_id", () if end is None else (encode_timestamp(end),))
+            return {row[0]: list(row) for row in rows}
+        finally:
+            connection.close()
+
+    def save_rows(self, data: list[list]) -> None:
+        """
+        Insert availability data into the database in one transaction.
+        Args:
+            data (list[list]): The [device_id, status, timestamp] rows to be saved, optionally followed by the
+                measurements.
+        Returns:
+            None
+        """
+        connection = self._connect()
+        try:
+            with connection:
+                connection.executemany(f"INSERT INTO availability ({self.columns}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                       (self.encode_row(row) for row in data))
+        finally:
+            connection.close()
+
+    def open_writer(self, durability: str = constants.availability_writer_durability) -> "AvailabilityStoreWriter":
+        """
+        Open one connection to the database for all the writes, with the synchronous mode matching the durability.
+        Args:
+            durability (str): "none", "flush" or "fsync", see AvailabilityStore.open_writer.
+        Returns:
+            AvailabilityStoreWriter: The writer, to be closed when done.
+        """
+        return SQLiteAvailabilityStoreWriter(self, durability)
+
+    def prune(self, compress_after_days: int, delete_after_days: int) -> None:
+        """
+        Delete the availability data older than 'delete_after_days' days. SQLite data is not compressed.
+        Args:
+            compress_after_days (int): Ignored by this backend.
+            delete_after_days (int): Delete data older than this many days. A value of 0 keeps all the data.
+        Returns:
+            None
+        """
+        if not delete_after_days:
+            return
+        cutoff = encode_timestamp(datetime.combine(date.today() - timedelta(days=delete_after_days),
+                                                   datetime.min.time()))
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute("DELETE FROM availability WHERE timestamp < ?", (cutoff,))
+        finally:
+            connection.close()
+
+
+class PartitionedCSVAvailabilityStore(AvailabilityStore):
+    """
+    Availability data stored as one CSV file per day in a directory, named after the day (YYYY-MM-DD.csv).
+    Date queries open only the partition of that day, and old partitions are gzip compressed and eventually
+    deleted by the retention policy, so disk use and query time stay bounded.
+    Attributes:
+        directory (str): The directory holding the partition files.
+        compress_after_days (int): Partitions older than this many days are compressed when a new day starts.
+        delete_after_days (int): Partitions older than this many days are deleted when a new day starts.
+    """
+
+    def __init__(self, directory: str = constants.device_availability_partitions_directory,
+                 compress_after_days: int = constants.availability_compress_after_days,
+                 delete_after_days: int = constants.availability_delete_after_days):
+        """
+        Initialize PartitionedCSVAvailabilityStore with the partitions directory and the retention policy.
+        Args:
+            directory (str): The directory holding the partition files.
+            compress_after_days (int): Partitions older than this many days are compressed when a new day starts.
+            delete_after_days (int): Partitions older than this many days are deleted when a new day starts.
+        """
+        self.directory: str = directory
+        self.compress_after_days: int = compress_after_days
+        self.delete_after_days: int = delete_after_days
+        os.makedirs(self.directory, exist_ok=True)
+
+    def __repr__(self):
+        """
+        Return a string representation that can be used to recreate the PartitionedCSVAvailabilityStore object.
+        Returns:
+            str: String representation for recreation.
+        """
+        return (f"PartitionedCSVAvailabilityStore({self.directory!r}, {self.compress_after_days}, "
+                f"{self.delete_after_days})")
+
+    def partition_days(self) -> list[date]:
+        """
+        Get the days that have a partition, oldest first.
+        Returns:
+            list[date]: The days of the partition files in the directory.
+        """
+        days: list[date] = []
+        for filename in os.listdir(self.directory):
+            try:
+                days.append(date.fromisoformat(filename.split(".")[0]))
+            except ValueError:
+                continue
+        return sorted(set(days))
+
+    def _partition_path(self, day: date) -> str:
+        return os.path.join(self.directory, f"{day.isoformat()}.csv")
+
+    def _iter_partition(self, day: date) -> Iterator[list]:
+        path = self._partition_path(day)
+        # Rows written to a day after it was compressed are in a new plain partition, next to the compressed one.
+        for partition_path in (path + ".gz", path):
+            try:
+                if partition_path.endswith(".gz"):
+                    file = gzip.open(partition_path, "rt", newline="")
+                else:
+                    file = open(partition_path, newline="")
+            except FileNotFoundError:
+                continue
+            with file:
+                reader = csv.reader(file)
+                next(reader, None)
+                yield from reader
+
+    def iter_rows(self, device_id: str | None = None, start: datetime | None = None, end: datetime | None = None,
+                  status: int | None = None) -> Iterator[list]:
+        """
+        Lazily yield the availability rows matching the given filters. Only the partitions of the days between
+        'start' and 'end' are opened, and they are read one row at a time.
+        Args:
+            device_id (str, optional): Only yield the rows of this device.
+            start (datetime, optional): Only yield the rows recorded at or after this time.
+            end (datetime, optional): Only yield the rows recorded before this time.
+            status (int, optional): Only yield the rows with this status.
+        Returns:
+            Iterator[list]: The matching [device_id, status, timestamp] rows, oldest partition first.
+        """
+        matches = self.row_filter(device_id, start, end, status)
+        for day in self.partition_days():
+            if start is not None and day < start.date():
+                continue
+            if end is not None and datetime.combine(day, datetime.min.time()) >= end:
+                break
+            yield from filter(matches, self._iter_partition(day))
+
+    def save_rows(self, data: list[list]) -> None:
+        """
+        Append availability data to the partition of the day each row was recorded on. The retention policy is
+        applied whenever a new partition is started.
+        Args:
+            data (list[list]): The [device_id, status, timestamp] rows to be saved, optionally followed by the
+                measurements.
+        Returns:
+            None
+        """
+        rows_by_day: dict[date, list[list]] = {}
+        for row in data:
+            row = self.encode_row(row)
+            day = decode_timestamp(row[2]).date()
+            rows_by_day.setdefault(day, []).append(row)
+        new_partition = False
+        for day, rows in rows_by_day.items():
+            path = self._partition_path(day)
+            CSVAvailabilityStore._migrate_headers(path, self.headers)
+            file_exists = os.path.isfile(path)
+            new_partition = new_partition or not file_exists
+            with open(path, "a", newline="") as file:
+                writer_object = csv.writer(file, lineterminator='\n')
+                if not file_exists:
+                    writer_object.writerow(self.headers)
+                writer_object.writerows(rows)
+        if new_partition:
+            self.prune(self.compress_after_days, self.delete_after_days)
+
+    def open_writer(self, durability: str = constants.availability_writer_durability) -> "AvailabilityStoreWriter":
+        """
+        Keep the partition of the current day open for appending, switching to the next one when a new day starts.
+        Args:
+            durability (str): "none", "flush" or "fsync", see AvailabilityStore.open_writer.
+        Returns:
+            AvailabilityStoreWriter: The writer, to be closed when done.
+        """
+        return PartitionedCSVAvailabilityStoreWriter(self, durability)
+
+    def prune(self, compress_after_days: int, delete_after_days: int) -> None:
+        """
+        Gzip the partitions older than 'compress_after_days' days and delete the ones older than
+        'delete_after_days' days. A value of 0 disables that step. The rows of a plain partition written to a day
+        already compressed are merged into the compressed partition.
+        Args:
+            compress_after_days (int): Compress partitions older than this many days.
+            delete_after_days (int): Delete partitions older than this many days.
+        Returns:
+            None
+        """
+        today = date.today()
+        for day in self.partition_days():
+            age = (today - day).days
+            path = self._partition_path(day)
+            if delete_after_days and age > delete_after_days:
+                for partition_path in (path, path + ".gz"):
+                    if os.path.isfile(partition_path):
+                        os.remove(partition_path)
+            elif compress_after_days and age > compress_after_days and os.path.isfile(path):
+                with open(path, "rb") as source, gzip.open(path + ".gz.tmp", "wb") as target:
+                    if os.path.isfile(path + ".gz"):
+                        with gzip.open(path + ".gz", "rb") as compressed:
+                            shutil.copyfileobj(compressed, target)
+                        # The compressed partition already starts with the headers.
+                        source.readline()
+                    shutil.copyfileobj(source, target)
+                os.replace(path + ".gz.tmp", path + ".gz")
+                os.remove(path)
+
+
+class ArchiveAvailabilityStore(AvailabilityStore):
+    """
+    Availability data stored in one append-only file of compressed blocks, to keep a long history in little space.
+    A CSV row repeats the device ID and a timestamp for what is mostly one bit of information. A block instead holds
+    up to 'block_rows' rows as columns: every device ID once, in the dictionary of the block, then for every row the
+    index of its device in the dictionary, the difference between its timestamp and the one of the previous row, its
+    status as one bit, and its measurements as integer microseconds (millionths of a percent for the loss, -1 where
+    missing). Every column of integers is stored with the smallest width that fits it, and the dictionary and the
+    columns are compressed with zlib.
+    Every block starts with an uncompressed header, the index of the block: its number of rows and of active rows,
+    and the time range of its rows. Queries read the headers only, skipping the blocks outside their time range or
+    without a row of their status; with a device filter, they decompress the dictionaries of the blocks left, and skip
+    the blocks without the device. Only the columns of the blocks that can match are decompressed.
+    Every block is appended in one write; a block cut short by a crash is ignored, and overwritten by the next write.
+    Attributes:
+        filename (str): The filename of the archive.
+        block_rows (int): The maximum number of rows of a block.
+        end (int | None): The size of the archive after the last block written by this object, to append the next
+            one without looking for a block cut short.
+    """
+    file_header: struct.Struct = struct.Struct("<4sH")
+    magic: bytes = b"DAAR"
+    version: int = 1
+    # The number of rows and of active rows, the number of devices of the dictionary, the first and last timestamp,
+    # the compressed sizes of the dictionary and of the columns, and the CRC-32 of both.
+    block_header: struct.Struct = struct.Struct("<IIIqqIII")
+
+    def __init__(self, filename: str = constants.device_availability_archive_filename,
+                 block_rows: int = constants.archive_block_rows):
+        """
+        Initialize ArchiveAvailabilityStore with the archive filename.
+        Args:
+            filename (str): The filename of the archive.
+            block_rows (int): The maximum number of rows of a block.
+        """
+        self.filename: str = filename
+        self.block_rows: int = max(1, block_rows)
+        self.end: int | None = None
+
+    def __repr__(self):
+        """
+        Return a string representation that can be used to recreate the ArchiveAvailabilityStore object.
+        Returns:
+            str: String representation for recreation.
+        """
+        return f"ArchiveAvailabilityStore({self.filename!r}, {self.block_rows})"
+
+    def _iter_blocks(self, file) -> Iterator[tuple[int, tuple]]:
+        """
+        Yield the offset and the header of every complete block of the open archive, reading the headers only.
+        Every header is read at its own offset, so the caller may read the blocks in between.
+        Raises:
+            ValueError: If the file is not an archive of this version.
+        """
+        file.seek(0)
+        if file.read(self.file_header.size) != self.file_header.pack(self.magic, self.version):
+            raise ValueError(f"{self.filename} is not an availability archive of version {self.version}")
+        size = os.fstat(file.fileno()).st_size
+        offset = self.file_header.size
+        while offset + self.block_header.size <= size:
+            file.seek(offset)
+            header = self.block_header.unpack(file.read(self.block_header.size))
+            block_end = offset + self.block_header.size + header[5] + header[6]
+            if block_end > size:
+                return
+            yield offset, header
+            offset = block_end
+
+    def _read_block(self, file, offset: int, header: tuple, columns: bool) -> tuple[list[str], bytes] | None:
+        """
+        Read and decompress the dictionary of a block, and its columns if 'columns' is set.
+        Returns:
+            tuple[list[str], bytes] | None: The device IDs of the dictionary and the decompressed columns (empty if
+                not read), or None if the block is corrupt.
+        """
+        file.seek(offset + self.block_header.size)
+        data = file.read(header[5] + (header[6] if columns else 0))
+        try:
+            if columns and zlib.crc32(data) != header[7]:
+                raise zlib.error
+            device_ids = zlib.decompress(data[:header[5]]).decode().split("\0")
+            return device_ids, zlib.decompress(data[header[5]:]) if columns else b""
+        except (zlib.error, UnicodeDecodeError):
+            print(f"{constants.archive_block_corrupt} {offset}")
+            return None
+
+    @staticmethod
+    def _pack_integers(values: list[int]) -> bytes:
+        """
+        Pack a column of integers with the smallest signed width that fits all of them, after a one-byte type code.
+        """
+        low, high = min(values, default=0), max(values, default=0)
+        for typecode in "bhiq":
+            limit = 1 << (array(typecode).itemsize * 8 - 1)
+            if -limit <= low and high < limit:
+                break
+        column = array(typecode, values)
+        if sys.byteorder == "big":
+            column.byteswap()
+        return typecode.encode() + column.tobytes()
+
+    @staticmethod
+    def _unpack_integers(data: bytes, offset: int, count: int) -> tuple[array, int]:
+        """
+        Unpack a column of 'count' integers packed by _pack_integers at 'offset'.
+        Returns:
+            tuple[array, int]: The integers and the offset following them.
+        """
+        column = array(chr(data[offset]))
+        end = offset + 1 + column.itemsize * count
+        column.frombytes(data[offset + 1:end])
+        if sys.byteorder == "big":
+            column.byteswap()
+        return column, end
+
+    def _encode_block(self, rows: list[list]) -> bytes:
+        """
+        Encode rows into a block, header first. The rows are encoded like encode_row does, without rounding the
+        measurements twice.
+        """
+        dictionary: dict[str, int] = {}
+        device_indexes = [dictionary.setdefault(str(row[0]), len(dictionary)) for row in rows]
+        timestamps = [encode_timestamp(row[2]) for row in rows]
+        first_timestamp = min(timestamps)
+        deltas = [timestamp - previous for previous, timestamp in zip([first_timestamp] + timestamps, timestamps)]
+        # Bit i of the status column is the status of row i.
+        statuses = "".join("1" if int(row[1]) else "0" for row in rows)
+        columns = [self._pack_integers(device_indexes), self._pack_integers(deltas),
+                   int(statuses[::-1], 2).to_bytes((len(rows) + 7) // 8, "little")]
+        for column in range(3, 8):
+            values = [decode_measurement(row[column]) if len(row) > column else None for row in rows]
+            columns.append(self._pack_integers([-1 if value is None else round(value * 1_000_000)
+                                                for value in values]))
+        compressed_dictionary = zlib.compress("\0".join(dictionary).encode(), constants.archive_compression_level)
+        compressed_columns = zlib.compress(b"".join(columns), constants.archive_compression_level)
+        header = self.block_header.pack(len(rows), statuses.count("1"), len(dictionary), first_timestamp,
+                                        max(timestamps), len(compressed_dictionary), len(compressed_columns),
+                                        zlib.crc32(compressed_dictionary + compressed_columns))
+        return header + compressed_dictionary + compressed_columns
+
+    def iter_rows(self, device_id: str | None = None, start: datetime | None = None, end: datetime | None = None,
+                  status: int | None = None) -> Iterator[list]:
+        """
+        Lazily yield the availability rows matching the given filters, decompressing only the blocks that can hold
+        some of them, one at a time.
+        Args:
+            device_id (str, optional): Only yield the rows of this device.
+            start (datetime, optional): Only yield the rows recorded at or after this time.
+            end (datetime, optional): Only yield the rows recorded before this time.
+            status (int, optional): Only yield the rows with this status.
+        Returns:
+            Iterator[list]: The matching [device_id, status, timestamp, rtt_avg, rtt_min, rtt_max, jitter, loss] rows,
+                in the order they were saved.
+        """
+        start_micros: int | None = None if start is None else encode_timestamp(start)
+        end_micros: int | None = None if end is None else encode_timestamp(end)
+        try:
+            file = open(self.filename, "rb")
+        except FileNotFoundError:
+            return
+        with file:
+            for offset, header in self._iter_blocks(file):
+                rows, active_rows, _, first_timestamp, last_timestamp = header[:5]
+                if ((start_micros is not None and last_timestamp < start_micros)
+                        or (end_micros is not None and first_timestamp >= end_micros)
+                        or (status == 1 and active_rows == 0) or (status == 0 and active_rows == rows)):
+                    continue
+                if device_id is not None:
+                    block = self._read_block(file, offset, header, False)
+                    if block is None or device_id not in block[0]:
+                        continue
+                block = self._read_block(file, offset, header, True)
+                if block is None:
+                    continue
+                yield from self._decode_block(header, *block, device_id, start_micros, end_micros, status)
+
+    def _decode_block(self, header: tuple, device_ids: list[str], data: bytes, device_id: str | None,
+                      start_micros: int | None, end_micros: int | None, status: int | None) -> Iterator[list]:
+        rows = header[0]
+        device_indexes, offset = self._unpack_integers(data, 0, rows)
+        deltas, offset = self._unpack_integers(data, offset, rows)
+        status_size = (rows + 7) // 8
+        statuses = format(int.from_bytes(data[offset:offset + status_size], "little"), f"0{rows}b")[::-1]
+        offset += status_size
+        measurements: list[array] = []
+        for _ in range(5):
+            column, offset = self._unpack_integers(data, offset, rows)
+            measurements.append(column)
+        timestamps = list(accumulate(deltas, initial=header[3]))[1:]
+        selected_rows: list[int] | range = range(rows)
+        if device_id is not None:
+            device_index = device_ids.index(device_id)
+            selected_rows = [row for row, index in enumerate(device_indexes) if index == device_index]
+        if status is not None:
+            status_bit = str(status)
+            selected_rows = [row for row in selected_rows if statuses[row] == status_bit]
+        # The time range is only checked row by row when the block is not entirely inside it.
+        if start_micros is not None and header[3] < start_micros:
+            selected_rows = [row for row in selected_rows if timestamps[row] >= start_micros]
+        if end_micros is not None and header[4] >= end_micros:
+            selected_rows = [row for row in selected_rows if timestamps[row] < end_micros]
+        # Decode the selected rows a column at a time, which costs a fraction of building every row value by value.
+        columns = [[device_ids[device_indexes[row]] for row in selected_rows],
+                   [int(statuses[row]) for row in selected_rows],
+                   [timestamps[row] for row in selected_rows]]
+        for column in measurements:
+            columns.append([None if column[row] < 0 else column[row] / 1_000_000 for row in selected_rows])
+        yield from map(list, zip(*columns))
+
+    def save_rows(self, data: list[list]) -> None:
+        """
+        Append availability data to the archive, in blocks of up to 'block_rows' rows, creating the archive if it
+        does not exist. Larger batches make smaller archives, as every block has its own dictionary and header.
+        Args:
+            data (list[list]): The [device_id, status, timestamp] rows to be saved, optionally followed by the
+                measurements.
+        Returns:
+            None
+        Raises:
+            ValueError: If the file is not an archive of this version.
+        """
+        if not data:
+            return
+        if not os.path.isfile(self.filename):
+            with open(self.filename, "wb") as file:
+                file.write(self.file_header.pack(self.magic, self.version))
+            self.end = self.file_header.size
+        with open(self.filename, "r+b", buffering=0) as file:
+            if self.end is None or os.fstat(file.fileno()).st_size != self.end:
+                # Another process wrote to the archive, or the last block may have been cut short.
+                self.end = self.file_header.size
+                for offset, header in self._iter_blocks(file):
+                    self.end = offset + self.block_header.size + header[5] + header[6]
+            file.seek(self.end)
+            file.truncate()
+            blocks = memoryview(b"".join(self._encode_block(data[first:first + self.block_rows])
+                                         for first in range(0, len(data), self.block_rows)))
+            try:
+                while blocks:
+                    blocks = blocks[file.write(blocks):]
+            except OSError:
+                # Leave none of the blocks of a batch that failed part way, so that saving it again does not
+                # duplicate its first blocks.
+                file.truncate(self.end)
+                raise
+            self.end = file.tell()
+
+
+class MergedAvailabilityStore(AvailabilityStore):
+    """
+    Read-only view of the availability data of several stores, such as the stores of the shard workers (see
+    ShardManager). Queries are answered by every store and their rows are merged by timestamp, so the view is
+    always up to date and nothing is copied.
+    Attributes:
+        stores (list[AvailabilityStore]): The merged stores.
+    """
+
+    def __init__(self, stores: list[AvailabilityStore]):
+        """
+        Initialize MergedAvailabilityStore with the stores to merge.
+        Args:
+            stores (list[AvailabilityStore]): The merged stores.
+        """
+        self.stores: list[AvailabilityStore] = stores
+
+    def __repr__(self):
+        """
+        Return a string representation that can be used to recreate the MergedAvailabilityStore object.
+        Returns:
+            str: String representation for recreation.
+        """
+        return f"MergedAvailabilityStore({self.stores!r})"
+
+    def iter_rows(self, device_id: str | None = None, start: datetime | None = None, end: datetime | None = None,
+                  status: int | None = None) -> Iterator[list]:
+        """
+        Lazily yield the availability rows of every store matching the given filters, merged by timestamp. Every
+        store is read one row at a time.
+        Args:
+            device_id (str, optional): Only yield the rows of this device.
+            start (datetime, optional): Only yield the rows recorded at or after this time.
+            end (datetime, optional): Only yield the rows recorded before this time.
+            status (int, optional): Only yield the rows with this status.
+        Returns:
+            Iterator[list]: The matching [device_id, status, timestamp] rows, oldest first as long as every store
+                yields them oldest first.
+        """
+        return heapq.merge(*(store.iter_rows(device_id, start, end, status) for store in self.stores),
+                           key=lambda row: encode_timestamp(row[2]))
+
+    def latest_rows(self, end: datetime | None = None) -> dict[str, list]:
+        """
+        Get the last row recorded for each device in any of the stores, optionally before a given time.
+        Args:
+            end (datetime, optional): Only consider the rows recorded before this time.
+        Returns:
+            dict[str, list]: The last [device_id, status, timestamp] row of every device, keyed by device ID.
+        """
+        latest: dict[str, list] = {}
+        for store in self.stores:
+            for device_id, row in store.latest_rows(end).items():
+                if device_id not in latest or encode_timestamp(row[2]) >= encode_timestamp(latest[device_id][2]):
+                    latest[device_id] = row
+        return latest
+
+    def save_rows(self, data: list[list]) -> None:
+        """
+        Refuse to save availability data, as the rows belong to the stores of the shard workers.
+        Args:
+            data (list[list]): Ignored.
+        Returns:
+            None
+        """
+        print(constants.merged_store_read_only)
+
+    def prune(self, compress_after_days: int, delete_after_days: int) -> None:
+        """
+        Apply the retention policy to every store.
+        Args:
+            compress_after_days (int): Compress data older than this many days, where the backend supports it.
+            delete_after_days (int): Delete data older than this many days.
+        Returns:
+            None
+        """
+        for store in self.stores:
+            store.prune(compress_after_days, delete_after_days)
+
+
+class AvailabilityStoreWriter:
+    """
+    Long-lived handle appending availability data to a store, opened with AvailabilityStore.open_writer. Rows written
+    with write_rows are only guaranteed to be stored, to the level of the durability, once flush() returns. A batch
+    that fails to be written leaves nothing behind, so that it can be written again without duplicating rows.
+    This base writer saves every batch with AvailabilityStore.save_rows, which already hands the rows to the
+    operating system.
+    Attributes:
+        store (AvailabilityStore): The store written to.
+        durability (str): "none", "flush" or "fsync".
+    """
+
+    def __init__(self, store: AvailabilityStore, durability: str = constants.availability_writer_durability):
+        """
+        Initialize AvailabilityStoreWriter with the store and the durability.
+        Args:
+            store (AvailabilityStore): The store written to.
+            durability (str): "none", "flush" or "fsync", see AvailabilityStore.open_writer.
+        Raises:
+            ValueError: If the durability is not known.
+        """
+        if durability not in ("none", "flush", "fsync"):
+            raise ValueError(f"Unknown durability: {durability}")
+        self.store: AvailabilityStore = store
+        self.durability: str = durability
+
+    def __repr__(self):
+        """
+        Return a string representation that can be used to recreate the writer.
+        Returns:
+            str: String representation for recreation.
+        """
+        return f"{type(self).__name__}({self.store!r}, {self.durability!r})"
+
+    def write_rows(self, data: list[list]) -> None:
+        """
+        Append availability data to the store.
+        Args:
+            data (list[list]): The [device_id, status, timestamp] rows to be saved, optionally followed by the
+                measurements.
+        Returns:
+            None
+        """
+        self.store.save_rows(data)
+
+    def flush(self, force: bool = False) -> None:
+        """
+        Make the written rows as durable as the durability asks for.
+        Args:
+            force (bool): Hand the rows to the operating system even with the "none" durability, so that readers of
+                the store see them.
+        Returns:
+            None
+        """
+
+    def close(self) -> None:
+        """
+        Flush the written rows and release the store.
+        Returns:
+            None
+        """
+        self.flush()
+
+    def _sync(self, file, force: bool) -> None:
+        if force or self.durability != "none":
+            file.flush()
+        if self.durability == "fsync":
+            os.fsync(file.fileno())
+
+    @staticmethod
+    def _append_rows(file, rows) -> None:
+        """
+        Append CSV rows to a file opened for unbuffered binary appending, so that nothing of them is left in the
+        process when a write fails, and the file can be truncated back to its size before the call.
+        """
+        text = io.StringIO()
+        csv.writer(text, lineterminator='\n').writerows(rows)
+        data = memoryview(text.getvalue().encode(locale.getpreferredencoding(False)))
+        while data:
+            data = data[file.write(data):]
+
+
+class CSVAvailabilityStoreWriter(AvailabilityStoreWriter):
+    """
+    Writer keeping the CSV file of a CSVAvailabilityStore open for appending. Every batch is handed to the operating
+    system as it is written, and a batch that fails part way, such as on a full disk, is truncated away.
+    """
+
+    def __init__(self, store: CSVAvailabilityStore, durability: str = constants.availability_writer_durability):
+        super().__init__(store, durability)
+        store._migrate_headers(store.filename, store.headers)
+        file_exists = os.path.isfile(store.filename)
+        self.file = open(store.filename, "ab", buffering=0)
+        if not file_exists:
+            self._append_rows(self.file, [store.headers])
+
+    def write_rows(self, data: list[list]) -> None:
+        size = self.file.seek(0, os.SEEK_END)
+        try:
+            self._append_rows(self.file, (self.store.encode_row(row) for row in data))
+        except OSError:
+            self.file.truncate(size)
+            raise
+
+    def flush(self, force: bool = False) -> None:
+        self._sync(self.file, force)
+
+    def close(self) -> None:
+        self.flush()
+        self.file.close()
+
+
+class SQLiteAvailabilityStoreWriter(AvailabilityStoreWriter):
+    """
+    Writer keeping one connection to the database of a SQLiteAvailabilityStore. Every batch is inserted in one
+    transaction. In WAL mode, the durability sets the synchronous mode: "none" never waits for the disk, "flush"
+    waits at checkpoints only, so a power loss can undo the last transactions but never corrupt the database, and
+    "fsync" waits for every transaction to be on disk.
+    """
+
+    def __init__(self, store: SQLiteAvailabilityStore, durability: str = constants.availability_writer_durability):
+        super().__init__(store, durability)
+        # The writer is used by one thread at a time, but not always by the one that opened it.
+        self.connection: sqlite3.Connection = sqlite3.connect(store.filename, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        synchronous = {"none": "OFF", "flush": "NORMAL", "fsync": "FULL"}[durability]
+        self.connection.execute(f"PRAGMA synchronous={synchronous}")
+
+    def write_rows(self, data: list[list]) -> None:
+        with self.connection:
+            self.connection.executemany(f"INSERT INTO availability ({self.store.columns}) "
+                                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                        (self.store.encode_row(row) for row in data))
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+class PartitionedCSVAvailabilityStoreWriter(AvailabilityStoreWriter):
+    """
+    Writer keeping the latest partition of a PartitionedCSVAvailabilityStore open for appending. Rows of an older
+    day, such as a batch written just after midnight, are appended to their partition with save_rows. The retention
+    policy is applied whenever a new partition is started. A batch that fails part way is truncated away from every
+    partition it was appended to.
+    """
+
+    def __init__(self, store: PartitionedCSVAvailabilityStore,
+                 durability: str = constants.availability_writer_durability):
+        super().__init__(store, durability)
+        self.day: date | None = None
+        self.file = None
+
+    def _open_partition(self, day: date) -> None:
+        self.close()
+        path = self.store._partition_path(day)
+        CSVAvailabilityStore._migrate_headers(path, self.store.headers)
+        file_exists = os.path.isfile(path)
+        self.day = day
+        self.file = open(path, "ab", buffering=0)
+        if not file_exists:
+            self._append_rows(self.file, [self.store.headers])
+            self.store.prune(self.store.compress_after_days, self.store.delete_after_days)
+
+    def write_rows(self, data: list[list]) -> None:
+        rows_by_day: dict[date, list[list]] = {}
+        for row in data:
+            row = self.store.encode_row(row)
+            rows_by_day.setdefault(decode_timestamp(row[2]).date(), []).append(row)
+        # The size of every partition appended to before the batch, or None for the partitions it created.
+        sizes: dict[str, int | None] = {}
+        try:
+            for day in sorted(rows_by_day):
+                if self.day is None or day > self.day:
+                    self._open_partition(day)
+                if day == self.day:
+                    sizes[self.file.name] = self.file.seek(0, os.SEEK_END)
+                    self._append_rows(self.file, rows_by_day[day])
+                else:
+                    path = self.store._partition_path(day)
+                    sizes[path] = os.path.getsize(path) if os.path.isfile(path) else None
+                    self.store.save_rows(rows_by_day[day])
+        except OSError:
+            for path, size in sizes.items():
+                if size is not None:
+                    os.truncate(path, size)
+                elif os.path.isfile(path):
+                    os.remove(path)
+            raise
+
+    def flush(self, force: bool = False) -> None:
+        if self.file is not None:
+            self._sync(self.file, force)
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+
+def open_availability_store(storage_backend: str, directory: str = "") -> AvailabilityStore:
+    """
+    Create the availability store of the given backend.
+    Args:
+        storage_backend (str): "csv", "sqlite", "partitioned" or "archive".
+        directory (str): The directory holding the store, such as the directory of a shard worker. Defaults to the
+            current directory.
+    Returns:
+        AvailabilityStore: The store of that backend, using the filenames from constants.
+    Raises:
+        ValueError: If the backend is not known.
+    """
+    match storage_backend:
+        case "csv":
+            return CSVAvailabilityStore(os.path.join(directory, constants.device_data_availability_filename))
+        case "sqlite":
+            return SQLiteAvailabilityStore(os.path.join(directory, constants.device_availability_database_filename))
+        case "partitioned":
+            return PartitionedCSVAvailabilityStore(os.path.join(directory,
+                                                                constants.device_availability_partitions_directory))
+        case "archive":
+            return ArchiveAvailabilityStore(os.path.join(directory, constants.device_availability_archive_filename))
+        case _:
+            raise ValueError(f"Unknown storage backend: {storage_backend}")
+
+
+def encode_timestamp(timestamp: datetime | str | int) -> int:
+    """
+    Encode a timestamp as epoch microseconds, the compact and sortable form stored in the availability data.
+    Args:
+        timestamp (datetime | str | int): A local datetime, an epoch microsecond value (as int or digit string), or a
+            legacy str(datetime) timestamp.
+    Returns:
+        int: The timestamp in microseconds since the epoch.
+    """
+    if isinstance(timestamp, int):
+        return timestamp
+    if isinstance(timestamp, str):
+        if timestamp.isdigit():
+            return int(timestamp)
+        timestamp = datetime.fromisoformat(timestamp)
+    return round(timestamp.timestamp() * 1_000_000)
+
+
+def decode_timestamp(timestamp: str | int) -> datetime:
+    """
+    Decode a stored timestamp into a local datetime.
+    Args:
+        timestamp (str | int): An epoch microsecond value (as int or digit string) or a legacy str(datetime) timestamp.
+    Returns:
+        datetime: The timestamp as a local datetime.
+    """
+    if isinstance(timestamp, str):
+        if not timestamp.isdigit():
+            return datetime.fromisoformat(timestamp)
+        timestamp = int(timestamp)
+    return datetime.fromtimestamp(timestamp // 1_000_000).replace(microsecond=timestamp % 1_000_000)
+
+
+def decode_measurement(value: float | str | None) -> float | None:
+    """
+    Decode a stored measurement.
+    Args:
+        value (float | str | None): A measurement as stored, a string when read from a CSV file.
+    Returns:
+        float | None: The measurement, or None if it is empty.
+    """
+    if value is None or value == "":
+        return None
+    return float(value)
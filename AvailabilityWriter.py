@@ -0,0 +1,228 @@
+import queue
+import sqlite3
+import threading
+import time
+
+import constants
+from AvailabilityStore import AvailabilityStore, AvailabilityStoreWriter
+
+# Queue marker asking the writer thread to write its pending rows and stop.
+CLOSE = object()
+
+
+class FlushRequest(threading.Event):
+    """
+    Queue marker of AvailabilityWriter.flush, asking the writer thread to write its pending rows now. It is set once
+    the rows queued before it are saved, or with the 'error' that kept them from being saved.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.error: Exception | None = None
+
+
+class AvailabilityWriter:
+    """
+    Class responsible for saving availability data from a background thread, so the ping loops never wait for the
+    storage backend.
+    Rows are put in a bounded queue and written in batches through one long-lived AvailabilityStoreWriter: a batch is
+    written as soon as 'batch_size' rows are pending, or 'flush_interval' seconds after its first row arrived,
+    whichever comes first, and then flushed to the level of the durability. When the queue is full, submit() blocks
+    until the writer thread catches up, so a slow disk slows the ping loop down instead of growing memory. A batch
+    that fails to be written is retried every 'flush_interval' seconds, while new rows wait in the queue; the store
+    writers leave nothing of a failed batch behind, so a retry never duplicates rows. flush() gives up, and raises
+    the error, after 'flush_retries' failed attempts in a row. A batch failing with any other error, such as a row
+    that cannot be encoded, is dropped at once and reported, so the writer thread never stops before it is closed.
+    Attributes:
+        store (AvailabilityStore): The store the rows are saved to.
+        durability (str): "none", "flush" or "fsync", see AvailabilityStore.open_writer.
+        batch_size (int): Number of pending rows that triggers a write.
+        flush_interval (float): Maximum number of seconds a row waits before being written.
+        flush_retries (int): Number of failed writes in a row after which a flush gives up.
+        queue (queue.Queue): The rows waiting for the writer thread, at most 'queue_size'.
+        rows_written (int): Number of rows written so far.
+    Methods:
+        __init__(self, store: AvailabilityStore, durability: str, queue_size: int, batch_size: int,
+                 flush_interval: float, flush_retries: int) -> None:
+            Initialize AvailabilityWriter and start its writer thread.
+        __str__(self) -> str:
+            Return a string representation of the AvailabilityWriter object.
+        __repr__(self) -> str:
+            Return a string representation that can be used to recreate the AvailabilityWriter object.
+        submit(self, data: list[list]) -> None:
+            Queue availability data to be saved.
+        flush(self, timeout: float | None) -> None:
+            Wait until every submitted row is saved.
+        close(self) -> None:
+            Save every submitted row and stop the writer thread.
+    """
+
+    def __init__(self, store: AvailabilityStore, durability: str = constants.availability_writer_durability,
+                 queue_size: int = constants.availability_writer_queue_size,
+                 batch_size: int = constants.availability_writer_batch_size,
+                 flush_interval: float = constants.availability_writer_flush_interval,
+                 flush_retries: int = constants.availability_writer_flush_retries):
+        """
+        Initialize AvailabilityWriter, open the store for writing and start the writer thread.
+        Args:
+            store (AvailabilityStore): The store the rows are saved to.
+            durability (str): "none", "flush" or "fsync", see AvailabilityStore.open_writer.
+            queue_size (int): Maximum number of rows waiting for the writer thread.
+            batch_size (int): Number of pending rows that triggers a write.
+            flush_interval (float): Maximum number of seconds a row waits before being written.
+            flush_retries (int): Number of failed writes in a row after which a flush gives up.
+        Raises:
+            ValueError: If the durability is not known.
+        """
+        self.store: AvailabilityStore = store
+        self.durability: str = durability
+        self.batch_size: int = max(1, batch_size)
+        self.flush_interval: float = flush_interval
+        self.flush_retries: int = max(1, flush_retries)
+        self.queue: queue.Queue = queue.Queue(max(1, queue_size))
+        self.rows_written: int = 0
+        self.closed: bool = False
+        self.store_writer: AvailabilityStoreWriter = store.open_writer(durability)
+        self.thread: threading.Thread = threading.Thread(target=self.run, name="availability-writer", daemon=True)
+        self.thread.start()
+
+    def __str__(self):
+        """
+        Return a string representation of the AvailabilityWriter object.
+        Returns:
+            str: String representation of the object.
+        """
+        return f"AvailabilityWriter with {self.queue.qsize()} rows queued"
+
+    def __repr__(self):
+        """
+        Return a string representation that can be used to recreate the AvailabilityWriter object.
+        Returns:
+            str: String representation for recreation.
+        """
+        return (f"AvailabilityWriter({self.store!r}, {self.durability!r}, {self.queue.maxsize}, {self.batch_size}, "
+                f"{self.flush_interval}, {self.flush_retries})")
+
+    def submit(self, data: list[list]) -> None:
+        """
+        Queue availability data to be saved by the writer thread, blocking while the queue is full.
+        Args:
+            data (list[list]): The [device_id, status, timestamp] rows to be saved, optionally followed by the
+                measurements.
+        Returns:
+            None
+        Raises:
+            RuntimeError: If the writer is closed.
+        """
+        if self.closed:
+            raise RuntimeError("The availability writer is closed")
+        for row in data:
+            self.queue.put(row)
+
+    def flush(self, timeout: float | None = None) -> None:
+        """
+        Wait until every row submitted so far is saved and handed to the operating system, whatever the
+        durability, for example before reading the store. If the rows keep failing to be written, the flush gives
+        up after 'flush_retries' attempts; the rows stay queued, and the writer thread keeps retrying them.
+        Args:
+            timeout (float, optional): Maximum number of seconds to wait. Defaults to waiting for the retries.
+        Returns:
+            None
+        Raises:
+            OSError | sqlite3.Error: The last write error, if the rows could not be saved.
+            Exception: The error that made the writer drop some of the rows, such as a ValueError for a row that
+                cannot be encoded.
+            TimeoutError: If the rows were not saved within 'timeout' seconds.
+        """
+        if self.closed:
+            return
+        request = FlushRequest()
+        self.queue.put(request)
+        if not request.wait(timeout):
+            raise TimeoutError(f"The availability data was not saved within {timeout} seconds")
+        if request.error is not None:
+            raise request.error
+
+    def close(self) -> None:
+        """
+        Save every submitted row, stop the writer thread and close the store writer. Rows that still cannot be
+        saved are reported and dropped.
+        Returns:
+            None
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(CLOSE)
+        self.thread.join()
+        self.store_writer.close()
+
+    def run(self) -> None:
+        """
+        Body of the writer thread: collect the queued rows into batches and write them until closed.
+        Returns:
+            None
+        """
+        pending: list[list] = []
+        write_deadline: float | None = None
+        # Flush requests received, set once every row queued before them is saved.
+        flush_requests: list[FlushRequest] = []
+        closing, failures = False, 0
+        while not closing or pending:
+            if not flush_requests and not closing and len(pending) < self.batch_size:
+                timeout = None if write_deadline is None else max(0.0, write_deadline - time.monotonic())
+                try:
+                    item = self.queue.get(timeout=timeout)
+                    while True:
+                        if isinstance(item, FlushRequest):
+                            flush_requests.append(item)
+                            break
+                        if item is CLOSE:
+                            closing = True
+                            break
+                        pending.append(item)
+                        if len(pending) >= self.batch_size:
+                            break
+                        item = self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+                if pending and write_deadline is None:
+                    write_deadline = time.monotonic() + self.flush_interval
+            if pending and (flush_requests or closing or len(pending) >= self.batch_size
+                            or time.monotonic() >= write_deadline):
+                try:
+                    self.store_writer.write_rows(pending)
+                    self.store_writer.flush()
+                    self.rows_written += len(pending)
+                    failures = 0
+                except Exception as error:
+                    # Any other error than a write error, such as a row that cannot be encoded, would fail every retry
+                    # too, so the batch is dropped at once and the pending flushes raise the error.
+                    write_error = isinstance(error, (OSError, sqlite3.Error))
+                    if write_error and not closing:
+                        print(f"{constants.availability_write_failed}: {error}")
+                        failures += 1
+                        if flush_requests and failures >= self.flush_retries:
+                            for request in flush_requests:
+                                request.error = error
+                                request.set()
+                            flush_requests = []
+                        write_deadline = time.monotonic() + self.flush_interval
+                        if flush_requests or len(pending) >= self.batch_size:
+                            time.sleep(self.flush_interval)
+                        continue
+                    print(f"{constants.availability_write_dropped}: {len(pending)} ({error})")
+                    if not write_error:
+                        for request in flush_requests:
+                            request.error = error
+                pending, write_deadline = [], None
+            if flush_requests and not pending:
+                try:
+                    self.store_writer.flush(force=True)
+                except Exception as error:
+                    print(f"{constants.availability_write_failed}: {error}")
+                    for request in flush_requests:
+                        request.error = error
+                for request in flush_requests:
+                    request.set()
+                flush_requests = []
@@ -1,37 +1,130 @@
 import csv
-import constants
-from datetime import datetime
 import os
+import constants
+from collections.abc import Iterator
+from datetime import datetime, timedelta
+from AvailabilityRollupManager import AvailabilityRollupManager
+from AvailabilityStore import (ArchiveAvailabilityStore, AvailabilityStore, MergedAvailabilityStore,
+                               decode_measurement, decode_timestamp, encode_timestamp, open_availability_store)
+from AvailabilityWriter import AvailabilityWriter
+from ShardManager import ShardManager
+from StatusSnapshot import StatusSnapshot
 
 
 class DeviceAvailabilityDataManager:
     """
     Class responsible for managing device availability data.
     Attributes:
-        device_availability_data_filename (str): The filename of the CSV file to store device availability data.
+        storage_backend (str): The storage backend holding the device availability data, "csv", "sqlite",
+            "partitioned" or "archive".
+        shard (str | None): The shard worker whose availability data is managed, "all" for the merged data of every
+            shard worker, or None when monitoring is not sharded.
+        directory (str): The directory holding the store and the rollups, the directory of the shard worker if any.
+        store (AvailabilityStore): The store of that backend.
+        recording_mode (str): "all" to save every ping result, or "transitions" to save only the results where a
+            device's status changed, plus one heartbeat result every 'heartbeat_interval' seconds per device.
+        heartbeat_interval (int): Seconds after which an unchanged status is saved again in "transitions" mode.
+        last_recorded_rows (dict[str, list] | None): The last row saved for each device, loaded from the store when
+            the first results are saved in "transitions" mode.
+        rollups_enabled (bool): Whether saved ping results are also added to the hourly and daily rollups.
+        rollup_manager (AvailabilityRollupManager | None): The rollups, opened on first use.
+        status_snapshot_enabled (bool): Whether saved ping results also update the current status snapshot.
+        status_snapshot (StatusSnapshot | None): The current status snapshot, opened for writing on first use.
+        writer (AvailabilityWriter | None): The background writer saving the ping results while it is started, see
+            start_writer. Without it, every batch is saved directly to the store.
     Methods:
-        __init__(self) -> None:
-            Initialize DeviceAvailabilityDataManager with the device availability data filename.
+        __init__(self, storage_backend: str, recording_mode: str, heartbeat_interval: int,
+                 rollups_enabled: bool, shard: str | None, status_snapshot_enabled: bool) -> None:
+            Initialize DeviceAvailabilityDataManager with the storage backend and recording mode.
         __str__(self) -> str:
             Return a string representation of the DeviceAvailabilityDataManager object.
         __repr__(self) -> str:
             Return a string representation that can be used to recreate the DeviceAvailabilityDataManager object.
         load_device_availability_data_file(self) -> list[list]:
-            Load device availability data from the CSV file.
+            Load device availability data from the store.
+        iter_device_availability_data(self, device_id: str | None, start: datetime | None, end: datetime | None,
+                                      status: int | None) -> Iterator[list]:
+            Lazily yield the device availability data matching the given filters.
         print_all_device_availability_data(self) -> None:\
             Print all the device availability data in a tabular format.
+        print_filtered_device_availability_data(self, device_id: str | None, start: datetime | None,
+                                                end: datetime | None, status: int | None) -> None:
+            Print the device availability data matching the given filters, row by row.
         print_device_availability_data_by_parameter(self, parameter: str, value: str) -> None:
             Print device availability data filtered by parameter and value.
-        save_device_availability_data_file(self, data: list[list]) -> None:
-            Save device availability data to the CSV file.
+        print_device_availability_data_by_parameters(self, filters: list[tuple[str, str]]) -> None:
+            Print device availability data matching every given (parameter, value) filter.
+        save_device_availability_data_file(self, data: list[list]) -> list[list]:
+            Save device availability data to the store.
+        start_writer(self, durability: str) -> AvailabilityWriter:
+            Save device availability data from a background writer until close_writer is called.
+        close_writer(self) -> None:
+            Save the data queued in the background writer and stop it.
+        get_device_states_at(self, timestamp: datetime) -> dict[str, list]:
+            Get the status every device had at a given time.
+        print_device_states_at(self, value: str) -> None:
+            Print the status every device had at a given time.
+        get_rollup_manager(self) -> AvailabilityRollupManager:
+            Get the hourly and daily rollups of the device availability data.
+        get_status_snapshot(self) -> StatusSnapshot:
+            Get the current status snapshot, to be updated with the saved ping results.
+        get_device_statuses(self, device_id: str | None) -> dict[str, dict] | None:
+            Get the current status of a device, or of every device, from the status snapshot.
+        print_device_statuses(self, device_id: str | None, load_devices_data: callable) -> None:
+            Print the current status of a device, or of every device.
+        remove_device_statuses(device_ids: list[str]) -> None:
+            Remove devices from the status snapshots.
+        print_uptime_report(self, device_id: str, value: str | None) -> None:
+            Print the uptime of a device, or of every device, from the rollups.
+        rebuild_rollups(self) -> None:
+            Recompute the rollups from the stored device availability data.
+        print_fleet_report(self, value: str | None) -> None:
+            Print fleet-wide uptime percentiles, outage durations and correlated outages.
+        import_device_availability_data_file(self, filename: str) -> None:
+            Import device availability data from a CSV file into the store.
+        archive_device_availability_data_file(self, filename: str) -> None:
+            Convert a CSV file of device availability data into the compressed archive.
+        prune_device_availability_data(self, compress_after_days: int, delete_after_days: int) -> None:
+            Compress or delete old device availability data.
         """
-    def __init__(self):
+    def __init__(self, storage_backend: str = constants.availability_storage_backend,
+                 recording_mode: str = constants.availability_recording_mode,
+                 heartbeat_interval: int = constants.availability_heartbeat_interval,
+                 rollups_enabled: bool = constants.availability_rollups_enabled, shard: str | None = None,
+                 status_snapshot_enabled: bool = constants.status_snapshot_enabled):
         """
-        Initialize DeviceAvailabilityDataManager with the device availability data filename.
+        Initialize DeviceAvailabilityDataManager with the storage backend and recording mode.
+        Args:
+            storage_backend (str): The storage backend holding the device availability data, "csv", "sqlite",
+                "partitioned" or "archive".
+            recording_mode (str): "all" to save every ping result, or "transitions" to save only status changes and
+                periodic heartbeats.
+            heartbeat_interval (int): Seconds after which an unchanged status is saved again in "transitions" mode.
+            rollups_enabled (bool): Whether saved ping results are also added to the hourly and daily rollups.
+            shard (str, optional): The shard worker whose availability data is managed, see ShardManager, or "all"
+                for a read-only view merging the availability data of every shard worker. The rollups of "all" are
+                the ones of the current directory, filled with rebuild_rollups.
+            status_snapshot_enabled (bool): Whether saved ping results also update the current status snapshot.
         Returns:
             None
         """
-        self.device_availability_data_filename = constants.device_data_availability_filename
+        self.storage_backend: str = storage_backend
+        self.shard: str | None = shard
+        self.directory: str = "" if shard in (None, "all") else ShardManager.get_shard_directory(shard)
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        self.store: AvailabilityStore = (
+            MergedAvailabilityStore([open_availability_store(storage_backend, ShardManager.get_shard_directory(worker))
+                                     for worker in ShardManager.list_shard_workers()]) if shard == "all"
+            else open_availability_store(storage_backend, self.directory))
+        self.recording_mode: str = recording_mode
+        self.heartbeat_interval: int = heartbeat_interval
+        self.last_recorded_rows: dict[str, list] | None = None
+        self.rollups_enabled: bool = rollups_enabled
+        self.rollup_manager: AvailabilityRollupManager | None = None
+        self.status_snapshot_enabled: bool = status_snapshot_enabled
+        self.status_snapshot: StatusSnapshot | None = None
+        self.writer: AvailabilityWriter | None = None
 
     def __str__(self):
         """
@@ -47,31 +140,39 @@ class DeviceAvailabilityDataManager:
         Returns:
             str: String representation for recreation.
         """
-        return "DeviceAvailabilityDataManager()"
+        return (f"DeviceAvailabilityDataManager({self.storage_backend!r}, {self.recording_mode!r}, "
+                f"{self.heartbeat_interval}, {self.rollups_enabled}, {self.shard!r}, {self.status_snapshot_enabled})")
 
     def load_device_availability_data_file(self) -> list[list]:
         """
-        Load device availability data from the CSV file.
+        Load device availability data from the store. The stores keep timestamps as epoch microseconds; they are
+        decoded here, so every row holds its timestamp as a str(datetime) in local time, as it always has.
         Returns:
             list[list]: A list of lists containing device availability data, with each row representing a device's
-                availability status and timestamp.
-        Raises:
-            FileNotFoundError: If the specified 'device_availability_data_filename' is not found, a new CSV file will be
-                created with headers and returned.
+                availability status and timestamp. The first row holds the headers.
         """
-        try:
-            with open(self.device_availability_data_filename) as file:
-                reader = csv.reader(file)
-                device_availability_data: list[list] = list(reader)
-                return device_availability_data
-        except FileNotFoundError:
-            print("File Not Found")
-            print(f"Creating File {self.device_availability_data_filename}")
-            headers = ["Device Id", "Status", "Timestamp"]
-            with open(self.device_availability_data_filename, "w", newline="") as file:
-                writer = csv.writer(file)
-                writer.writerow(headers)
-            return [headers]
+        rows: list[list] = self.store.load_rows()
+        return rows[:1] + [row[:2] + [str(decode_timestamp(row[2]))] + row[3:] for row in rows[1:]]
+
+    def iter_device_availability_data(self, device_id: str | None = None, start: datetime | None = None,
+                                      end: datetime | None = None, status: int | None = None) -> Iterator[list]:
+        """
+        Lazily yield the device availability data matching the given filters, one row at a time. Rows queued in the
+        background writer are saved first, so they are included, unless they fail to be saved, which is reported.
+        Args:
+            device_id (str, optional): Only yield the rows of this device.
+            start (datetime, optional): Only yield the rows recorded at or after this time.
+            end (datetime, optional): Only yield the rows recorded before this time.
+            status (int, optional): Only yield the rows with this status, 1 for active and 0 for inactive.
+        Returns:
+            Iterator[list]: The matching [device_id, status, timestamp] rows.
+        """
+        if self.writer is not None:
+            try:
+                self.writer.flush()
+            except Exception as error:
+                print(f"{constants.availability_flush_failed}: {error}")
+        return self.store.iter_rows(device_id, start, end, status)
 
     def print_all_device_availability_data(self) -> None:
         """
@@ -79,16 +180,36 @@ class DeviceAvailabilityDataManager:
         Returns:
             None
         """
-        device_availability_data: list = self.load_device_availability_data_file()
-        if len(device_availability_data) == 1:
+        self.print_filtered_device_availability_data()
+
+    def print_filtered_device_availability_data(self, device_id: str | None = None, start: datetime | None = None,
+                                                end: datetime | None = None, status: int | None = None) -> None:
+        """
+        Print the device availability data matching the given filters in a tabular format, with the RTTs and jitter
+        in milliseconds. Rows are printed as they are read, so memory use does not grow with the size of the
+        availability data.
+        Args:
+            device_id (str, optional): Only print the rows of this device.
+            start (datetime, optional): Only print the rows recorded at or after this time.
+            end (datetime, optional): Only print the rows recorded before this time.
+            status (int, optional): Only print the rows with this status.
+        Returns:
+            None
+        """
+        row_template = "{:^15} {:^10} {:^30} {:^12} {:^12} {:^12} {:^12} {:^10}"
+        rows_printed = 0
+        for row in self.iter_device_availability_data(device_id, start, end, status):
+            if rows_printed == 0:
+                print(row_template.format("Device Id", "Status", "Timestamp", "RTT Avg (ms)", "RTT Min (ms)",
+                                          "RTT Max (ms)", "Jitter (ms)", "Loss (%)"))
+            measurements = [decode_measurement(value) for value in row[3:8]]
+            measurements += [None] * (5 - len(measurements))
+            print(row_template.format(row[0], row[1], str(decode_timestamp(row[2])),
+                                      *("-" if value is None else f"{value * 1000:.3f}" for value in measurements[:4]),
+                                      "-" if measurements[4] is None else f"{measurements[4]:g}"))
+            rows_printed += 1
+        if rows_printed == 0:
             print(constants.no_device_availability_data_found)
-            return
-        row_template = "{:^15} {:^10} {:^40}"
-        print(row_template.format(device_availability_data[0][0],
-                                  device_availability_data[0][1],
-                                  device_availability_data[0][2]))
-        for availability_data in device_availability_data[1::]:
-            print(row_template.format(availability_data[0], availability_data[1], availability_data[2]))
 
     def print_device_availability_data_by_parameter(self, parameter: str, value: str) -> None:
         """
@@ -99,43 +220,396 @@ class DeviceAvailabilityDataManager:
         Returns:
             None
         """
-        device_availability_data: list = self.load_device_availability_data_file()
-        if len(device_availability_data) == 1:
+        self.print_device_availability_data_by_parameters([(parameter, value)])
+
+    def print_device_availability_data_by_parameters(self, filters: list[tuple[str, str]]) -> None:
+        """
+        Print device availability data matching every given (parameter, value) filter.
+        The parameters are 'id' (a device ID), 'date' (YYYY-MM-DD), 'range' (YYYY-MM-DD..YYYY-MM-DD, both days
+        included) and 'status' (1 for active, 0 for inactive).
+        Args:
+            filters (list[tuple[str, str]]): The (parameter, value) pairs to filter the device availability data by.
+        Returns:
+            None
+        """
+        device_id, start, end, status = None, None, None, None
+        for parameter, value in filters:
+            match parameter:
+                case "id":
+                    device_id = value
+                case "date" | "range":
+                    first_day, _, last_day = value.partition("..") if parameter == "range" else (value, "", value)
+                    try:
+                        start = datetime.strptime(first_day, "%Y-%m-%d")
+                        end = datetime.strptime(last_day, "%Y-%m-%d") + timedelta(days=1)
+                    except ValueError:
+                        print("Invalid date format. Please use 'YYYY-MM-DD' format, or 'YYYY-MM-DD..YYYY-MM-DD' "
+                              "for a range.")
+                        return
+                case "status":
+                    if value not in ("0", "1"):
+                        print("Invalid status. Please use 1 for active or 0 for inactive.")
+                        return
+                    status = int(value)
+                case _:
+                    print("Invalid parameter. Please use 'date', 'range', 'status' or 'id' as the parameter.")
+                    return
+        self.print_filtered_device_availability_data(device_id, start, end, status)
+
+    def save_device_availability_data_file(self, data: list[list]) -> list[list]:
+        """
+        Save device availability data to the store.
+        In "transitions" mode, a row is only saved if the device's status differs from the last saved one, or if the
+        last saved row is at least 'heartbeat_interval' seconds old. The status of a device at any time is then the
+        status of its last row before that time, see get_device_states_at.
+        Every result, saved or not, is added to the hourly and daily rollups and to the current status snapshot if
+        they are enabled. While the background writer is started, the rows are queued for it instead of being written
+        before returning.
+        Args:
+            data (list[list]): The list of lists containing device availability data to be saved.
+        Returns:
+            list[list]: The rows saved or queued, which are all of 'data' except in "transitions" mode.
+        """
+        if self.rollups_enabled:
+            self.get_rollup_manager().update_rollups(data)
+        if self.status_snapshot_enabled:
+            self.get_status_snapshot().update(data)
+        if self.recording_mode == "transitions":
+            data = self.filter_transitions(data)
+        if self.writer is not None:
+            self.writer.submit(data)
+        else:
+            self.store.save_rows(data)
+        return data
+
+    def start_writer(self, durability: str = constants.availability_writer_durability) -> AvailabilityWriter:
+        """
+        Save device availability data from a background writer, which keeps the store open and writes the rows in
+        batches, until close_writer is called. Used by the ping loops, which save results continuously.
+        Args:
+            durability (str): "none", "flush" or "fsync", see AvailabilityStore.open_writer.
+        Returns:
+            AvailabilityWriter: The started writer.
+        Raises:
+            ValueError: If the durability is not known.
+        """
+        if self.writer is None:
+            self.writer = AvailabilityWriter(self.store, durability)
+        return self.writer
+
+    def close_writer(self) -> None:
+        """
+        Save the device availability data queued in the background writer and stop it. Does nothing if the writer
+        is not started.
+        Returns:
+            None
+        """
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def filter_transitions(self, data: list[list]) -> list[list]:
+        """
+        Keep only the rows that change a device's status or are due as a heartbeat, and remember them as the last
+        saved rows.
+        Args:
+            data (list[list]): The [device_id, status, timestamp] rows to be saved.
+        Returns:
+            list[list]: The rows that need to be saved.
+        """
+        if self.last_recorded_rows is None:
+            self.last_recorded_rows = {device_id: [int(row[1]), encode_timestamp(row[2])]
+                                       for device_id, row in self.store.latest_rows().items()}
+        heartbeat_micros: int = self.heartbeat_interval * 1_000_000
+        transitions: list[list] = []
+        for row in data:
+            status, timestamp_micros = int(row[1]), encode_timestamp(row[2])
+            last_recorded: list | None = self.last_recorded_rows.get(row[0])
+            if (last_recorded is None or last_recorded[0] != status
+                    or timestamp_micros - last_recorded[1] >= heartbeat_micros):
+                transitions.append(row)
+                self.last_recorded_rows[row[0]] = [status, timestamp_micros]
+        return transitions
+
+    def get_device_states_at(self, timestamp: datetime) -> dict[str, list]:
+        """
+        Get the status every device had at a given time, from the last row recorded for it at or before that time.
+        This works with both recording modes, as every status change is recorded in both.
+        Args:
+            timestamp (datetime): The time to get the statuses at.
+        Returns:
+            dict[str, list]: The last [device_id, status, timestamp] row of every device at that time, keyed by device
+                ID.
+        """
+        return self.store.latest_rows(timestamp + timedelta(microseconds=1))
+
+    def print_device_states_at(self, value: str) -> None:
+        """
+        Print the status every device had at a given time in a tabular format.
+        Args:
+            value (str): The time, as 'YYYY-MM-DD HH:MM:SS' or 'YYYY-MM-DD' for the start of the day.
+        Returns:
+            None
+        """
+        try:
+            timestamp = datetime.fromisoformat(value)
+        except ValueError:
+            print("Invalid time format. Please use 'YYYY-MM-DD HH:MM:SS' or 'YYYY-MM-DD' format.")
+            return
+        device_states: dict[str, list] = self.get_device_states_at(timestamp)
+        if not device_states:
             print(constants.no_device_availability_data_found)
             return
         row_template = "{:^15} {:^10} {:^40}"
-        print(row_template.format(device_availability_data[0][0],
-                                  device_availability_data[0][1],
-                                  device_availability_data[0][2]))
-        if parameter == "date":
+        print(row_template.format("Device Id", "Status", "Recorded At"))
+        for device_id, row in device_states.items():
+            print(row_template.format(device_id, row[1], str(decode_timestamp(row[2]))))
+
+    def get_rollup_manager(self) -> AvailabilityRollupManager:
+        """
+        Get the hourly and daily rollups of the device availability data, opening them on first use.
+        Returns:
+            AvailabilityRollupManager: The rollups.
+        """
+        if self.rollup_manager is None:
+            self.rollup_manager = AvailabilityRollupManager(
+                os.path.join(self.directory, constants.device_availability_rollups_filename))
+        return self.rollup_manager
+
+    def get_status_snapshot(self) -> StatusSnapshot:
+        """
+        Get the current status snapshot, to be updated with the saved ping results, opening it on first use.
+        Returns:
+            StatusSnapshot: The snapshot, opened for writing.
+        """
+        if self.status_snapshot is None:
+            self.status_snapshot = StatusSnapshot(
+                os.path.join(self.directory, constants.device_status_snapshot_filename), writable=True)
+        return self.status_snapshot
+
+    def get_device_statuses(self, device_id: str | None = None) -> dict[str, dict] | None:
+        """
+        Get the current status of a device, or of every device, from the status snapshot, without reading the
+        availability data. With the "all" shard, the snapshots of every shard worker are read, and a device found in
+        several of them, after moving between workers, gets its most recent status.
+        Args:
+            device_id (str, optional): The device to get the status of. Defaults to every device.
+        Returns:
+            dict[str, dict] | None: The status of the device, or of every device, keyed by device ID, see
+                StatusSnapshot.get_status, or None if there is no snapshot yet.
+        """
+        directories = ([ShardManager.get_shard_directory(worker) for worker in ShardManager.list_shard_workers()]
+                       if self.shard == "all" else [self.directory])
+        statuses: dict[str, dict] | None = None
+        for directory in directories:
+            try:
+                status_snapshot = StatusSnapshot(os.path.join(directory, constants.device_status_snapshot_filename))
+            except (FileNotFoundError, ValueError):
+                continue
+            try:
+                if device_id is None:
+                    snapshot_statuses = status_snapshot.get_statuses()
+                else:
+                    status: dict | None = status_snapshot.get_status(device_id)
+                    snapshot_statuses = {device_id: status} if status is not None else {}
+            finally:
+                status_snapshot.close()
+            statuses = statuses if statuses is not None else {}
+            for snapshot_device_id, status in snapshot_statuses.items():
+                previous_status: dict | None = statuses.get(snapshot_device_id)
+                if previous_status is None or status["last_probe"] > previous_status["last_probe"]:
+                    statuses[snapshot_device_id] = status
+        return statuses
+
+    def print_device_statuses(self, device_id: str | None, load_devices_data: callable) -> None:
+        """
+        Print the current status of a device, or of every device, with the time of its last probe, the time since
+        which it has had that status, and its last RTT and packet loss. Every device lists the devices that were not
+        pinged yet too, except for a shard worker, which only lists the devices it pinged.
+        Args:
+            device_id (str | None): The device to print the status of, or None for every device.
+            load_devices_data (callable): Returns the device data, keyed by device ID. Only called when printing every
+                device, or when 'device_id' is not in the snapshot, to tell a device that was not pinged yet from an
+                unknown one.
+        Returns:
+            None
+        """
+        statuses: dict[str, dict] | None = self.get_device_statuses(device_id)
+        if statuses is None:
+            print(constants.status_snapshot_not_found)
+            return
+        if device_id is not None and device_id not in statuses:
+            print(constants.device_not_pinged_yet if device_id in load_devices_data() else "Invalid Id")
+            return
+        row_template = "{:^15} {:^10} {:^30} {:^30} {:^12} {:^10}"
+        print(row_template.format("Device Id", "Status", "Last Probe", "Status Since", "RTT (ms)", "Loss (%)"))
+        for row_device_id in [device_id] if device_id is not None else load_devices_data():
+            status: dict | None = statuses.get(row_device_id)
+            if status is None:
+                # A shard worker only pings its own devices; the others are left to the other workers.
+                if self.shard in (None, "all"):
+                    print(row_template.format(row_device_id, "-", "-", "-", "-", "-"))
+                continue
+            print(row_template.format(row_device_id, status["status"], str(decode_timestamp(status["last_probe"])),
+                                      str(decode_timestamp(status["last_change"])),
+                                      "-" if status["rtt"] is None else f"{status['rtt'] * 1000:.3f}",
+                                      "-" if status["loss"] is None else f"{status['loss']:g}"))
+
+    @staticmethod
+    def remove_device_statuses(device_ids: list[str]) -> None:
+        """
+        Remove devices from the status snapshot, and from the snapshots of every shard worker, for example once they
+        are deleted, so that --status no longer lists them. A running monitor takes the change into account before
+        it next updates its snapshot.
+        Args:
+            device_ids (list[str]): The IDs of the devices to remove.
+        Returns:
+            None
+        """
+        for directory in ["", *(ShardManager.get_shard_directory(worker)
+                                for worker in ShardManager.list_shard_workers())]:
+            filename = os.path.join(directory, constants.device_status_snapshot_filename)
+            if not os.path.isfile(filename):
+                continue
+            status_snapshot = StatusSnapshot(filename, writable=True)
+            try:
+                status_snapshot.remove(device_ids)
+            finally:
+                status_snapshot.close()
+
+    def print_uptime_report(self, device_id: str, value: str | None = None) -> None:
+        """
+        Print the uptime of a device, or of every device, from the rollups.
+        Args:
+            device_id (str): The device to report on, or "all" for every device.
+            value (str, optional): A day as 'YYYY-MM-DD' for an hourly report, or a range of days as
+                'YYYY-MM-DD..YYYY-MM-DD' for a daily one. Defaults to the last 7 days.
+        Returns:
+            None
+        """
+        self.get_rollup_manager().print_uptime_report(device_id, value)
+
+    def rebuild_rollups(self) -> None:
+        """
+        Recompute the rollups from the stored device availability data, for example for data recorded before the
+        rollups existed. In "transitions" mode only the saved rows are counted as samples.
+        Returns:
+            None
+        """
+        self.get_rollup_manager().rebuild_rollups(self.iter_device_availability_data())
+
+    def print_fleet_report(self, value: str | None = None) -> None:
+        """
+        Print the uptime percentiles of the devices, the histogram of their outage durations and the outages shared
+        by several devices, computed with the AvailabilityAnalyticsManager. Requires NumPy.
+        Args:
+            value (str, optional): A day as 'YYYY-MM-DD' or a range of days as 'YYYY-MM-DD..YYYY-MM-DD' to restrict
+                the report to. Defaults to the whole history.
+        Returns:
+            None
+        """
+        start, end = None, None
+        if value is not None:
+            first_day, _, last_day = value.partition("..")
             try:
-                target_date = datetime.strptime(value, "%Y-%m-%d").date()
+                start = datetime.strptime(first_day, "%Y-%m-%d")
+                end = datetime.strptime(last_day or first_day, "%Y-%m-%d") + timedelta(days=1)
             except ValueError:
-                print("Invalid date format. Please use 'YYYY-MM-DD' format.")
+                print("Invalid date format. Please use 'YYYY-MM-DD' format, or 'YYYY-MM-DD..YYYY-MM-DD' for a range.")
                 return
-            for row in device_availability_data[1:]:
-                timestamp = datetime.strptime(row[2], "%Y-%m-%d %H:%M:%S.%f").date()
-                if timestamp == target_date:
-                    print(row_template.format(row[0], row[1], row[2]))
-        elif parameter == "id":
-            for row in device_availability_data[1:]:
-                if row[0] == value:
-                    print(row_template.format(row[0], row[1], row[2]))
-        else:
-            print("Invalid parameter. Please use 'date' or 'id' as the parameter.")
+        # Imported here rather than with the module, as it imports NumPy, which most commands do not need.
+        from AvailabilityAnalyticsManager import AvailabilityAnalyticsManager
+        try:
+            analytics = AvailabilityAnalyticsManager.from_rows(self.iter_device_availability_data(start=start, end=end))
+        except ImportError:
+            print(constants.numpy_not_installed)
+            return
+        if not len(analytics.timestamps):
+            print(constants.no_device_availability_data_found)
+            return
+        analytics.print_fleet_report()
 
-    def save_device_availability_data_file(self, data: list[list]) -> None:
+    def import_device_availability_data_file(self, filename: str, batch_size: int = 10000) -> None:
         """
-        Save device availability data to the CSV file.
+        Import device availability data from a CSV file, such as an existing device availability data file, into the
+        store. Rows are saved in batches, so the CSV file is never loaded into memory at once. They are written to the
+        store as they are: they are not added to the rollups, which may already count them (rebuild_rollups adds
+        them), nor to the status snapshot, which holds the current status rather than historical rows.
         Args:
-            data (list[list]): The list of lists containing device availability data to be saved.
+            filename (str): The CSV file to import, with a header row followed by [device_id, status, timestamp] rows,
+                optionally followed by the measurements.
+            batch_size (int): The number of rows saved at a time.
+        Returns:
+            None
+        """
+        if self.shard == "all":
+            print(constants.merged_store_read_only)
+            return
+        try:
+            with open(filename, newline="") as file:
+                reader = csv.reader(file)
+                next(reader, None)
+                imported_rows = 0
+                batch: list[list] = []
+                for row in reader:
+                    batch.append(row[:len(AvailabilityStore.headers)])
+                    if len(batch) == batch_size:
+                        self.store.save_rows(batch)
+                        imported_rows += len(batch)
+                        batch = []
+                self.store.save_rows(batch)
+                imported_rows += len(batch)
+        except FileNotFoundError:
+            print("File Not Found")
+            return
+        print(f"{imported_rows} {constants.device_availability_data_imported_successfully}")
+
+    def archive_device_availability_data_file(self, filename: str) -> None:
+        """
+        Convert a CSV file of device availability data, such as the file of the "csv" backend, into the compressed
+        archive of the "archive" backend, see ArchiveAvailabilityStore. The rows are read and appended to the
+        archive one block at a time. Like import_device_availability_data_file, they are not added to the rollups
+        or the status snapshot, which were already updated when the rows were recorded.
+        Args:
+            filename (str): The CSV file to convert, with a header row followed by [device_id, status, timestamp]
+                rows, optionally followed by the measurements.
+        Returns:
+            None
+        """
+        if self.shard == "all":
+            print(constants.merged_store_read_only)
+            return
+        archive_store: ArchiveAvailabilityStore = open_availability_store("archive", self.directory)
+        archive_size = os.path.getsize(archive_store.filename) if os.path.isfile(archive_store.filename) else 0
+        try:
+            with open(filename, newline="") as file:
+                reader = csv.reader(file)
+                next(reader, None)
+                archived_rows = 0
+                batch: list[list] = []
+                for row in reader:
+                    batch.append(row[:len(AvailabilityStore.headers)])
+                    if len(batch) == archive_store.block_rows:
+                        archive_store.save_rows(batch)
+                        archived_rows += len(batch)
+                        batch = []
+                archive_store.save_rows(batch)
+                archived_rows += len(batch)
+        except FileNotFoundError:
+            print("File Not Found")
+            return
+        print(f"{archived_rows} {constants.device_availability_data_archived_successfully}")
+        print(f"{os.path.getsize(filename)} bytes of CSV archived in "
+              f"{os.path.getsize(archive_store.filename) - archive_size} bytes to {archive_store.filename}")
+
+    def prune_device_availability_data(self, compress_after_days: int = constants.availability_compress_after_days,
+                                       delete_after_days: int = constants.availability_delete_after_days) -> None:
+        """
+        Compress or delete old device availability data, as supported by the storage backend.
+        Args:
+            compress_after_days (int): Compress data older than this many days. 0 disables compression.
+            delete_after_days (int): Delete data older than this many days. 0 keeps all the data.
         Returns:
             None
         """
-        file_exists = os.path.isfile(self.device_availability_data_filename)
-        with open(self.device_availability_data_filename, "a", newline="") as file:
-            writer_object = csv.writer(file, lineterminator='\n')
-            if not file_exists:
-                headers = ["Device Id", "Status", "Timestamp"]
-                writer_object.writerow(headers)
-            writer_object.writerows(data)
+        self.store.prune(compress_after_days, delete_after_days)
@@ -1,12 +1,39 @@
+import contextlib
+import csv
 import json
+import os
+import sys
+import threading
+import time
 import constants
 
+try:
+    import fcntl
+except ImportError:
+    # Without flock, as on Windows, the processes changing the device data are not locked against each other.
+    fcntl = None
+
 
 class DeviceDataManager:
     """
     Class responsible for managing device data.
+    The device data is stored as a JSON snapshot plus an append-only journal of the changes made since the snapshot
+    was written. Single-device edits append one line to the journal, and once the journal holds
+    'device_data_journal_compaction_threshold' entries it is compacted into a new snapshot, which is written to a
+    temporary file and atomically renamed over the old one.
+    Every process and thread holds an exclusive flock on the '.lock' file next to the JSON file while it reads or
+    changes the files, so an append or a compaction always starts from every change made so far and none is lost.
     Attributes:
         device_data_filename (str): The filename of the JSON file to store device data.
+        device_data_journal_filename (str): The filename of the journal of changes made since the JSON file was written.
+        devices_data_cache (dict[str, dict] | None): The device data last read from or written to the files.
+        device_data_file_signature (tuple | None): The modification time and size of the JSON file and the journal
+            when the cache was filled, used to detect changes made by other processes.
+        device_data_journal_entries (int): The number of entries in the journal.
+        device_data_journal_length (int): The length in bytes of the complete entries of the journal, without an
+            entry cut short by a crash.
+        device_data_lock (threading.RLock): Held with the flock, so the threads of a process share the cache safely.
+        device_data_lock_file (file | None): The open lock file while the flock is held, for nested calls.
     Methods:
         __init__(self) -> None:
             Initialize DeviceDataManager with the device data filename.
@@ -14,11 +41,15 @@ class DeviceDataManager:
             Return a string representation of the DeviceDataManager object.
         __repr__() -> str:
             Return a string representation that can be used to recreate the DeviceDataManager object.
+        get_device_data_file_signature() -> tuple | None:
+            Get the modification time and size of the JSON file and the journal.
+        lock_device_data_files() -> contextlib.AbstractContextManager:
+            Hold the lock of the device data files.
         load_device_data_file() -> dict[str, dict]:
-            Load device data from the JSON file.
+            Load device data from the JSON file and the journal, or from the cache if they have not changed.
         check_if_id_exists(device_id: str) -> bool:
             Check if a device ID exists in the device data.
-        add_device(device_id: str, device_name: str, device_ip: str) -> None:
+        add_device(device_id: str, device_name: str, device_ip: str, probe: str | None) -> None:
             Add a new device to the device data.
         print_all_device_data() -> None:
             Print all the device data in a tabular format.
@@ -26,12 +57,24 @@ class DeviceDataManager:
             Print device data for a specific device ID.
         get_device_data_by_id(device_id: str) -> dict | None:
             Get device data for a specific device ID.
-        update_device_data_by_id(device_id: str, device_name: str, device_ip: str) -> None:
+        update_device_data_by_id(device_id: str, device_name: str, device_ip: str, probe: str | None) -> None:
             Update device data for a specific device ID.
         delete_device_by_id(device_id: str) -> None:
             Delete a device from the device data by its ID.
+        import_devices(filename: str, ip_validator: callable) -> None:
+            Add every valid device of a CSV, JSON or JSONL file in one write.
+        add_devices(records: list[dict], ip_validator: callable) -> dict[str, dict]:
+            Add every valid device of a batch in one write.
+        is_valid_probe(probe: str) -> bool:
+            Check if the probe of a device is valid.
+        export_devices(filename: str) -> None:
+            Write all the device data to a CSV, JSON or JSONL file.
+        append_device_data_journal(entries: list[dict]) -> None:
+            Durably record changes to the device data in the journal.
+        apply_device_data_journal_entries(devices_data: dict[str, dict], entries: list[dict]) -> None:
+            Apply changes recorded in the journal to device data.
         save_device_data_file(data: dict[str, dict]) -> None:
-            Save device data to the JSON file.
+            Atomically save device data to the JSON file and clear the journal.
     """
 
     def __init__(self):
@@ -39,6 +82,13 @@ class DeviceDataManager:
         Initialize DeviceDataManager with the device data filename.
         """
         self.device_data_filename = constants.device_data_filename
+        self.device_data_journal_filename = constants.device_data_journal_filename
+        self.devices_data_cache: dict[str, dict] | None = None
+        self.device_data_file_signature: tuple | None = None
+        self.device_data_journal_entries: int = 0
+        self.device_data_journal_length: int = 0
+        self.device_data_lock: threading.RLock = threading.RLock()
+        self.device_data_lock_file = None
 
     def __str__(self):
         """
@@ -56,35 +106,104 @@ class DeviceDataManager:
         """
         return f"DeviceDataManager()"
 
+    def get_device_data_file_signature(self) -> tuple | None:
+        """
+        Get the modification time and size of the device data file and of the journal.
+        Returns:
+            tuple | None: The modification time in nanoseconds and the size in bytes of both files (None for a file
+                that does not exist), or None if the device data file does not exist.
+        """
+        signature: list = []
+        for filename in (self.device_data_filename, self.device_data_journal_filename):
+            try:
+                file_stat = os.stat(filename)
+                signature.append((file_stat.st_mtime_ns, file_stat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature) if signature[0] is not None else None
+
+    @contextlib.contextmanager
+    def lock_device_data_files(self):
+        """
+        Hold the lock of the device data files: the lock of this object against the other threads, and an exclusive
+        flock on '<device_data_filename>.lock' against the other processes. Nested calls hold the same lock.
+        Returns:
+            contextlib.AbstractContextManager: The lock, released when the with block exits.
+        """
+        with self.device_data_lock:
+            if fcntl is None or self.device_data_lock_file is not None:
+                yield
+                return
+            with open(f"{self.device_data_filename}.lock", "ab") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self.device_data_lock_file = lock_file
+                try:
+                    yield
+                finally:
+                    # Closing the lock file releases the flock.
+                    self.device_data_lock_file = None
+
     def load_device_data_file(self) -> dict[str, dict] | dict:
         """
-        Load or get the device data from the device data file.
+        Load or get the device data from the device data file, replaying the changes recorded in the journal.
+        The files are parsed only when their modification time or size has changed since they were last read or
+        written, otherwise the cached device data is returned. The returned dictionary is the cache itself, so it
+        must only be changed through the methods of this class.
         Returns:
             dict[str, dict]: A dictionary containing device data with device IDs as keys and
             device information (name and IP address) as nested dictionaries.
         Raises:
             FileNotFoundError: If the specified 'device_data_filename' is not found, a new
                 JSON file will be created with an empty dictionary and returned.
-            json.JSONDecodeError: If the JSON file is empty or contains invalid JSON data,
-                a new JSON file will be created with an empty dictionary and returned.
+            json.JSONDecodeError: If the JSON file is empty, an empty dictionary is returned. If it contains invalid
+                JSON data, it is kept aside as '<device_data_filename>.corrupt-<time>' instead of being overwritten,
+                and the journal is replayed onto an empty dictionary.
         """
-        try:
-            with open(self.device_data_filename) as file:
-                return json.load(file)
-        except FileNotFoundError:
-            print("File Not Found")
-            print(f"Creating File {self.device_data_filename}")
-            with open(self.device_data_filename, "w") as file:
-                json.dump({}, file)
-        except json.JSONDecodeError:
-            print("Empty JSON File")
-            with open(self.device_data_filename, "w") as file:
-                json.dump({}, file)
-            return {}
+        with self.lock_device_data_files():
+            file_signature = self.get_device_data_file_signature()
+            if self.devices_data_cache is not None and file_signature == self.device_data_file_signature:
+                return self.devices_data_cache
+            try:
+                with open(self.device_data_filename) as file:
+                    file_data = file.read()
+                devices_data: dict[str, dict] = json.loads(file_data) if file_data.strip() else {}
+            except FileNotFoundError:
+                print("File Not Found")
+                print(f"Creating File {self.device_data_filename}")
+                devices_data = {}
+            except json.JSONDecodeError:
+                corrupt_filename = f"{self.device_data_filename}.corrupt-{int(time.time())}"
+                print(f"{constants.device_data_file_corrupt} {corrupt_filename}")
+                os.replace(self.device_data_filename, corrupt_filename)
+                devices_data = {}
+            self.device_data_journal_entries = 0
+            self.device_data_journal_length = 0
+            try:
+                with open(self.device_data_journal_filename, "rb") as journal:
+                    for line in journal:
+                        try:
+                            entry: dict = json.loads(line) if line.endswith(b"\n") else None
+                        except json.JSONDecodeError:
+                            entry = None
+                        if entry is None:
+                            # Only the last entry can be incomplete, if the process stopped while appending it. It is
+                            # skipped here, and cut off by the next append, see append_device_data_journal.
+                            break
+                        self.apply_device_data_journal_entries(devices_data, [entry])
+                        self.device_data_journal_length += len(line)
+                        self.device_data_journal_entries += 1
+            except FileNotFoundError:
+                pass
+            if not os.path.isfile(self.device_data_filename):
+                self.save_device_data_file(devices_data)
+                return self.devices_data_cache
+            self.devices_data_cache = devices_data
+            self.device_data_file_signature = self.get_device_data_file_signature()
+            return devices_data
 
     def check_if_id_exists(self, device_id: str) -> bool:
         """
-        Check if a device ID exists in the loaded device data.
+        Check if a device ID exists in the loaded device data. This is a dictionary lookup on the cached device data.
         Args:
             device_id (str): The unique identifier of the device to be checked.
         Returns:
@@ -93,13 +212,15 @@ class DeviceDataManager:
         devices_data: dict[str, dict] = self.load_device_data_file()
         return device_id in devices_data
 
-    def add_device(self, device_id: str, device_name: str, device_ip: str) -> None:
+    def add_device(self, device_id: str, device_name: str, device_ip: str, probe: str | None = None) -> None:
         """
         Add a new device to the device data.
         Args:
             device_id (str): The unique identifier for the new device.
             device_name (str): The name of the new device.
             device_ip (str): The IP address of the new device.
+            probe (str, optional): How the device is pinged, "icmp", "tcp:<port>", "udp" or "udp:<port>". Devices
+                without a probe are pinged over ICMP.
         Return:
             None
         """
@@ -109,9 +230,10 @@ class DeviceDataManager:
         if device_name == "" or device_ip == "":
             print(constants.device_name_ip_not_provided)
             return
-        devices_data: dict[str, dict] = self.load_device_data_file()
-        devices_data[device_id] = {'name': device_name, 'ip': device_ip}
-        self.save_device_data_file(devices_data)
+        device_data: dict = {'name': device_name, 'ip': device_ip}
+        if probe is not None:
+            device_data["probe"] = probe
+        self.append_device_data_journal([{"op": "set", "id": device_id, "data": device_data}])
         print(constants.device_added_successfully)
 
     def print_all_device_data(self) -> None:
@@ -158,25 +280,28 @@ class DeviceDataManager:
         return devices_data.get(device_id)
 
     def update_device_data_by_id(self, device_id: str, device_name: str,
-                                 device_ip: str) -> None:
+                                 device_ip: str, probe: str | None = None) -> None:
         """
         Update the details of a specific device using its ID.
         Args:
             device_id (str): The unique identifier of the device to be updated.
             device_name (str): The new name of the device.
             device_ip (str): The new IP address of the device.
+            probe (str, optional): The new probe of the device, see add_device.
         Returns:
             None
         """
         if not self.check_if_id_exists(device_id):
             print(constants.device_not_found_message)
             return
-        devices_data: dict[str, dict] = self.load_device_data_file()
+        device_data: dict = dict(self.load_device_data_file()[device_id])
         if device_name != "":
-            devices_data[device_id]["name"] = device_name
+            device_data["name"] = device_name
         if device_ip != "":
-            devices_data[device_id]["ip"] = device_ip
-        self.save_device_data_file(devices_data)
+            device_data["ip"] = device_ip
+        if probe is not None:
+            device_data["probe"] = probe
+        self.append_device_data_journal([{"op": "set", "id": device_id, "data": device_data}])
         print(constants.device_updated_successfully)
 
     def delete_device_by_id(self, device_id: str) -> None:
@@ -190,19 +315,260 @@ class DeviceDataManager:
         if not self.check_if_id_exists(device_id):
             print(constants.device_not_found_message)
             return
-        devices_data: dict[str, dict] = self.load_device_data_file()
-        devices_data.pop(device_id)
-        self.save_device_data_file(devices_data)
+        self.append_device_data_journal([{"op": "delete", "id": device_id}])
         print(constants.device_deleted_successfully)
 
+    @staticmethod
+    def get_device_file_format(filename: str) -> str | None:
+        """
+        Get the format of a device import or export file from its extension.
+        Args:
+            filename (str): The filename, or "-" for standard input or output, which uses JSONL.
+        Returns:
+            str | None: "csv", "json" or "jsonl", or None if the extension is not supported.
+        """
+        if filename == "-":
+            return "jsonl"
+        extension = os.path.splitext(filename)[1].lower().lstrip(".")
+        return extension if extension in ("csv", "json", "jsonl") else None
+
+    @staticmethod
+    def read_device_file(file, file_format: str) -> list[dict]:
+        """
+        Read the device records of an import file.
+        CSV files need 'id', 'name' and 'ip' columns, JSONL files hold one {"id", "name", "ip"} object per line, and
+        JSON files hold either a list of such objects or a dictionary keyed by device ID, like the device data file.
+        Any other columns or keys are kept as part of the device data.
+        Args:
+            file: The open import file.
+            file_format (str): "csv", "json" or "jsonl".
+        Returns:
+            list[dict]: The device records, each with an 'id' key.
+        Raises:
+            TypeError: If a JSON file holds neither a list nor a dictionary.
+        """
+        match file_format:
+            case "csv":
+                return [{key: value for key, value in record.items() if key and value not in (None, "")}
+                        for record in csv.DictReader(file)]
+            case "jsonl":
+                return [json.loads(line) for line in file if line.strip()]
+            case _:
+                file_data = json.load(file)
+                if isinstance(file_data, dict):
+                    return [{"id": device_id, **device_data} for device_id, device_data in file_data.items()]
+                if not isinstance(file_data, list):
+                    raise TypeError("The device file holds neither a list nor a dictionary of devices")
+                return file_data
+
+    def import_devices(self, filename: str, ip_validator: callable) -> None:
+        """
+        Add every valid device of a CSV, JSON or JSONL file to the device data in one write, see add_devices.
+        Args:
+            filename (str): The import file, or "-" to read JSONL from standard input.
+            ip_validator (callable): The function used to validate the IP of every device.
+        Returns:
+            None
+        """
+        file_format = self.get_device_file_format(filename)
+        if file_format is None:
+            print(constants.unsupported_device_file_format)
+            return
+        try:
+            if filename == "-":
+                records: list[dict] = self.read_device_file(sys.stdin, file_format)
+            else:
+                with open(filename, newline="") as file:
+                    records: list[dict] = self.read_device_file(file, file_format)
+        except FileNotFoundError:
+            print("File Not Found")
+            return
+        except (json.JSONDecodeError, AttributeError, TypeError):
+            print(constants.invalid_device_file)
+            return
+        self.add_devices(records, ip_validator)
+
+    def add_devices(self, records: list[dict], ip_validator: callable) -> dict[str, dict]:
+        """
+        Add many devices to the device data in one write.
+        Records that are not objects, or with a missing or duplicate device ID, an ID containing spaces, an empty
+        name, an invalid IP or an invalid "probe", are skipped and reported, and the rest of the batch is committed at
+        once.
+        Args:
+            records (list[dict]): The devices to add, each with 'id', 'name' and 'ip' keys. Any other keys are kept as
+                part of the device data.
+            ip_validator (callable): The function used to validate the IP of every device.
+        Returns:
+            dict[str, dict]: The device data of the devices that were added, keyed by device ID.
+        """
+        devices_data: dict[str, dict] = self.load_device_data_file()
+        added_devices: dict[str, dict] = {}
+        skipped_devices = 0
+        for record_number, record in enumerate(records, start=1):
+            if not isinstance(record, dict):
+                skipped_devices += 1
+                print(f"Record {record_number}: Skipped, not an object with 'id', 'name' and 'ip' keys")
+                continue
+            device_data: dict = {key: value for key, value in record.items() if key != "id"}
+            device_id: str = str(record.get("id", "")).strip()
+            device_data["name"] = str(device_data.get("name", "")).strip()
+            device_data["ip"] = str(device_data.get("ip", "")).strip()
+            if device_id == "" or " " in device_id:
+                problem = "device ID is missing or contains spaces"
+            elif device_id in devices_data or device_id in added_devices:
+                problem = f"duplicate device ID {device_id}"
+            elif device_data["name"] == "":
+                problem = f"device name of {device_id} is missing"
+            elif not ip_validator(device_data["ip"]):
+                problem = f"IP {device_data['ip']!r} of {device_id} is not valid"
+            elif "probe" in device_data and not self.is_valid_probe(device_data["probe"]):
+                problem = f"probe {device_data['probe']!r} of {device_id} is not valid"
+            else:
+                added_devices[device_id] = device_data
+                continue
+            skipped_devices += 1
+            print(f"Record {record_number}: Skipped, {problem}")
+        if added_devices:
+            self.append_device_data_journal([{"op": "set", "id": device_id, "data": device_data}
+                                             for device_id, device_data in added_devices.items()])
+        print(f"{len(added_devices)} {constants.devices_imported_successfully}, {skipped_devices} skipped")
+        return added_devices
+
+    @staticmethod
+    def is_valid_probe(probe: str) -> bool:
+        """
+        Check if the probe of a device is valid, see ReachabilityProbeManager.parse_probe.
+        Args:
+            probe (str): The probe to be validated
+        Returns:
+            bool: True if the probe is valid, otherwise False
+        """
+        # Imported on first use, so that the commands that do not ping start faster.
+        from ReachabilityProbeManager import ReachabilityProbeManager
+        return ReachabilityProbeManager.parse_probe(probe) is not None
+
+    def export_devices(self, filename: str) -> None:
+        """
+        Write all the device data to a CSV, JSON or JSONL file, in the format read by import_devices.
+        Args:
+            filename (str): The export file, or "-" to write JSONL to standard output.
+        Returns:
+            None
+        """
+        file_format = self.get_device_file_format(filename)
+        if file_format is None:
+            print(constants.unsupported_device_file_format)
+            return
+        devices_data: dict[str, dict] = self.load_device_data_file()
+        file = sys.stdout if filename == "-" else open(filename, "w", newline="")
+        try:
+            match file_format:
+                case "csv":
+                    columns: list[str] = ["id", "name", "ip"]
+                    for device_data in devices_data.values():
+                        columns.extend(key for key in device_data if key not in columns)
+                    writer = csv.DictWriter(file, fieldnames=columns, lineterminator="\n")
+                    writer.writeheader()
+                    writer.writerows({"id": device_id, **device_data}
+                                     for device_id, device_data in devices_data.items())
+                case "jsonl":
+                    for device_id, device_data in devices_data.items():
+                        file.write(json.dumps({"id": device_id, **device_data}) + "\n")
+                case _:
+                    json.dump(devices_data, file, indent=4)
+        finally:
+            if file is not sys.stdout:
+                file.close()
+        if file is not sys.stdout:
+            print(f"{len(devices_data)} {constants.devices_exported_successfully} {filename}")
+
+    def append_device_data_journal(self, entries: list[dict]) -> None:
+        """
+        Durably record changes to the device data by appending them to the journal, then apply them to the cached
+        device data. This costs the same however many devices there are. The journal is compacted into the device
+        data file once it holds 'device_data_journal_compaction_threshold' entries. The files are loaded again, if
+        another process changed them, and compacted holding their lock, so no change of another process is lost.
+        Args:
+            entries (list[dict]): The changes, each either {"op": "set", "id": device_id, "data": device_data} or
+                {"op": "delete", "id": device_id}.
+        Returns:
+            None
+        """
+        with self.lock_device_data_files():
+            # Loading compares the signature of the files with the cached one, and reads them again if they changed.
+            devices_data: dict[str, dict] = self.load_device_data_file()
+            if self.device_data_journal_entries + len(entries) >= constants.device_data_journal_compaction_threshold:
+                # The journal would be compacted right away, so write the snapshot directly.
+                devices_data = dict(devices_data)
+                self.apply_device_data_journal_entries(devices_data, entries)
+                self.save_device_data_file(devices_data)
+                return
+            data: bytes = "".join(json.dumps(entry) + "\n" for entry in entries).encode()
+            loaded_length: int = self.device_data_file_signature[1][1] if self.device_data_file_signature[1] else 0
+            with open(self.device_data_journal_filename, "ab") as journal:
+                journal_length = journal.seek(0, os.SEEK_END)
+                if journal_length == loaded_length > self.device_data_journal_length:
+                    # The last entry was cut short by a crash: cut it off so that these entries start on a line of their
+                    # own.
+                    journal.truncate(self.device_data_journal_length)
+                    journal_length = self.device_data_journal_length
+                journal.write(data)
+                journal.flush()
+                os.fsync(journal.fileno())
+                end = journal.tell()
+            file_signature = self.get_device_data_file_signature()
+            if (journal_length != self.device_data_journal_length or end != journal_length + len(data)
+                    or file_signature is None or file_signature[0] != self.device_data_file_signature[0]):
+                # Without flock, another process may have appended to the journal or compacted it since it was
+                # loaded. Refreshing the signature would hide its changes, so the files are loaded again instead.
+                self.devices_data_cache = None
+                self.load_device_data_file()
+                return
+            self.apply_device_data_journal_entries(devices_data, entries)
+            self.device_data_journal_entries += len(entries)
+            self.device_data_journal_length = end
+            self.device_data_file_signature = file_signature
+
+    @staticmethod
+    def apply_device_data_journal_entries(devices_data: dict[str, dict], entries: list[dict]) -> None:
+        """
+        Apply changes recorded in the journal to device data, in order.
+        Args:
+            devices_data (dict[str, dict]): The device data to be changed in place, keyed by device ID.
+            entries (list[dict]): The changes, see append_device_data_journal.
+        Returns:
+            None
+        """
+        for entry in entries:
+            if entry["op"] == "set":
+                devices_data[entry["id"]] = entry["data"]
+            else:
+                devices_data.pop(entry["id"], None)
+
     def save_device_data_file(self, data: dict[str, dict]) -> None:
         """
         Save the device data in device data file
+        The data is written to a temporary file which is synced to disk and renamed over the device data file, so the
+        device data file always holds either the old or the new device data. The journal is cleared afterwards, as
+        its changes are part of the saved data.
         Args:
             data (dict[str, dict]): The dictionary containing the device data to be saved.
         Returns:
             None
         """
-        with open(self.device_data_filename, "w") as file:
-            file_data = json.dumps(data, indent=4)
-            file.write(file_data)
+        with self.lock_device_data_files():
+            # A name of its own, in case a process without flock saves at the same time.
+            temporary_filename = f"{self.device_data_filename}.{os.getpid()}-{threading.get_ident()}.tmp"
+            with open(temporary_filename, "w") as file:
+                file_data = json.dumps(data, indent=4)
+                file.write(file_data)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temporary_filename, self.device_data_filename)
+            if os.path.isfile(self.device_data_journal_filename):
+                # A crash before this point only leaves changes in the journal that replaying applies again unchanged.
+                os.remove(self.device_data_journal_filename)
+            self.devices_data_cache = data
+            self.device_data_journal_entries = 0
+            self.device_data_journal_length = 0
+            self.device_data_file_signature = self.get_device_data_file_signature()
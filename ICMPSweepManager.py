@@ -0,0 +1,296 @@
+import ipaddress
+import os
+import socket
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import constants
+
+ICMP_ECHO_REQUEST: int = 8
+ICMP_ECHO_REPLY: int = 0
+ICMPV6_ECHO_REQUEST: int = 128
+ICMPV6_ECHO_REPLY: int = 129
+
+
+class ICMPSweepManager:
+    """
+    Class responsible for pinging many IPs at once from a single shared ICMP socket.
+    Every echo request of a sweep is sent from the same socket and the replies are collected in one receive loop,
+    matched back to their target by source address, identifier and sequence number. IPv6 addresses are pinged with
+    ICMPv6 from a second socket, swept at the same time as the IPv4 addresses.
+    Attributes:
+        timeout (float): Seconds to wait for replies after the last echo request has been sent.
+        count (int): Number of echo requests sent to every IP in a sweep.
+        socket_factory (callable): Callable returning the socket used for a sweep of the given address family.
+            Defaults to a raw ICMP socket, falling back to an unprivileged datagram ICMP socket.
+        rate (float | None): Maximum number of echo requests sent per second, or None for no limit.
+    Methods:
+        __init__(self, timeout: float, count: int, socket_factory: callable | None, rate: float | None) -> None:
+            Initialize ICMPSweepManager with the sweep settings.
+        __str__(self) -> str:
+            Return a string representation of the ICMPSweepManager object.
+        __repr__(self) -> str:
+            Return a string representation that can be used to recreate the ICMPSweepManager object.
+        sweep(self, ips: list[str]) -> dict[str, dict]:
+            Ping every IP from one socket and return the RTTs and loss of each IP.
+        sweep_devices(self, devices_data: dict[str, dict]) -> dict[str, dict]:
+            Sweep the IPs of the given devices and return the results by device ID.
+        open_icmp_socket(family: int) -> socket.socket:
+            Open the socket used for a sweep of the given address family.
+        build_echo_request(identifier: int, sequence: int, request_type: int) -> bytes:
+            Build an ICMP or ICMPv6 echo request packet.
+        parse_echo_reply(packet: bytes, reply_type: int) -> tuple[int, int] | None:
+            Extract the identifier and sequence number from an ICMP or ICMPv6 echo reply packet.
+    """
+
+    def __init__(self, timeout: float = constants.ping_timeout, count: int = 1, socket_factory: callable = None,
+                 rate: float | None = None):
+        """
+        Initialize ICMPSweepManager with the sweep settings.
+        Args:
+            timeout (float): Seconds to wait for replies after the last echo request has been sent.
+            count (int): Number of echo requests sent to every IP in a sweep.
+            socket_factory (callable, optional): Callable returning the socket used for a sweep of the given address
+                family.
+            rate (float, optional): Maximum number of echo requests sent per second.
+        """
+        self.timeout: float = timeout
+        self.count: int = max(1, count)
+        self.socket_factory: callable = socket_factory if socket_factory is not None else self.open_icmp_socket
+        self.rate: float | None = rate
+
+    def __str__(self):
+        """
+        Return a string representation of the ICMPSweepManager object.
+        Returns:
+            str: String representation of the object.
+        """
+        return "ICMPSweepManager"
+
+    def __repr__(self):
+        """
+        Return a string representation that can be used to recreate the ICMPSweepManager object.
+        Returns:
+            str: String representation for recreation.
+        """
+        return f"ICMPSweepManager(timeout={self.timeout}, count={self.count}, rate={self.rate})"
+
+    @staticmethod
+    def open_icmp_socket(family: int = socket.AF_INET) -> socket.socket:
+        """
+        Open the socket used for a sweep of the given address family.
+        A raw ICMP socket is used when the process is privileged, otherwise the unprivileged datagram ICMP socket
+        available on Linux and macOS is used.
+        Args:
+            family (int): socket.AF_INET for an ICMP socket, or socket.AF_INET6 for an ICMPv6 socket.
+        Returns:
+            socket.socket: An ICMP socket.
+        Raises:
+            OSError: If neither socket type can be opened.
+        """
+        protocol = socket.IPPROTO_ICMPV6 if family == socket.AF_INET6 else socket.IPPROTO_ICMP
+        try:
+            icmp_socket = socket.socket(family, socket.SOCK_RAW, protocol)
+        except PermissionError:
+            icmp_socket = socket.socket(family, socket.SOCK_DGRAM, protocol)
+        try:
+            # Replies of a large sweep arrive in a burst, so make room for them in the receive buffer.
+            icmp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        except OSError:
+            pass
+        return icmp_socket
+
+    @staticmethod
+    def checksum(data: bytes) -> int:
+        """
+        Compute the internet checksum of the given data.
+        Args:
+            data (bytes): The data to checksum.
+        Returns:
+            int: The 16-bit one's complement checksum.
+        """
+        if len(data) % 2:
+            data += b"\x00"
+        total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+        total = (total >> 16) + (total & 0xFFFF)
+        total += total >> 16
+        return ~total & 0xFFFF
+
+    @staticmethod
+    def build_echo_request(identifier: int, sequence: int, request_type: int = ICMP_ECHO_REQUEST) -> bytes:
+        """
+        Build an ICMP or ICMPv6 echo request packet.
+        The checksum of an ICMPv6 packet covers the IPv6 addresses, so it is left to the kernel.
+        Args:
+            identifier (int): The ICMP identifier of the request.
+            sequence (int): The ICMP sequence number of the request.
+            request_type (int): ICMP_ECHO_REQUEST, or ICMPV6_ECHO_REQUEST for an ICMPv6 packet.
+        Returns:
+            bytes: The packet, ready to be sent.
+        """
+        payload = b"device-availability-monitoring"
+        header = struct.pack("!BBHHH", request_type, 0, 0, identifier, sequence)
+        if request_type == ICMPV6_ECHO_REQUEST:
+            return header + payload
+        packet_checksum = ICMPSweepManager.checksum(header + payload)
+        return struct.pack("!BBHHH", request_type, 0, packet_checksum, identifier, sequence) + payload
+
+    @staticmethod
+    def parse_echo_reply(packet: bytes, reply_type: int = ICMP_ECHO_REPLY) -> tuple[int, int] | None:
+        """
+        Extract the identifier and sequence number from an ICMP or ICMPv6 echo reply packet.
+        Raw IPv4 sockets deliver the IPv4 header in front of the ICMP message, datagram and ICMPv6 sockets do not.
+        Args:
+            packet (bytes): The packet received from the socket.
+            reply_type (int): ICMP_ECHO_REPLY, or ICMPV6_ECHO_REPLY for an ICMPv6 packet.
+        Returns:
+            tuple[int, int] | None: The identifier and sequence number, or None if the packet is not an echo reply.
+        """
+        if reply_type == ICMP_ECHO_REPLY and packet and packet[0] >> 4 == 4:
+            packet = packet[(packet[0] & 0x0F) * 4:]
+        if len(packet) < 8:
+            return None
+        icmp_type, _, _, identifier, sequence = struct.unpack("!BBHHH", packet[:8])
+        if icmp_type != reply_type:
+            return None
+        return identifier, sequence
+
+    def sweep(self, ips: list[str]) -> dict[str, dict]:
+        """
+        Ping every IP from one socket per address family and return the RTTs and loss of each IP.
+        All echo requests are sent up front (paced to 'rate' per second if set), replies that arrive meanwhile are
+        drained between sends, and the sweep ends once every request is answered or 'timeout' seconds after the last
+        request was sent. The IPv4 and IPv6 addresses are swept at the same time, sharing the rate.
+        Args:
+            ips (list[str]): The IPv4 and IPv6 addresses to ping. Duplicates are pinged once.
+        Returns:
+            dict[str, dict]: For every IP, a dictionary with 'rtt' (average RTT in seconds, or None if no reply was
+                received), 'rtts' (the RTT of every reply) and 'loss' (percentage of requests left unanswered).
+        Raises:
+            OSError: If the ICMP socket of an address family can not be opened.
+        """
+        targets: list[str] = list(dict.fromkeys(ips))
+        results: dict[str, dict] = {ip: {"rtt": None, "rtts": [], "loss": 100.0} for ip in targets}
+        # Replies come from the canonical form of an address, which the device data may spell differently.
+        addresses: dict[int, dict[str, list[str]]] = {socket.AF_INET: {}, socket.AF_INET6: {}}
+        for ip in targets:
+            try:
+                address = ipaddress.ip_address(ip)
+            except ValueError:
+                continue
+            family = socket.AF_INET6 if address.version == 6 else socket.AF_INET
+            addresses[family].setdefault(address.compressed, []).append(ip)
+        addresses = {family: family_addresses for family, family_addresses in addresses.items() if family_addresses}
+        if not addresses:
+            return results
+        total: int = sum(len(family_addresses) for family_addresses in addresses.values())
+        with ThreadPoolExecutor(max_workers=len(addresses)) as executor:
+            sweeps = {family: executor.submit(self._sweep_family, family, list(family_addresses),
+                                              self.rate * len(family_addresses) / total if self.rate else None)
+                      for family, family_addresses in addresses.items()}
+            for family, family_sweep in sweeps.items():
+                for address, rtts in family_sweep.result().items():
+                    for ip in addresses[family][address]:
+                        results[ip]["rtts"] = list(rtts)
+        for result in results.values():
+            if result["rtts"]:
+                result["rtt"] = sum(result["rtts"]) / len(result["rtts"])
+                result["loss"] = 100.0 * (self.count - len(result["rtts"])) / self.count
+        return results
+
+    def _sweep_family(self, family: int, targets: list[str], rate: float | None) -> dict[str, list[float]]:
+        """
+        Ping the given canonical addresses of one address family from one socket, see sweep.
+        Returns:
+            dict[str, list[float]]: The RTT of every reply, keyed by address.
+        """
+        request_type, reply_type = ((ICMPV6_ECHO_REQUEST, ICMPV6_ECHO_REPLY) if family == socket.AF_INET6
+                                    else (ICMP_ECHO_REQUEST, ICMP_ECHO_REPLY))
+        rtts: dict[str, list[float]] = {ip: [] for ip in targets}
+        base_identifier: int = os.getpid() & 0xFFFF
+        # (source ip, sequence) -> (identifier, send time); the identifier is not checked on datagram sockets,
+        # because the kernel replaces it with its own.
+        pending: dict[tuple[str, int], tuple[int, float]] = {}
+        icmp_socket = self.socket_factory(family)
+        check_identifier: bool = getattr(icmp_socket, "type", socket.SOCK_RAW) == socket.SOCK_RAW
+        try:
+            icmp_socket.setblocking(False)
+            probe_number = 0
+            send_start = time.perf_counter()
+            for _ in range(self.count):
+                for ip in targets:
+                    if rate:
+                        # Pace the requests, collecting replies while waiting for the next send slot.
+                        send_at = send_start + probe_number / rate
+                        while (remaining := send_at - time.perf_counter()) > 0:
+                            icmp_socket.settimeout(remaining)
+                            self._receive(icmp_socket, pending, rtts, check_identifier, reply_type, wait=True)
+                            icmp_socket.setblocking(False)
+                    identifier = (base_identifier + probe_number // 0x10000) & 0xFFFF
+                    sequence = probe_number % 0x10000
+                    packet = self.build_echo_request(identifier, sequence, request_type)
+                    pending[(ip, sequence)] = (identifier, time.perf_counter())
+                    self._send(icmp_socket, packet, (ip, sequence), pending, rtts, check_identifier, reply_type)
+                    probe_number += 1
+                    if probe_number % 64 == 0:
+                        self._receive(icmp_socket, pending, rtts, check_identifier, reply_type)
+            deadline = time.perf_counter() + self.timeout
+            while pending:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                icmp_socket.settimeout(remaining)
+                self._receive(icmp_socket, pending, rtts, check_identifier, reply_type, wait=True)
+        finally:
+            icmp_socket.close()
+        return rtts
+
+    def sweep_devices(self, devices_data: dict[str, dict]) -> dict[str, dict]:
+        """
+        Sweep the IPs of the given devices and return the results by device ID.
+        Args:
+            devices_data (dict[str, dict]): Device data with device IDs as keys, as returned by the DeviceDataManager.
+        Returns:
+            dict[str, dict]: The sweep result of every device's IP, keyed by device ID.
+        """
+        results: dict[str, dict] = self.sweep([device_data["ip"] for device_data in devices_data.values()])
+        return {device_id: results[device_data["ip"]] for device_id, device_data in devices_data.items()}
+
+    def _send(self, icmp_socket, packet: bytes, key: tuple[str, int], pending: dict, rtts: dict,
+              check_identifier: bool, reply_type: int) -> None:
+        while True:
+            try:
+                icmp_socket.sendto(packet, (key[0], 0))
+                return
+            except BlockingIOError:
+                # The send buffer is full: drain replies until there is room again.
+                icmp_socket.settimeout(0.01)
+                self._receive(icmp_socket, pending, rtts, check_identifier, reply_type, wait=True)
+                icmp_socket.setblocking(False)
+            except OSError:
+                # Unroutable address: the request can never be answered.
+                pending.pop(key, None)
+                return
+
+    @staticmethod
+    def _receive(icmp_socket, pending: dict, rtts: dict, check_identifier: bool, reply_type: int,
+                 wait: bool = False) -> None:
+        while pending:
+            try:
+                packet, address = icmp_socket.recvfrom(2048)
+            except (BlockingIOError, socket.timeout):
+                return
+            received_at = time.perf_counter()
+            # A raw ICMPv6 socket also receives the echo requests sent to a local address, which are skipped here.
+            reply = ICMPSweepManager.parse_echo_reply(packet, reply_type)
+            if reply is None:
+                continue
+            identifier, sequence = reply
+            request = pending.get((address[0], sequence))
+            if request is None or (check_identifier and request[0] != identifier):
+                continue
+            del pending[(address[0], sequence)]
+            rtts[address[0]].append(received_at - request[1])
+            if wait:
+                icmp_socket.setblocking(False)
@@ -1,23 +1,100 @@
 import ipaddress
+import re
+import signal
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-
-import ping3
+from typing import TYPE_CHECKING
 
 import constants
 from DeviceAvailabilityDataManager import DeviceAvailabilityDataManager
 from DeviceDataManager import DeviceDataManager
+from ICMPSweepManager import ICMPSweepManager
+from MetricsManager import MetricsManager
+from MonitoringScheduler import MonitoringScheduler
+from ShardManager import ShardManager
+
+if TYPE_CHECKING:
+    import multiprocessing.pool
 
 
 class IPAndPingManager:
-    def __init__(self):
+    def __init__(self, concurrency: int = constants.ping_concurrency, timeout: float = constants.ping_timeout,
+                 ping_engine: str = constants.ping_engine,
+                 storage_backend: str = constants.availability_storage_backend, rate: float | None = None,
+                 verbose: bool = True, recording_mode: str = constants.availability_recording_mode,
+                 count: int = constants.ping_count, shard: str | None = None, shard_workers: list[str] | None = None,
+                 processes: int = constants.ping_processes, device_data_manager: DeviceDataManager | None = None,
+                 device_availability_data_manager: DeviceAvailabilityDataManager | None = None,
+                 probe_only: bool = False):
         """
         Initialize the IPAndPingManager class.
         This constructor sets up the IPAndPingManager object and initializes the DeviceDataManager and
         DeviceAvailabilityDataManager objects to manage device data and availability data, respectively.
+        Args:
+            concurrency (int): Maximum number of devices pinged at the same time in a ping cycle.
+            timeout (float): Seconds to wait for a reply to each ping before marking the device inactive.
+            ping_engine (str): "pool" to ping every device through ping3 on a pool of worker threads, or "sweep" to
+                ping all the devices from one shared ICMP socket with the ICMPSweepManager.
+            storage_backend (str): The storage backend the ping results are saved to, "csv", "sqlite",
+                "partitioned" or "archive".
+            rate (float, optional): Maximum number of pings started per second, or None for no limit.
+            verbose (bool): Print the result of every ping.
+            recording_mode (str): "all" to save every ping result, or "transitions" to save only status changes
+                and periodic heartbeats.
+            count (int): Number of pings sent to every device in a burst. A device is active if any of them is
+                answered, and their RTTs and loss are recorded with the result.
+            shard (str, optional): The name of this worker when monitoring is sharded between several workers. The
+                ping loops then only ping the devices of this worker, and its results are saved in its own
+                directory, see ShardManager.
+            shard_workers (list[str], optional): The names of all the workers, required with 'shard'.
+            processes (int): Number of prober processes the devices are split between, each pinging its part with
+                its own 'concurrency' threads or sweep. With 1, the devices are pinged from this process.
+            device_data_manager (DeviceDataManager, optional): The manager of the device data to use, for example
+                one shared with the caller. A new one is created by default.
+            device_availability_data_manager (DeviceAvailabilityDataManager, optional): The manager the ping results
+                are saved with. A new one, for 'storage_backend', 'recording_mode' and 'shard', is created by default.
+            probe_only (bool): Only ping the devices given to ping_devices, as the prober processes do: neither the
+                device data nor the availability data is managed, so no store, rollups database or status snapshot
+                is opened, and both managers are None.
+        Raises:
+            ValueError: If 'shard' is "all", or is given without 'shard_workers', or is not one of them.
         """
-        self.device_data_manager: DeviceDataManager = DeviceDataManager()
-        self.device_availability_data_manager: DeviceAvailabilityDataManager = DeviceAvailabilityDataManager()
+        self.device_data_manager: DeviceDataManager | None = (
+            None if probe_only else device_data_manager or DeviceDataManager())
+        self.shard: str | None = shard
+        self.shard_workers: list[str] | None = shard_workers
+        self.shard_manager: ShardManager | None = None
+        if shard == "all":
+            raise ValueError(constants.merged_store_read_only)
+        if shard is not None:
+            self.shard_manager = ShardManager(shard_workers or [])
+            if shard not in self.shard_manager.workers:
+                raise ValueError(constants.shard_not_in_workers)
+        # The last device data loaded by load_devices_data and the devices of this worker in it.
+        self.sharded_devices_data: tuple[dict, dict] = ({}, {})
+        self.device_availability_data_manager: DeviceAvailabilityDataManager | None = (
+            None if probe_only
+            else device_availability_data_manager or DeviceAvailabilityDataManager(storage_backend, recording_mode,
+                                                                                   shard=shard))
+        self.concurrency: int = max(1, concurrency)
+        self.timeout: float = timeout
+        self.ping_engine: str = ping_engine
+        self.rate: float | None = rate
+        self.verbose: bool = verbose
+        self.count: int = max(1, count)
+        self.processes: int = max(1, processes)
+        # The prober processes, started on the first ping with 'processes' above 1, see ping_devices_in_processes.
+        self.probe_pool: "multiprocessing.pool.Pool | None" = None
+        # Pings an IP and returns the RTT in seconds, or None; replaceable, for example by a simulated network.
+        self.prober: callable = IPAndPingManager.probe_device
+        self.metrics_manager: MetricsManager = MetricsManager()
+        # Called with the rows of every batch of ping results, and the part of them that was saved, once they are
+        # saved, see save_ping_results.
+        self.results_callback: callable = None
+        # Set to make the ping loops return after their current batch.
+        self.stop_event: threading.Event = threading.Event()
 
     def __str__(self):
         """
@@ -35,34 +112,367 @@ class IPAndPingManager:
         Returns:
             str: A string representation of the IPAndPingManager object.
         """
-        return f"IPAndPingManager()"
+        return (f"IPAndPingManager(concurrency={self.concurrency}, timeout={self.timeout}, "
+                f"ping_engine={self.ping_engine!r}, rate={self.rate}, verbose={self.verbose}, count={self.count}, "
+                f"shard={self.shard!r}, shard_workers={self.shard_workers!r}, processes={self.processes})")
+
+    def ping_devices(self, devices_data: dict[str, dict], rate: float | None = None) -> list[list]:
+        """
+        Ping the given devices concurrently using a bounded pool of worker threads, or a single ICMP sweep.
+        Every device gets a burst of 'count' pings. Up to 'concurrency' pings are in flight at once, so a cycle takes
+        about one timeout window for every 'concurrency' pings instead of one timeout window per unreachable device.
+        A sweep takes about one timeout window in total. The devices with a TCP or UDP "probe" in their device data
+        are probed with probe_reachability instead, while the others are pinged, and the two share the rate.
+        Args:
+            devices_data (dict[str, dict]): Device data with device IDs as keys, as returned by the DeviceDataManager.
+            rate (float, optional): Maximum number of pings started per second for these devices, 'rate' by default.
+        Returns:
+            list[list]: One [device_id, status, timestamp, rtt_avg, rtt_min, rtt_max, jitter, loss] row per device,
+                in the order of the device data, see summarize_rtts.
+        """
+        if not devices_data:
+            return []
+        if self.processes > 1:
+            return self.ping_devices_in_processes(devices_data)
+        rate = rate if rate is not None else self.rate
+        reachability_devices_data: dict[str, dict] = {
+            device_id: device_data for device_id, device_data in devices_data.items()
+            if device_data.get("probe", "icmp") != "icmp"}
+        if reachability_devices_data:
+            icmp_devices_data: dict[str, dict] = {
+                device_id: device_data for device_id, device_data in devices_data.items()
+                if device_id not in reachability_devices_data}
+            # The ICMP pings run on another thread while the event loop runs the TCP and UDP probes, so that both
+            # wait out the same timeout window.
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                icmp_rows = executor.submit(self.ping_devices, icmp_devices_data,
+                                            rate * len(icmp_devices_data) / len(devices_data) if rate else None)
+                rows: dict[str, list] = {row[0]: row for row in self.probe_reachability(
+                    reachability_devices_data,
+                    rate * len(reachability_devices_data) / len(devices_data) if rate else None)}
+                rows.update((row[0], row) for row in icmp_rows.result())
+            return [rows[device_id] for device_id in devices_data]
+        if self.ping_engine == "sweep":
+            return self.sweep_devices(devices_data, rate)
+        probes: list[str] = [device_id for device_id in devices_data for _ in range(self.count)]
+        self.metrics_manager.increment("monitor_probe_queue_depth", len(probes))
+
+        rate_lock = threading.Lock()
+        next_ping_time: list[float] = [time.monotonic()]
+
+        def ping(device_id: str) -> tuple[float | None, datetime]:
+            if rate:
+                with rate_lock:
+                    ping_time = max(next_ping_time[0], time.monotonic())
+                    next_ping_time[0] = ping_time + 1 / rate
+                time.sleep(max(0.0, ping_time - time.monotonic()))
+            rtt: float | None = self.prober(devices_data[device_id]["ip"], self.timeout, False)
+            self.metrics_manager.increment("monitor_probe_queue_depth", -1)
+            return rtt, datetime.now()
+
+        # The pings of a device are next to each other in the queue, so they are sent as a burst.
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(probes))) as executor:
+            results: list[tuple[float | None, datetime]] = list(executor.map(ping, probes))
+        devices_status_data: list[list] = []
+        for index, device_id in enumerate(devices_data):
+            device_results = results[index * self.count:(index + 1) * self.count]
+            rtts: list[float] = [rtt for rtt, _ in device_results if rtt is not None]
+            devices_status_data.append(self.build_result_row(device_id, devices_data[device_id]["ip"],
+                                                             device_results[0][1], rtts))
+        return devices_status_data
+
+    def ping_devices_in_processes(self, devices_data: dict[str, dict]) -> list[list]:
+        """
+        Ping the given devices from a pool of 'processes' prober processes, so that the Python work of every probe
+        (building and parsing packets, timestamps and result rows) is spread over several cores.
+        The devices are split into 'probe_pool_chunks_per_process' chunks per process, and every process pings a chunk
+        at a time with ping_devices, using 'concurrency' threads or a sweep. The rows of every chunk are sent back as
+        soon as it is done, and saved from this process only. The pool is started on the first call, with the
+        settings of that time, and stopped with close().
+        Args:
+            devices_data (dict[str, dict]): Device data with device IDs as keys, as returned by the DeviceDataManager.
+        Returns:
+            list[list]: One [device_id, status, timestamp, rtt_avg, rtt_min, rtt_max, jitter, loss] row per device,
+                in the order of the device data, see summarize_rtts.
+        """
+        if self.probe_pool is None:
+            import multiprocessing
+            # The processes share the rate limit, and only get the settings of the pings. They are started from a
+            # fresh server process rather than forked from this one, whose other threads may hold locks at the time
+            # of the fork.
+            settings = {"concurrency": self.concurrency, "timeout": self.timeout, "ping_engine": self.ping_engine,
+                        "rate": self.rate / self.processes if self.rate else None, "verbose": self.verbose,
+                        "count": self.count}
+            self.probe_pool = multiprocessing.get_context("forkserver").Pool(
+                self.processes, init_probe_process, (settings, self.prober))
+        device_ids: list[str] = list(devices_data)
+        chunk_size: int = -(-len(device_ids) // (self.processes * constants.probe_pool_chunks_per_process))
+        chunks: list[dict[str, dict]] = [
+            {device_id: devices_data[device_id] for device_id in device_ids[first:first + chunk_size]}
+            for first in range(0, len(device_ids), chunk_size)]
+        self.metrics_manager.set_gauge("monitor_probe_queue_depth", len(device_ids) * self.count)
+        devices_status_data: list[list] = []
+        for rows in self.probe_pool.imap(probe_devices_chunk, chunks):
+            devices_status_data.extend(rows)
+            self.metrics_manager.increment("monitor_probe_queue_depth", -len(rows) * self.count)
+        return devices_status_data
+
+    def close(self) -> None:
+        """
+        Stop the prober processes, if they were started.
+        Return:
+            None
+        """
+        if self.probe_pool is not None:
+            self.probe_pool.terminate()
+            self.probe_pool.join()
+            self.probe_pool = None
+
+    def sweep_devices(self, devices_data: dict[str, dict], rate: float | None = None) -> list[list]:
+        """
+        Ping the given devices from one shared ICMP socket using the ICMPSweepManager, 'count' times each.
+        Args:
+            devices_data (dict[str, dict]): Device data with device IDs as keys, as returned by the DeviceDataManager.
+            rate (float, optional): Maximum number of pings sent per second, 'rate' by default.
+        Returns:
+            list[list]: One [device_id, status, timestamp, rtt_avg, rtt_min, rtt_max, jitter, loss] row per device,
+                in the order of the device data, see summarize_rtts.
+        """
+        rate = rate if rate is not None else self.rate
+        self.metrics_manager.increment("monitor_probe_queue_depth", len(devices_data) * self.count)
+        try:
+            sweep_results: dict[str, dict] = ICMPSweepManager(self.timeout, self.count,
+                                                              rate=rate).sweep_devices(devices_data)
+        except OSError:
+            print(constants.icmp_socket_unavailable)
+            sweep_results = {device_id: {"rtts": []} for device_id in devices_data}
+        self.metrics_manager.increment("monitor_probe_queue_depth", -len(devices_data) * self.count)
+        timestamp = datetime.now()
+        return [self.build_result_row(device_id, devices_data[device_id]["ip"], timestamp, sweep_result["rtts"])
+                for device_id, sweep_result in sweep_results.items()]
+
+    def probe_reachability(self, devices_data: dict[str, dict], rate: float | None = None) -> list[list]:
+        """
+        Probe the given devices over the TCP or UDP protocol of their "probe", 'count' times each, from one asyncio
+        event loop, using the ReachabilityProbeManager. The devices with a probe that is not valid are reported and
+        recorded as inactive.
+        Args:
+            devices_data (dict[str, dict]): Device data with device IDs as keys, with a "probe" that is not ICMP.
+            rate (float, optional): Maximum number of probes started per second, 'rate' by default.
+        Returns:
+            list[list]: One [device_id, status, timestamp, rtt_avg, rtt_min, rtt_max, jitter, loss] row per device,
+                in the order of the device data, see summarize_rtts.
+        """
+        # Imported on first use, so that the commands that only use ICMP do not load asyncio.
+        from ReachabilityProbeManager import ReachabilityProbeManager
+        for device_id, device_data in devices_data.items():
+            if ReachabilityProbeManager.parse_probe(device_data["probe"]) is None:
+                print(f"{constants.invalid_probe}: {device_id}")
+        rate = rate if rate is not None else self.rate
+        self.metrics_manager.increment("monitor_probe_queue_depth", len(devices_data) * self.count)
+        probe_results: dict[str, list[float]] = ReachabilityProbeManager(self.timeout, self.count,
+                                                                         rate=rate).probe_devices(devices_data)
+        self.metrics_manager.increment("monitor_probe_queue_depth", -len(devices_data) * self.count)
+        timestamp = datetime.now()
+        return [self.build_result_row(device_id, devices_data[device_id]["ip"], timestamp, rtts)
+                for device_id, rtts in probe_results.items()]
 
-    def ping_all_devices(self) -> None:
+    def build_result_row(self, device_id: str, device_ip: str, timestamp: datetime, rtts: list[float]) -> list:
         """
-        Pings all the devices and store the results, every 5 minutes
+        Build the result row of a device from the RTTs of the replies to its burst of pings, and print it if verbose.
+        Args:
+            device_id (str): The unique identifier of the device.
+            device_ip (str): IP of the device.
+            timestamp (datetime): The time of the pings.
+            rtts (list[float]): The RTT in seconds of every reply, in the order the pings were sent.
+        Returns:
+            list: The [device_id, status, timestamp, rtt_avg, rtt_min, rtt_max, jitter, loss] row of the device.
+        """
+        measurements: list[float | None] = self.summarize_rtts(rtts, self.count)
+        if self.verbose:
+            if rtts:
+                print(f"{device_ip}: Active, {measurements[0] * 1000:.2f} ms, {measurements[4]:.0f}% loss")
+            else:
+                print(f"{device_ip}: Inactive")
+        return [device_id, 1 if rtts else 0, timestamp] + measurements
+
+    @staticmethod
+    def summarize_rtts(rtts: list[float], count: int) -> list[float | None]:
+        """
+        Summarize the replies to a burst of pings.
+        Args:
+            rtts (list[float]): The RTT in seconds of every reply, in the order the pings were sent.
+            count (int): The number of pings sent.
+        Returns:
+            list[float | None]: The average, minimum and maximum RTT in seconds, the jitter in seconds (the mean
+                difference between consecutive RTTs) and the loss in percent. The RTTs and jitter are None if there
+                was no reply.
+        """
+        loss: float = 100.0 * (count - len(rtts)) / count
+        if not rtts:
+            return [None, None, None, None, loss]
+        jitter: float = sum(abs(rtt - previous) for previous, rtt in zip(rtts, rtts[1:])) / max(1, len(rtts) - 1)
+        return [sum(rtts) / len(rtts), min(rtts), max(rtts), jitter, loss]
+
+    def ping_all_devices(self, interval: int = constants.ping_interval) -> None:
+        """
+        Pings all the devices and store the results, every 'interval' seconds, until 'stop_event' is set
+        Args:
+            interval (int): Seconds between the start of two consecutive ping cycles.
         Return:
             None
         """
         ping_cycle = 1
-        interval: int = 300
-        while True:
+        devices_data: dict[str, dict] = {}
+        while not self.stop_event.is_set():
             start_time = time.time()
-            devices_data: dict[str, dict] = self.device_data_manager.load_device_data_file()
-            devices_status_data: list[list] = []
-            for device_id in devices_data:
-                device_data: dict = devices_data.get(device_id)
-                status: int = IPAndPingManager.ping_device(device_data["ip"])
-                devices_status_data.append([device_id, status, datetime.now()])
-            self.device_availability_data_manager.save_device_availability_data_file(devices_status_data)
+            previous_devices_data, devices_data = devices_data, self.load_devices_data()
+            if devices_data is not previous_devices_data:
+                self.metrics_manager.forget_devices(set(devices_data))
+            devices_status_data: list[list] = self.ping_devices(devices_data)
+            self.record_ping_metrics(devices_status_data, time.time() - start_time)
+            self.save_ping_results(devices_status_data)
             end_time = time.time()
             execution_time = end_time - start_time
             remaining_time = interval - execution_time
+            if remaining_time <= 0:
+                self.metrics_manager.increment("monitor_ping_cycle_overruns_total")
             print(f"Ping Cycle {ping_cycle}: Ended at {datetime.now()}.\n"
                   f"Next ping cycle will start at {datetime.fromtimestamp(time.time() + remaining_time)}.")
             print("-" * 70)
             ping_cycle += 1
             if remaining_time > 0:
-                time.sleep(remaining_time)
+                self.stop_event.wait(remaining_time)
+
+    def ping_all_devices_scheduled(self, interval: int = constants.ping_interval) -> None:
+        """
+        Pings every device on its own adaptive schedule and store the results as they come in.
+        Each device is pinged at the "interval" of its device data (or 'interval'), more often while it is flapping
+        or down and less often while it is stable, as decided by the MonitoringScheduler. Devices that fall due
+        together are pinged as one concurrent batch. Changes to the device data are picked up within
+        'scheduler_max_sleep' seconds. Runs until 'stop_event' is set.
+        Args:
+            interval (int): Seconds between pings of a device without an "interval" key in its device data.
+        Return:
+            None
+        """
+        scheduler = MonitoringScheduler(interval)
+        devices_data: dict[str, dict] = {}
+        while not self.stop_event.is_set():
+            previous_devices_data, devices_data = devices_data, self.load_devices_data()
+            if devices_data is not previous_devices_data:
+                self.metrics_manager.forget_devices(set(devices_data))
+            scheduler.sync_devices(devices_data)
+            due_devices: list[str] = scheduler.pop_due_devices()
+            if due_devices:
+                start_time = time.time()
+                devices_status_data: list[list] = self.ping_devices({device_id: devices_data[device_id]
+                                                                    for device_id in due_devices})
+                self.record_ping_metrics(devices_status_data, time.time() - start_time)
+                self.save_ping_results(devices_status_data)
+                for row in devices_status_data:
+                    scheduler.record_result(row[0], row[1])
+                print(f"Pinged {len(due_devices)} devices: Ended at {datetime.now()}.")
+            next_due_time: float | None = scheduler.next_due_time()
+            sleep_time = constants.scheduler_max_sleep if next_due_time is None else next_due_time - time.monotonic()
+            if sleep_time > 0:
+                self.stop_event.wait(min(sleep_time, constants.scheduler_max_sleep))
+
+    def load_devices_data(self) -> dict[str, dict]:
+        """
+        Load the device data of the devices pinged by this worker: every device, or the devices of this worker's
+        shard when monitoring is sharded. The same dictionary is returned as long as the device data is unchanged.
+        It is safe to call from several threads, such as the ping loop and the HTTP threads of MonitoringDaemon: the
+        device data, and the devices of the shard, are loaded under the lock of the DeviceDataManager.
+        Returns:
+            dict[str, dict]: Device data with device IDs as keys.
+        """
+        with self.device_data_manager.lock_device_data_files():
+            devices_data: dict[str, dict] = self.device_data_manager.load_device_data_file()
+            if self.shard_manager is None:
+                return devices_data
+            if devices_data is not self.sharded_devices_data[0]:
+                self.sharded_devices_data = (devices_data, self.shard_manager.filter_devices(devices_data, self.shard))
+            return self.sharded_devices_data[1]
+
+    def save_ping_results(self, devices_status_data: list[list]) -> None:
+        """
+        Save a batch of ping results and pass them, with the rows that were saved, to the 'results_callback', if one
+        is set.
+        Args:
+            devices_status_data (list[list]): The rows returned by ping_devices.
+        Return:
+            None
+        """
+        start_time = time.perf_counter()
+        saved_rows: list[list] = self.device_availability_data_manager.save_device_availability_data_file(
+            devices_status_data)
+        self.metrics_manager.observe("monitor_storage_write_seconds", time.perf_counter() - start_time)
+        if self.results_callback is not None:
+            self.results_callback(devices_status_data, saved_rows)
+
+    def record_ping_metrics(self, devices_status_data: list[list], duration: float) -> None:
+        """
+        Record the results of a batch of pings, and how long it took, in the metrics.
+        Args:
+            devices_status_data (list[list]): The rows returned by ping_devices.
+            duration (float): Seconds taken to ping the batch.
+        Return:
+            None
+        """
+        metrics_manager: MetricsManager = self.metrics_manager
+        answered_pings: int = 0
+        for row in devices_status_data:
+            metrics_manager.set_gauge("device_up", row[1], device_id=row[0])
+            # Every row is a burst of 'count' pings, and its loss tells how many of them were answered.
+            if len(row) > 7 and row[7] is not None:
+                answered_pings += round(self.count * (100 - row[7]) / 100)
+            elif row[1]:
+                answered_pings += self.count
+            if row[1] and len(row) > 3 and row[3] is not None:
+                metrics_manager.observe("device_rtt_seconds", row[3], device_id=row[0])
+            if len(row) > 7:
+                metrics_manager.set_gauge("device_packet_loss_percent", row[7], device_id=row[0])
+        sent_pings: int = len(devices_status_data) * self.count
+        metrics_manager.increment("monitor_probes_total", answered_pings, status="up")
+        metrics_manager.increment("monitor_probes_total", sent_pings - answered_pings, status="down")
+        metrics_manager.observe("monitor_ping_cycle_duration_seconds", duration)
+        if duration > 0:
+            metrics_manager.set_gauge("monitor_probes_per_second", sent_pings / duration)
+        writer = self.device_availability_data_manager.writer
+        if writer is not None:
+            metrics_manager.set_gauge("monitor_writer_queue_depth", writer.queue.qsize())
+
+    def discover_devices(self, network: str) -> dict[str, dict]:
+        """
+        Ping every host of a network and register the ones that reply as new devices.
+        The hosts are pinged concurrently with the selected ping engine, limited to 'rate' pings per second, and all
+        the responders are added to the device data in one write. Responders whose IP already belongs to a device are
+        not added again.
+        Args:
+            network (str): The network to sweep in CIDR notation, for example 10.0.0.0/22.
+        Returns:
+            dict[str, dict]: The device data of the devices that were added, keyed by device ID.
+        """
+        try:
+            hosts = ipaddress.ip_network(network, strict=False)
+        except ValueError:
+            print(constants.invalid_network)
+            return {}
+        if hosts.num_addresses > constants.discovery_max_hosts:
+            print(f"{constants.network_too_large} {constants.discovery_max_hosts}")
+            return {}
+        print(f"Discovering {hosts.num_addresses} addresses of {hosts}")
+        start_time = time.time()
+        hosts_data: dict[str, dict] = {str(host): {"ip": str(host)} for host in hosts.hosts()}
+        responders: list[str] = [row[0] for row in self.ping_devices(hosts_data) if row[1]]
+        print(f"{len(responders)} of {len(hosts_data)} hosts replied in {time.time() - start_time:.1f} seconds")
+        known_ips: set[str] = {device_data["ip"] for device_data in
+                               self.device_data_manager.load_device_data_file().values()}
+        records: list[dict] = [{"id": f"{constants.discovered_device_id_prefix}-{re.sub('[.:]', '-', ip)}",
+                                "name": f"Discovered {ip}", "ip": ip}
+                               for ip in responders if ip not in known_ips]
+        return self.device_data_manager.add_devices(records, self.is_valid_ip)
 
     @staticmethod
     def is_valid_ip(ip: str) -> bool:
@@ -80,21 +490,92 @@ class IPAndPingManager:
             return False
 
     @staticmethod
-    def ping_device(device_ip: str) -> int:
+    def probe_device(device_ip: str, timeout: float = constants.ping_timeout, verbose: bool = True) -> float | None:
+        """
+        Ping a device once with ping3, or with ICMPv6 for an IPv6 address, and return its round-trip time.
+        Args:
+            device_ip (str): IP of the device to be pinged
+            timeout (float): Seconds to wait for the reply
+            verbose (bool): Print the IP being pinged and the result
+        Returns:
+            float | None: The round-trip time in seconds, or None if the device did not reply
         """
+        # Imported on first use, so that the commands that do not ping start faster.
+        import ping3
+        try:
+            if verbose:
+                print(f"Pinging {device_ip}")
+            if ":" in device_ip:
+                # ping3 only pings IPv4 addresses, so IPv6 ones are pinged with ICMPv6 by a one-address sweep.
+                rtt: float | None = ICMPSweepManager(timeout).sweep([device_ip])[device_ip]["rtt"]
+            else:
+                # ping3 returns None on a timeout and False on an error such as an unknown host.
+                rtt = ping3.ping(device_ip, timeout=timeout) or None
+            if verbose:
+                print(f"{device_ip}: Active") if rtt is not None else print(f"{device_ip}: Inactive")
+            return rtt
+        except PermissionError:
+            # The process may open neither a raw nor an unprivileged ICMP socket.
+            print(constants.icmp_not_permitted)
+            return None
+        except OSError as error:
+            print(f"{constants.icmp_ping_failed} {device_ip}: {error}")
+            return None
 
+    @staticmethod
+    def ping_device(device_ip: str, timeout: float = constants.ping_timeout, verbose: bool = True,
+                    probe: str = "icmp") -> int:
+        """
+        Ping a device once and report whether it replied.
         Args:
             device_ip (str): IP of the device to be pinged
+            timeout (float): Seconds to wait for the reply
+            verbose (bool): Print the IP being pinged and the result
+            probe (str): How the device is pinged: "icmp", "tcp:<port>", "udp" or "udp:<port>", see
+                ReachabilityProbeManager
         Returns:
             status (int): Status of the ping, 1 for success and 0 for failure
         """
-        try:
-            print(f"Pinging {device_ip}")
-            ping = ping3.ping(device_ip)
-            status = 1 if ping is not None and ping > 0 else 0
-            print(f"{device_ip}: Active") if status else print(f"{device_ip}: Inactive")
-            return status
-        except OSError:
-            print(constants.invalid_ip)
-            status = 0
-            return status
+        if probe == "icmp":
+            return 1 if IPAndPingManager.probe_device(device_ip, timeout, verbose) is not None else 0
+        from ReachabilityProbeManager import ReachabilityProbeManager
+        if verbose:
+            print(f"Probing {device_ip} over {probe}")
+        rtts: list[float] = ReachabilityProbeManager(timeout).probe_devices(
+            {device_ip: {"ip": device_ip, "probe": probe}})[device_ip]
+        if verbose:
+            print(f"{device_ip}: Active, {rtts[0] * 1000:.2f} ms") if rtts else print(f"{device_ip}: Inactive")
+        return 1 if rtts else 0
+
+
+# The probe-only IPAndPingManager of a prober process, set by init_probe_process.
+probe_process_manager: IPAndPingManager | None = None
+
+
+def init_probe_process(settings: dict, prober: callable) -> None:
+    """
+    Initialize a prober process of IPAndPingManager.ping_devices_in_processes. The process only pings: it opens
+    neither the device data nor the availability data, which stay with the main process. Ctrl+C is left to the main
+    process, which stops the pool.
+    Args:
+        settings (dict): The settings of the pings: the concurrency, timeout, ping engine, rate, verbosity and count
+            of the IPAndPingManager pinging the chunks of devices in this process.
+        prober (callable): The 'prober' of the main process.
+    Returns:
+        None
+    """
+    global probe_process_manager
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    probe_process_manager = IPAndPingManager(**settings, processes=1, probe_only=True)
+    probe_process_manager.prober = prober
+
+
+def probe_devices_chunk(devices_data: dict[str, dict]) -> list[list]:
+    """
+    Ping a chunk of devices in a prober process.
+    Args:
+        devices_data (dict[str, dict]): The device data of the chunk.
+    Returns:
+        list[list]: The rows returned by IPAndPingManager.ping_devices.
+    """
+    return probe_process_manager.ping_devices(devices_data)
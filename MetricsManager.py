@@ -0,0 +1,259 @@
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import constants
+
+
+class MetricsManager:
+    """
+    Class responsible for the metrics of the monitor, exposed in the Prometheus text format.
+    Gauges, counters and histograms are kept in memory with their labels and rendered on request, so recording a
+    value costs a dictionary update and scraping costs one pass over the series. The metrics recorded by the
+    IPAndPingManager are:
+        device_up{device_id}: 1 if the last ping of the device succeeded, 0 otherwise.
+        device_rtt_seconds{device_id}: Histogram of the average round-trip times of the successful pings of the
+            device.
+        device_packet_loss_percent{device_id}: Packet loss of the last burst of pings of the device.
+        monitor_probes_total{status}: Number of pings sent, by result: "up" if answered, "down" if not.
+        monitor_probes_per_second: Pings per second of the last batch.
+        monitor_probe_queue_depth: Pings of the current batch not completed yet.
+        monitor_ping_cycle_duration_seconds: Histogram of the durations of the ping batches.
+        monitor_ping_cycle_overruns_total: Number of ping cycles that took longer than the ping interval.
+        monitor_storage_write_seconds: Histogram of the time taken to save a batch of ping results, or to queue it
+            when the background writer is started.
+        monitor_writer_queue_depth: Ping results queued in the background writer, not saved yet.
+    Attributes:
+        metrics (dict[str, dict]): The type, help text, label names, histogram buckets and series of every metric, by
+            name.
+    Methods:
+        __init__(self) -> None:
+            Initialize MetricsManager with the metrics of the monitor.
+        __str__(self) -> str:
+            Return a string representation of the MetricsManager object.
+        __repr__(self) -> str:
+            Return a string representation that can be used to recreate the MetricsManager object.
+        define(self, name: str, metric_type: str, help_text: str, buckets: list[float] | None,
+               labels: tuple[str, ...]) -> None:
+            Define a metric.
+        set_gauge(self, name: str, value: float, **labels: str) -> None:
+            Set the value of a gauge.
+        increment(self, name: str, amount: float, **labels: str) -> None:
+            Increment a counter or a gauge.
+        observe(self, name: str, value: float, **labels: str) -> None:
+            Add an observation to a histogram.
+        forget_devices(self, device_ids: set[str]) -> None:
+            Drop the series of the devices that are not in the given set.
+        render(self) -> str:
+            Render every metric in the Prometheus text format.
+        start_server(self, host: str, port: int) -> ThreadingHTTPServer:
+            Serve the metrics on /metrics from a background thread.
+    """
+
+    def __init__(self):
+        """
+        Initialize MetricsManager with the metrics of the monitor.
+        """
+        self.metrics: dict[str, dict] = {}
+        self.lock: threading.Lock = threading.Lock()
+        self.define("device_up", "gauge", "1 if the last ping of the device succeeded, 0 otherwise.",
+                    labels=("device_id",))
+        self.define("device_rtt_seconds", "histogram", "Round-trip time of the successful pings of the device.",
+                    constants.metrics_rtt_buckets, ("device_id",))
+        self.define("device_packet_loss_percent", "gauge", "Packet loss of the last burst of pings of the device.",
+                    labels=("device_id",))
+        self.define("monitor_probes_total", "counter", "Number of pings sent, by result: up if answered, down if not.",
+                    labels=("status",))
+        self.define("monitor_probes_per_second", "gauge", "Pings per second of the last batch.")
+        self.define("monitor_probe_queue_depth", "gauge", "Pings of the current batch not completed yet.")
+        self.define("monitor_ping_cycle_duration_seconds", "histogram", "Duration of the ping batches.",
+                    constants.metrics_cycle_duration_buckets)
+        self.define("monitor_ping_cycle_overruns_total", "counter",
+                    "Number of ping cycles that took longer than the ping interval.")
+        self.define("monitor_storage_write_seconds", "histogram", "Time taken to save a batch of ping results.",
+                    constants.metrics_storage_write_buckets)
+        self.define("monitor_writer_queue_depth", "gauge",
+                    "Ping results queued in the background writer, not saved yet.")
+
+    def __str__(self):
+        """
+        Return a string representation of the MetricsManager object.
+        Returns:
+            str: String representation of the object.
+        """
+        return f"MetricsManager with {len(self.metrics)} metrics"
+
+    def __repr__(self):
+        """
+        Return a string representation that can be used to recreate the MetricsManager object.
+        Returns:
+            str: String representation for recreation.
+        """
+        return "MetricsManager()"
+
+    def define(self, name: str, metric_type: str, help_text: str, buckets: list[float] | None = None,
+               labels: tuple[str, ...] = ()) -> None:
+        """
+        Define a metric. Counters and gauges without labels start at 0; metrics with labels have no sample until
+        their first series is recorded.
+        Args:
+            name (str): The name of the metric.
+            metric_type (str): "gauge", "counter" or "histogram".
+            help_text (str): The description of the metric.
+            buckets (list[float], optional): The upper bounds of the buckets of a histogram, in increasing order.
+            labels (tuple[str, ...], optional): The names of the labels of its series. Defaults to none.
+        Returns:
+            None
+        """
+        self.metrics[name] = {"type": metric_type, "help": help_text, "buckets": buckets, "labels": labels,
+                              "series": {}}
+
+    def set_gauge(self, name: str, value: float, **labels: str) -> None:
+        """
+        Set the value of a gauge.
+        Args:
+            name (str): The name of the gauge.
+            value (float): The new value.
+            **labels (str): The labels of the series.
+        Returns:
+            None
+        """
+        with self.lock:
+            self.metrics[name]["series"][tuple(sorted(labels.items()))] = value
+
+    def increment(self, name: str, amount: float = 1, **labels: str) -> None:
+        """
+        Increment a counter or a gauge.
+        Args:
+            name (str): The name of the counter or gauge.
+            amount (float): The amount to add.
+            **labels (str): The labels of the series.
+        Returns:
+            None
+        """
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series: dict = self.metrics[name]["series"]
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """
+        Add an observation to a histogram.
+        Args:
+            name (str): The name of the histogram.
+            value (float): The observed value.
+            **labels (str): The labels of the series.
+        Returns:
+            None
+        """
+        key = tuple(sorted(labels.items()))
+        metric: dict = self.metrics[name]
+        bucket = bisect.bisect_left(metric["buckets"], value)
+        with self.lock:
+            histogram: list | None = metric["series"].get(key)
+            if histogram is None:
+                # Non-cumulative bucket counts, including the +Inf bucket, then the sum of the observations.
+                histogram = metric["series"][key] = [[0] * (len(metric["buckets"]) + 1), 0.0]
+            histogram[0][bucket] += 1
+            histogram[1] += value
+
+    def forget_devices(self, device_ids: set[str]) -> None:
+        """
+        Drop the series of the devices that are not in the given set, so deleted devices stop being exported.
+        Args:
+            device_ids (set[str]): The IDs of the current devices.
+        Returns:
+            None
+        """
+        with self.lock:
+            for metric in self.metrics.values():
+                for key in list(metric["series"]):
+                    labels = dict(key)
+                    if "device_id" in labels and labels["device_id"] not in device_ids:
+                        del metric["series"][key]
+
+    @staticmethod
+    def format_labels(labels: tuple, extra: str = "") -> str:
+        """
+        Format the labels of a series.
+        Args:
+            labels (tuple): The (name, value) pairs of the labels.
+            extra (str): An already formatted label to add, such as the 'le' label of a histogram bucket.
+        Returns:
+            str: The labels in braces, or an empty string if there are none.
+        """
+        formatted = []
+        for name, value in labels:
+            value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            formatted.append(f'{name}="{value}"')
+        if extra:
+            formatted.append(extra)
+        return "{" + ",".join(formatted) + "}" if formatted else ""
+
+    def render(self) -> str:
+        """
+        Render every metric in the Prometheus text format.
+        Returns:
+            str: The metrics, ready to be scraped.
+        """
+        lines: list[str] = []
+        with self.lock:
+            for name, metric in self.metrics.items():
+                lines.append(f"# HELP {name} {metric['help']}")
+                lines.append(f"# TYPE {name} {metric['type']}")
+                series: dict = metric["series"]
+                if not series and not metric["labels"] and metric["type"] != "histogram":
+                    lines.append(f"{name} 0")
+                for labels, value in series.items():
+                    if metric["type"] != "histogram":
+                        lines.append(f"{name}{self.format_labels(labels)} {value:g}")
+                        continue
+                    bucket_counts, total = value
+                    cumulative = 0
+                    for upper_bound, count in zip(metric["buckets"] + ["+Inf"], bucket_counts):
+                        cumulative += count
+                        le_label = 'le="+Inf"' if upper_bound == "+Inf" else f'le="{upper_bound:g}"'
+                        lines.append(f"{name}_bucket{self.format_labels(labels, le_label)} {cumulative}")
+                    lines.append(f"{name}_sum{self.format_labels(labels)} {total:g}")
+                    lines.append(f"{name}_count{self.format_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+    def start_server(self, host: str = constants.daemon_host, port: int = constants.metrics_port
+                     ) -> ThreadingHTTPServer:
+        """
+        Serve the metrics on http://<host>:<port>/metrics from a background thread.
+        Args:
+            host (str): The address to listen on.
+            port (int): The port to listen on.
+        Returns:
+            ThreadingHTTPServer: The running server.
+        """
+        server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+        server.metrics_manager = self
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        print(f"Serving the metrics on http://{host}:{server.server_address[1]}/metrics")
+        return server
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP request handler serving the metrics of a MetricsManager on /metrics.
+    """
+
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        self.send_metrics(self.server.metrics_manager)
+
+    def send_metrics(self, metrics_manager: MetricsManager) -> None:
+        payload = metrics_manager.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format: str, *args) -> None:
+        # Scrapes are not logged, so the ping loop output stays readable.
+        pass
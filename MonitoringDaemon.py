@@ -0,0 +1,279 @@
+import json
+import threading
+from collections import deque
+from datetime import datetime
+from http.server import ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import constants
+from AvailabilityStore import decode_measurement, decode_timestamp, encode_timestamp
+from IPAndPingManager import IPAndPingManager
+from MetricsManager import MetricsRequestHandler
+
+
+class MonitoringDaemon:
+    """
+    Class responsible for running the ping loop in a long-lived process and answering queries about it over HTTP.
+    The daemon keeps the current status of every device and its last 'history_size' saved ping results in memory,
+    updated as the ping loop saves them, so status queries never read the availability data. Like the storage
+    backend, the in-memory history only holds the status changes and heartbeats in "transitions" mode, so a query
+    gets the same rows from either. The device registry is served
+    from the DeviceDataManager cache, which is only reloaded when the device data files change; the ping loop loads
+    it too, so it is read under the lock of the DeviceDataManager rather than the lock of the daemon, which only
+    guards the in-memory status and history.
+    The HTTP API only accepts GET requests and answers with JSON:
+        /devices, /devices/<id>: the device data of every device, or of one device.
+        /status, /status/<id>: the last status, timestamp, average RTT and packet loss of every device, or of one
+            device.
+        /history?id=&start=&end=&status=&limit=: the ping results matching the filters, oldest first. They are
+            served from memory when the in-memory history covers 'start', and read from the storage backend otherwise.
+        /metrics: the metrics of the ping loop in the Prometheus text format, see MetricsManager.
+    Attributes:
+        ip_and_ping_manager (IPAndPingManager): The manager running the ping loop.
+        host (str): The address the HTTP API listens on.
+        port (int): The port the HTTP API listens on.
+        history_size (int): The number of recent ping results kept in memory per device.
+        started_at (int): The epoch microsecond time the daemon started at.
+    Methods:
+        __init__(self, ip_and_ping_manager: IPAndPingManager, host: str, port: int, history_size: int) -> None:
+            Initialize MonitoringDaemon with the ping manager and the address of the HTTP API.
+        __str__(self) -> str:
+            Return a string representation of the MonitoringDaemon object.
+        __repr__(self) -> str:
+            Return a string representation that can be used to recreate the MonitoringDaemon object.
+        record_results(self, devices_status_data: list[list], saved_rows: list[list] | None) -> None:
+            Update the in-memory status and history with a batch of ping results.
+        get_devices(self) -> dict[str, dict]:
+            Get the device data of every device.
+        get_statuses(self) -> dict[str, dict]:
+            Get the last status of every device.
+        get_history(self, device_id: str | None, start: datetime | None, end: datetime | None, status: int | None,
+                    limit: int | None) -> tuple[str, list[list]]:
+            Get the ping results matching the given filters.
+        run(self, interval: int, adaptive_schedule: bool) -> None:
+            Run the ping loop and serve the HTTP API until interrupted.
+    """
+
+    def __init__(self, ip_and_ping_manager: IPAndPingManager, host: str = constants.daemon_host,
+                 port: int = constants.daemon_port, history_size: int = constants.daemon_history_size):
+        """
+        Initialize MonitoringDaemon with the ping manager and the address of the HTTP API, and load the last status
+        of every device from the storage backend.
+        Args:
+            ip_and_ping_manager (IPAndPingManager): The manager running the ping loop.
+            host (str): The address the HTTP API listens on.
+            port (int): The port the HTTP API listens on.
+            history_size (int): The number of recent ping results kept in memory per device.
+        """
+        self.ip_and_ping_manager: IPAndPingManager = ip_and_ping_manager
+        self.host: str = host
+        self.port: int = port
+        self.history_size: int = history_size
+        self.started_at: int = encode_timestamp(datetime.now())
+        self.lock: threading.Lock = threading.Lock()
+        self.statuses: dict[str, list] = {
+            device_id: self.encode_row(row)
+            for device_id, row in ip_and_ping_manager.device_availability_data_manager.store.latest_rows().items()}
+        self.history: dict[str, deque] = {}
+        ip_and_ping_manager.results_callback = self.record_results
+
+    def __str__(self):
+        """
+        Return a string representation of the MonitoringDaemon object.
+        Returns:
+            str: String representation of the object.
+        """
+        return f"MonitoringDaemon on http://{self.host}:{self.port}"
+
+    def __repr__(self):
+        """
+        Return a string representation that can be used to recreate the MonitoringDaemon object.
+        Returns:
+            str: String representation for recreation.
+        """
+        return f"MonitoringDaemon({self.ip_and_ping_manager!r}, {self.host!r}, {self.port}, {self.history_size})"
+
+    def record_results(self, devices_status_data: list[list], saved_rows: list[list] | None = None) -> None:
+        """
+        Update the in-memory status with a batch of ping results, and the in-memory history with the rows of it that
+        were saved. Called by the ping loop after every saved batch.
+        Args:
+            devices_status_data (list[list]): The [device_id, status, timestamp] rows of the batch, optionally
+                followed by the measurements.
+            saved_rows (list[list], optional): The rows of the batch that were saved to the storage backend. Defaults
+                to every row.
+        Returns:
+            None
+        """
+        rows = [self.encode_row(row) for row in devices_status_data]
+        history_rows = rows if saved_rows is None else [self.encode_row(row) for row in saved_rows]
+        with self.lock:
+            for row in rows:
+                self.statuses[row[0]] = row
+            for row in history_rows:
+                device_history: deque | None = self.history.get(row[0])
+                if device_history is None:
+                    device_history = self.history[row[0]] = deque(maxlen=self.history_size)
+                device_history.append(row)
+
+    @staticmethod
+    def encode_row(row: list) -> list:
+        """
+        Convert a ping result, as returned by the ping loop or read from the store, into the form kept in memory.
+        Args:
+            row (list): A [device_id, status, timestamp] row, optionally followed by the measurements.
+        Returns:
+            list: The [device_id, status, timestamp, rtt_avg, loss] row, with an epoch microsecond timestamp.
+        """
+        return [row[0], int(row[1]), encode_timestamp(row[2]), decode_measurement(row[3]) if len(row) > 3 else None,
+                decode_measurement(row[7]) if len(row) > 7 else None]
+
+    def get_devices(self) -> dict[str, dict]:
+        """
+        Get the device data of every device pinged by the daemon, only the devices of its shard if it is a shard worker.
+        Returns:
+            dict[str, dict]: The device data, keyed by device ID.
+        """
+        return self.ip_and_ping_manager.load_devices_data()
+
+    def get_statuses(self) -> dict[str, dict]:
+        """
+        Get the last status of every device. Devices that were never pinged have a None status.
+        Returns:
+            dict[str, dict]: The 'status', 'timestamp', 'rtt' and 'loss' of every device, keyed by device ID.
+        """
+        devices_data: dict[str, dict] = self.get_devices()
+        with self.lock:
+            statuses = {device_id: self.statuses.get(device_id) for device_id in devices_data}
+        return {device_id: self.format_row(row) if row is not None
+                else {"status": None, "timestamp": None, "rtt": None, "loss": None}
+                for device_id, row in statuses.items()}
+
+    @staticmethod
+    def format_row(row: list) -> dict:
+        """
+        Format an in-memory row for a JSON response.
+        Args:
+            row (list): A [device_id, status, timestamp, rtt_avg, loss] row.
+        Returns:
+            dict: The 'status', ISO 'timestamp', 'rtt' in seconds and 'loss' in percent of the row.
+        """
+        return {"status": row[1], "timestamp": decode_timestamp(row[2]).isoformat(), "rtt": row[3], "loss": row[4]}
+
+    def get_history(self, device_id: str | None = None, start: datetime | None = None, end: datetime | None = None,
+                    status: int | None = None, limit: int | None = None) -> tuple[str, list[list]]:
+        """
+        Get the ping results matching the given filters, from memory if the in-memory history of every matching
+        device covers 'start', and from the storage backend otherwise.
+        Args:
+            device_id (str, optional): Only get the results of this device.
+            start (datetime, optional): Only get the results recorded at or after this time.
+            end (datetime, optional): Only get the results recorded before this time.
+            status (int, optional): Only get the results with this status.
+            limit (int, optional): Only get the first 'limit' matching results, a non-negative number.
+        Returns:
+            tuple[str, list[list]]: "memory" or "store", and the matching [device_id, status, timestamp, rtt, loss]
+                rows, with epoch microsecond timestamps, oldest first.
+        """
+        start_micros = encode_timestamp(start) if start is not None else None
+        end_micros = encode_timestamp(end) if end is not None else None
+        with self.lock:
+            histories = [self.history.get(device_id, ())] if device_id is not None else list(self.history.values())
+            # A history that has not dropped any result yet covers everything since the daemon started.
+            covered = start_micros is not None and all(
+                start_micros >= (device_history[0][2] if len(device_history) == self.history_size else self.started_at)
+                for device_history in histories)
+            if covered:
+                rows = sorted((row for device_history in histories for row in device_history
+                               if row[2] >= start_micros and (end_micros is None or row[2] < end_micros)
+                               and (status is None or row[1] == status)), key=lambda row: row[2])
+                return "memory", rows[:limit]
+        rows = []
+        for row in self.ip_and_ping_manager.device_availability_data_manager.iter_device_availability_data(
+                device_id, start, end, status):
+            if limit is not None and len(rows) == limit:
+                break
+            rows.append(self.encode_row(row))
+        return "store", rows
+
+    def run(self, interval: int = constants.ping_interval, adaptive_schedule: bool = False) -> None:
+        """
+        Run the ping loop in a background thread and serve the HTTP API until interrupted with Ctrl+C. On
+        interruption, the ping loop finishes and saves its current batch before the daemon returns.
+        Args:
+            interval (int): Seconds between pings of a device, passed to the ping loop.
+            adaptive_schedule (bool): Use IPAndPingManager.ping_all_devices_scheduled instead of fixed cycles.
+        Returns:
+            None
+        """
+        ping_loop = (self.ip_and_ping_manager.ping_all_devices_scheduled if adaptive_schedule
+                     else self.ip_and_ping_manager.ping_all_devices)
+        ping_thread = threading.Thread(target=ping_loop, args=(interval,), name="ping-loop", daemon=True)
+        server = ThreadingHTTPServer((self.host, self.port), MonitoringDaemonRequestHandler)
+        server.monitoring_daemon = self
+        ping_thread.start()
+        print(f"Serving the monitoring API on http://{self.host}:{server.server_address[1]}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("Stopping, waiting for the current ping batch to be saved")
+        finally:
+            server.server_close()
+            self.ip_and_ping_manager.stop_event.set()
+            ping_thread.join()
+
+
+class MonitoringDaemonRequestHandler(MetricsRequestHandler):
+    """
+    HTTP request handler of the MonitoringDaemon API, see MonitoringDaemon for the endpoints.
+    """
+
+    def do_GET(self) -> None:
+        daemon: MonitoringDaemon = self.server.monitoring_daemon
+        url = urlsplit(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        match parts:
+            case ["devices"]:
+                self.send_json(200, daemon.get_devices())
+            case ["devices", device_id]:
+                devices_data: dict[str, dict] = daemon.get_devices()
+                if device_id in devices_data:
+                    self.send_json(200, devices_data[device_id])
+                else:
+                    self.send_json(404, {"error": constants.device_not_found_message})
+            case ["status"]:
+                self.send_json(200, daemon.get_statuses())
+            case ["status", device_id]:
+                statuses: dict[str, dict] = daemon.get_statuses()
+                if device_id in statuses:
+                    self.send_json(200, statuses[device_id])
+                else:
+                    self.send_json(404, {"error": constants.device_not_found_message})
+            case ["history"]:
+                try:
+                    start = datetime.fromisoformat(query["start"]) if "start" in query else None
+                    end = datetime.fromisoformat(query["end"]) if "end" in query else None
+                    status = int(query["status"]) if "status" in query else None
+                    limit = int(query["limit"]) if "limit" in query else None
+                    if limit is not None and limit < 0:
+                        raise ValueError(limit)
+                except ValueError:
+                    self.send_json(400, {"error": "start and end must be ISO times, status an integer and limit a "
+                                                  "non-negative integer"})
+                    return
+                source, rows = daemon.get_history(query.get("id"), start, end, status, limit)
+                self.send_json(200, {"source": source,
+                                     "rows": [{"id": row[0]} | daemon.format_row(row) for row in rows]})
+            case ["metrics"]:
+                self.send_metrics(daemon.ip_and_ping_manager.metrics_manager)
+            case _:
+                self.send_json(404, {"error": "Unknown endpoint, use /devices, /status, /history or /metrics"})
+
+    def send_json(self, code: int, body) -> None:
+        payload = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
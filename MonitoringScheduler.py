@@ -0,0 +1,201 @@
+import heapq
+import random
+import time
+
+import constants
+
+
+class MonitoringScheduler:
+    """
+    Class responsible for deciding when each device is pinged next.
+    Devices are kept in a heap ordered by their next due time, so finding the devices to ping costs O(log n) per
+    device. Each device has its own interval, taken from the optional "interval" key of its device data, which is
+    adapted to its behaviour:
+        - a device whose status changed within the last 'backoff_after' pings, or that is down on its first ping, is
+          pinged every 'fast_factor' of its interval (but no more often than 'min_interval' seconds), so outages and
+          flapping are tracked closely;
+        - a device whose status stayed the same for 'backoff_after' pings has its interval doubled every further
+          'backoff_after' pings, up to 'max_backoff' times its interval.
+    Due times are computed from the previous due time rather than from the end of the ping, so the schedule does not
+    drift, and every interval is jittered by up to 'jitter' of its length so that devices sharing an interval do not
+    all get pinged at the same instant.
+    Attributes:
+        default_interval (float): Seconds between pings of a device without an "interval" key.
+        min_interval (float): Minimum number of seconds between two pings of a device.
+        fast_factor (float): Fraction of its interval used for devices that are flapping or recently went down.
+        backoff_after (int): Number of pings with an unchanged status after which a device is considered stable.
+        max_backoff (float): Maximum multiple of its interval a stable device is pinged at.
+        jitter (float): Maximum fraction by which each interval is randomly lengthened or shortened.
+    Methods:
+        __init__(self, default_interval: float, ...) -> None:
+            Initialize MonitoringScheduler with its policy.
+        __str__(self) -> str:
+            Return a string representation of the MonitoringScheduler object.
+        __repr__(self) -> str:
+            Return a string representation that can be used to recreate the MonitoringScheduler object.
+        sync_devices(self, devices_data: dict[str, dict]) -> None:
+            Schedule new devices and forget deleted ones.
+        pop_due_devices(self, now: float | None) -> list[str]:
+            Remove and return the IDs of the devices due to be pinged.
+        record_result(self, device_id: str, status: int, now: float | None) -> float:
+            Record the status of a ping and schedule the next ping of the device.
+        next_due_time(self) -> float | None:
+            Get the time at which the next device is due.
+    """
+
+    def __init__(self, default_interval: float = constants.ping_interval,
+                 min_interval: float = constants.scheduler_min_interval,
+                 fast_factor: float = constants.scheduler_fast_factor,
+                 backoff_after: int = constants.scheduler_backoff_after,
+                 max_backoff: float = constants.scheduler_max_backoff,
+                 jitter: float = constants.scheduler_jitter):
+        """
+        Initialize MonitoringScheduler with its policy.
+        Args:
+            default_interval (float): Seconds between pings of a device without an "interval" key.
+            min_interval (float): Minimum number of seconds between two pings of a device.
+            fast_factor (float): Fraction of its interval used for devices that are flapping or recently went down.
+            backoff_after (int): Number of pings with an unchanged status after which a device is considered stable.
+            max_backoff (float): Maximum multiple of its interval a stable device is pinged at.
+            jitter (float): Maximum fraction by which each interval is randomly lengthened or shortened.
+        """
+        self.default_interval: float = default_interval
+        self.min_interval: float = min_interval
+        self.fast_factor: float = fast_factor
+        self.backoff_after: int = max(1, backoff_after)
+        self.max_backoff: float = max_backoff
+        self.jitter: float = jitter
+        # Heap of (due time, device ID); devices_state holds the due time each device is currently scheduled at, so
+        # that heap entries left behind by deleted or rescheduled devices can be recognised and skipped.
+        self.schedule: list[tuple[float, str]] = []
+        self.devices_state: dict[str, dict] = {}
+
+    def __str__(self):
+        """
+        Return a string representation of the MonitoringScheduler object.
+        Returns:
+            str: String representation of the object.
+        """
+        return f"MonitoringScheduler with {len(self.devices_state)} devices"
+
+    def __repr__(self):
+        """
+        Return a string representation that can be used to recreate the MonitoringScheduler object.
+        Returns:
+            str: String representation for recreation.
+        """
+        return (f"MonitoringScheduler({self.default_interval}, {self.min_interval}, {self.fast_factor}, "
+                f"{self.backoff_after}, {self.max_backoff}, {self.jitter})")
+
+    def sync_devices(self, devices_data: dict[str, dict], now: float | None = None) -> None:
+        """
+        Schedule the devices that are not scheduled yet and forget the ones that are no longer in the device data.
+        New devices get a first due time spread over the jitter window of their interval. Interval changes are picked
+        up at the next ping of a device.
+        Args:
+            devices_data (dict[str, dict]): Device data with device IDs as keys, as returned by the DeviceDataManager.
+            now (float, optional): The current time.monotonic() value.
+        Returns:
+            None
+        """
+        now = time.monotonic() if now is None else now
+        for device_id in self.devices_state.keys() - devices_data.keys():
+            del self.devices_state[device_id]
+        for device_id, device_data in devices_data.items():
+            state: dict | None = self.devices_state.get(device_id)
+            if state is None:
+                interval = self.get_base_interval(device_data)
+                state = {"status": None, "unchanged_pings": 0, "due": now + random.uniform(0, self.jitter * interval)}
+                self.devices_state[device_id] = state
+                heapq.heappush(self.schedule, (state["due"], device_id))
+            state["base_interval"] = self.get_base_interval(device_data)
+
+    def get_base_interval(self, device_data: dict) -> float:
+        """
+        Get the configured interval of a device.
+        Args:
+            device_data (dict): The device data of the device.
+        Returns:
+            float: The "interval" of the device data, or the default interval.
+        """
+        try:
+            return max(self.min_interval, float(device_data.get("interval", self.default_interval)))
+        except (TypeError, ValueError):
+            return self.default_interval
+
+    def pop_due_devices(self, now: float | None = None) -> list[str]:
+        """
+        Remove and return the IDs of the devices due to be pinged. Each of them must be passed to record_result once
+        pinged, to be scheduled again.
+        Args:
+            now (float, optional): The current time.monotonic() value.
+        Returns:
+            list[str]: The IDs of the devices whose due time has passed, most overdue first.
+        """
+        now = time.monotonic() if now is None else now
+        due_devices: list[str] = []
+        while self.schedule and self.schedule[0][0] <= now:
+            due, device_id = heapq.heappop(self.schedule)
+            state: dict | None = self.devices_state.get(device_id)
+            if state is not None and state["due"] == due:
+                due_devices.append(device_id)
+        return due_devices
+
+    def get_interval(self, device_id: str) -> float:
+        """
+        Get the current, unjittered interval of a device, according to its recent statuses.
+        Args:
+            device_id (str): The unique identifier of the device.
+        Returns:
+            float: Seconds until the next ping of the device.
+        """
+        state: dict = self.devices_state[device_id]
+        if state["unchanged_pings"] < self.backoff_after:
+            return max(self.min_interval, state["base_interval"] * self.fast_factor)
+        backoff = min(self.max_backoff, 2 ** ((state["unchanged_pings"] - self.backoff_after) // self.backoff_after))
+        return state["base_interval"] * backoff
+
+    def record_result(self, device_id: str, status: int, now: float | None = None) -> float:
+        """
+        Record the status of a ping and schedule the next ping of the device.
+        Args:
+            device_id (str): The unique identifier of the device.
+            status (int): Status of the ping, 1 for success and 0 for failure.
+            now (float, optional): The current time.monotonic() value.
+        Returns:
+            float: The time.monotonic() value at which the device is due next, or 0 if it is no longer scheduled.
+        """
+        state: dict | None = self.devices_state.get(device_id)
+        if state is None:
+            return 0
+        now = time.monotonic() if now is None else now
+        if state["status"] is None:
+            # A device seen up on its first ping is treated as stable, one seen down as recently down.
+            state["unchanged_pings"] = self.backoff_after if status else 0
+        elif status == state["status"]:
+            state["unchanged_pings"] += 1
+        else:
+            state["unchanged_pings"] = 0
+        state["status"] = status
+        interval = self.get_interval(device_id)
+        due = state["due"] + interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+        if due <= now:
+            # The ping overran the slot: start again from now instead of pinging to catch up.
+            due = now + random.uniform(0, self.jitter * interval)
+        state["due"] = due
+        heapq.heappush(self.schedule, (due, device_id))
+        return due
+
+    def next_due_time(self) -> float | None:
+        """
+        Get the time at which the next device is due.
+        Returns:
+            float | None: The earliest time.monotonic() due time, or None if no device is scheduled.
+        """
+        while self.schedule:
+            due, device_id = self.schedule[0]
+            state: dict | None = self.devices_state.get(device_id)
+            if state is not None and state["due"] == due:
+                return due
+            heapq.heappop(self.schedule)
+        return None
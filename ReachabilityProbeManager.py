@@ -0,0 +1,186 @@
+import asyncio
+import ipaddress
+import socket
+import struct
+import time
+
+import constants
+
+PROBE_PAYLOAD: bytes = b"device-availability-monitoring"
+
+
+class ReachabilityProbeManager:
+    """
+    Class responsible for checking the reachability of devices over TCP or UDP, as an alternative to ICMP for the
+    devices whose "probe" in the device data is "tcp:<port>" or "udp[:<port>]".
+    Unlike ICMP, these probes need no privileges and pass the networks that filter ICMP. All the probes of a batch
+    run on one asyncio event loop from non-blocking sockets, up to 'concurrency' at once, each with its own timeout,
+    so thousands of connection attempts are multiplexed from a single thread.
+    A TCP probe succeeds when the connection to the port is accepted; a refused connection means the port is closed,
+    and counts as a failure. A UDP probe sends a datagram to the port and succeeds when the device answers, either with
+    a datagram or with an ICMP port unreachable error, which proves that the device is up, so the default UDP port
+    is one that is normally closed. The round-trip time is the time to the accepted connection or to the answer.
+    Attributes:
+        timeout (float): Seconds to wait for every probe.
+        count (int): Number of probes sent to every device.
+        concurrency (int): Maximum number of probes in flight, limited by the number of files the process may open.
+        rate (float | None): Maximum number of probes started per second, or None for no limit.
+    Methods:
+        __init__(self, timeout: float, count: int, concurrency: int, rate: float | None) -> None:
+            Initialize ReachabilityProbeManager with the probe settings.
+        __str__(self) -> str:
+            Return a string representation of the ReachabilityProbeManager object.
+        __repr__(self) -> str:
+            Return a string representation that can be used to recreate the ReachabilityProbeManager object.
+        parse_probe(probe: str | None) -> tuple[str, int | None] | None:
+            Parse the probe of a device.
+        probe_devices(self, devices_data: dict[str, dict]) -> dict[str, list[float]]:
+            Probe every device 'count' times and return the round-trip times of the probes that succeeded.
+    """
+
+    def __init__(self, timeout: float = constants.ping_timeout, count: int = 1,
+                 concurrency: int = constants.reachability_probe_concurrency, rate: float | None = None):
+        """
+        Initialize ReachabilityProbeManager with the probe settings.
+        Args:
+            timeout (float): Seconds to wait for every probe.
+            count (int): Number of probes sent to every device.
+            concurrency (int): Maximum number of probes in flight.
+            rate (float, optional): Maximum number of probes started per second.
+        """
+        self.timeout: float = timeout
+        self.count: int = max(1, count)
+        # Every probe in flight holds a socket: running out of files would make the devices look down.
+        try:
+            import resource
+            file_limit: int = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+            if file_limit != resource.RLIM_INFINITY:
+                concurrency = min(concurrency, file_limit - constants.reachability_probe_reserved_files)
+        except ImportError:
+            pass
+        self.concurrency: int = max(1, concurrency)
+        self.rate: float | None = rate
+
+    def __str__(self):
+        """
+        Return a string representation of the ReachabilityProbeManager object.
+        Returns:
+            str: String representation of the object.
+        """
+        return "ReachabilityProbeManager"
+
+    def __repr__(self):
+        """
+        Return a string representation that can be used to recreate the ReachabilityProbeManager object.
+        Returns:
+            str: String representation for recreation.
+        """
+        return (f"ReachabilityProbeManager(timeout={self.timeout}, count={self.count}, "
+                f"concurrency={self.concurrency}, rate={self.rate})")
+
+    @staticmethod
+    def parse_probe(probe: str | None) -> tuple[str, int | None] | None:
+        """
+        Parse the probe of a device: "icmp" (the default), "tcp:<port>", "udp" or "udp:<port>".
+        Args:
+            probe (str | None): The "probe" of the device data, or None if the device has none.
+        Returns:
+            tuple[str, int | None] | None: The protocol and the port (None for ICMP), or None if the probe is not
+                valid.
+        """
+        protocol, _, port = str(probe or "icmp").strip().lower().partition(":")
+        match protocol, port:
+            case "icmp", "":
+                return "icmp", None
+            case "udp", "":
+                return "udp", constants.udp_probe_port
+            case "tcp" | "udp", _ if port.isdigit() and 0 < int(port) < 65536:
+                return protocol, int(port)
+            case _:
+                return None
+
+    def probe_devices(self, devices_data: dict[str, dict]) -> dict[str, list[float]]:
+        """
+        Probe every device 'count' times over the protocol of its "probe", see parse_probe.
+        Args:
+            devices_data (dict[str, dict]): Device data with device IDs as keys, with a TCP or UDP "probe".
+        Returns:
+            dict[str, list[float]]: The round-trip time in seconds of every probe that succeeded, in the order the
+                probes were sent, keyed by device ID. Devices with an ICMP or invalid probe get no round-trip time.
+        """
+        return asyncio.run(self._probe_devices(devices_data))
+
+    async def _probe_devices(self, devices_data: dict[str, dict]) -> dict[str, list[float]]:
+        rtts: dict[str, list[float | None]] = {device_id: [None] * self.count for device_id in devices_data}
+        probes = iter([(device_id, probe_number) for device_id in devices_data for probe_number in range(self.count)])
+        targets: dict[str, tuple[str, str, int] | None] = {}
+        for device_id, device_data in devices_data.items():
+            probe = self.parse_probe(device_data.get("probe"))
+            targets[device_id] = (probe[0], device_data["ip"], probe[1]) if probe and probe[0] != "icmp" else None
+        started: list[int] = [0]
+        start_time: float = time.monotonic()
+
+        async def worker() -> None:
+            # The workers take the probes in turn from the shared iterator, which the event loop never interrupts.
+            for device_id, probe_number in probes:
+                if targets[device_id] is None:
+                    continue
+                if self.rate:
+                    started[0] += 1
+                    await asyncio.sleep(start_time + (started[0] - 1) / self.rate - time.monotonic())
+                protocol, ip, port = targets[device_id]
+                probe = self._probe_tcp if protocol == "tcp" else self._probe_udp
+                rtts[device_id][probe_number] = await probe(ip, port)
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(devices_data) * self.count))))
+        return {device_id: [rtt for rtt in device_rtts if rtt is not None] for device_id, device_rtts in rtts.items()}
+
+    @staticmethod
+    def _open_socket(ip: str, socket_type: int) -> socket.socket:
+        """
+        Open a non-blocking socket of the family of 'ip'.
+        Raises:
+            ValueError: If 'ip' is not an IP address.
+        """
+        family = socket.AF_INET6 if ipaddress.ip_address(ip).version == 6 else socket.AF_INET
+        probe_socket = socket.socket(family, socket_type)
+        probe_socket.setblocking(False)
+        return probe_socket
+
+    async def _probe_tcp(self, ip: str, port: int) -> float | None:
+        loop = asyncio.get_running_loop()
+        try:
+            probe_socket = self._open_socket(ip, socket.SOCK_STREAM)
+        except (ValueError, OSError):
+            return None
+        try:
+            # Reset the connection on close instead of leaving thousands of sockets in TIME_WAIT every cycle.
+            probe_socket.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+            sent_at = time.perf_counter()
+            await asyncio.wait_for(loop.sock_connect(probe_socket, (ip, port)), self.timeout)
+            return time.perf_counter() - sent_at
+        except (OSError, asyncio.TimeoutError):
+            return None
+        finally:
+            probe_socket.close()
+
+    async def _probe_udp(self, ip: str, port: int) -> float | None:
+        loop = asyncio.get_running_loop()
+        try:
+            probe_socket = self._open_socket(ip, socket.SOCK_DGRAM)
+        except (ValueError, OSError):
+            return None
+        try:
+            # A connected datagram socket receives the ICMP errors about its datagrams as ConnectionRefusedError.
+            probe_socket.connect((ip, port))
+            sent_at = time.perf_counter()
+            await loop.sock_sendall(probe_socket, PROBE_PAYLOAD)
+            try:
+                await asyncio.wait_for(loop.sock_recv(probe_socket, 2048), self.timeout)
+            except ConnectionRefusedError:
+                pass
+            return time.perf_counter() - sent_at
+        except (OSError, asyncio.TimeoutError):
+            return None
+        finally:
+            probe_socket.close()
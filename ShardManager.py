@@ -0,0 +1,148 @@
+import bisect
+import hashlib
+import os
+import re
+
+import constants
+
+
+class ShardManager:
+    """
+    Class responsible for splitting the devices between several monitor workers with consistent hashing.
+    Every worker is placed on a hash ring at 'virtual_nodes' points, and a device belongs to the worker owning the
+    first point at or after the hash of its ID. Adding or removing a worker only moves the devices between its
+    points and the previous ones, about 1/N of the devices, and the virtual nodes keep the slices of the workers
+    close in size. Every worker computes the ring from the same list of workers, so they agree on the split without
+    talking to each other.
+    Each worker stores its ping results, rollups and the rest of its availability data in its own directory under
+    'shards_directory', and the merged view of every worker is read with a MergedAvailabilityStore.
+    Attributes:
+        workers (list[str]): The names of the workers.
+        virtual_nodes (int): The number of points of every worker on the ring.
+        ring (list[int]): The sorted hashes of the points.
+        ring_workers (list[str]): The worker owning each point of the ring.
+    Methods:
+        __init__(self, workers: list[str], virtual_nodes: int) -> None:
+            Initialize ShardManager and build the hash ring.
+        __str__(self) -> str:
+            Return a string representation of the ShardManager object.
+        __repr__(self) -> str:
+            Return a string representation that can be used to recreate the ShardManager object.
+        get_worker(self, device_id: str) -> str:
+            Get the worker a device belongs to.
+        filter_devices(self, devices_data: dict[str, dict], worker: str) -> dict[str, dict]:
+            Get the devices that belong to a worker.
+        is_valid_worker_name(worker: str) -> bool:
+            Check if a name can be used for a worker.
+        get_shard_directory(worker: str) -> str:
+            Get the directory holding the availability data of a worker.
+        list_shard_workers() -> list[str]:
+            Get the workers that have a directory.
+    """
+
+    def __init__(self, workers: list[str], virtual_nodes: int = constants.shard_virtual_nodes):
+        """
+        Initialize ShardManager and build the hash ring.
+        Args:
+            workers (list[str]): The names of the workers.
+            virtual_nodes (int): The number of points of every worker on the ring.
+        Raises:
+            ValueError: If there are no workers, or a worker name is not valid.
+        """
+        if not workers:
+            raise ValueError(constants.shard_workers_not_provided)
+        if not all(self.is_valid_worker_name(worker) for worker in workers):
+            raise ValueError(constants.invalid_shard_name)
+        self.workers: list[str] = list(dict.fromkeys(workers))
+        self.virtual_nodes: int = max(1, virtual_nodes)
+        points = sorted((self.hash_key(f"{worker}#{point}"), worker)
+                        for worker in self.workers for point in range(self.virtual_nodes))
+        self.ring: list[int] = [point[0] for point in points]
+        self.ring_workers: list[str] = [point[1] for point in points]
+
+    def __str__(self):
+        """
+        Return a string representation of the ShardManager object.
+        Returns:
+            str: String representation of the object.
+        """
+        return f"ShardManager with {len(self.workers)} workers"
+
+    def __repr__(self):
+        """
+        Return a string representation that can be used to recreate the ShardManager object.
+        Returns:
+            str: String representation for recreation.
+        """
+        return f"ShardManager({self.workers!r}, {self.virtual_nodes})"
+
+    @staticmethod
+    def hash_key(key: str) -> int:
+        """
+        Hash a device ID or a point of the ring. The hash must not depend on the process, so the built-in hash() of
+        strings, which is randomized, cannot be used.
+        Args:
+            key (str): The key to hash.
+        Returns:
+            int: A 64-bit hash of the key.
+        """
+        return int.from_bytes(hashlib.md5(key.encode(), usedforsecurity=False).digest()[:8], "big")
+
+    def get_worker(self, device_id: str) -> str:
+        """
+        Get the worker a device belongs to.
+        Args:
+            device_id (str): The ID of the device.
+        Returns:
+            str: The name of the worker owning the first point of the ring at or after the hash of the device ID.
+        """
+        point = bisect.bisect_left(self.ring, self.hash_key(device_id))
+        return self.ring_workers[point % len(self.ring)]
+
+    def filter_devices(self, devices_data: dict[str, dict], worker: str) -> dict[str, dict]:
+        """
+        Get the devices that belong to a worker.
+        Args:
+            devices_data (dict[str, dict]): Device data with device IDs as keys, as returned by the DeviceDataManager.
+            worker (str): The name of the worker.
+        Returns:
+            dict[str, dict]: The device data of the devices of the worker, in the order of 'devices_data'.
+        """
+        return {device_id: device_data for device_id, device_data in devices_data.items()
+                if self.get_worker(device_id) == worker}
+
+    @staticmethod
+    def is_valid_worker_name(worker: str) -> bool:
+        """
+        Check if a name can be used for a worker: it names the directory of the worker, and "all" names the merged
+        view of every worker.
+        Args:
+            worker (str): The name to check.
+        Returns:
+            bool: True if the name only has letters, digits, '-' and '_', and is not "all".
+        """
+        return worker != "all" and re.fullmatch(r"[A-Za-z0-9_-]+", worker) is not None
+
+    @staticmethod
+    def get_shard_directory(worker: str) -> str:
+        """
+        Get the directory holding the availability data of a worker.
+        Args:
+            worker (str): The name of the worker.
+        Returns:
+            str: The directory of the worker under 'shards_directory'.
+        """
+        return os.path.join(constants.shards_directory, worker)
+
+    @staticmethod
+    def list_shard_workers() -> list[str]:
+        """
+        Get the workers that have a directory, that is every worker that has run, including removed ones whose
+        availability data is still kept.
+        Returns:
+            list[str]: The names of the workers, sorted.
+        """
+        if not os.path.isdir(constants.shards_directory):
+            return []
+        return sorted(name for name in os.listdir(constants.shards_directory)
+                      if os.path.isdir(os.path.join(constants.shards_directory, name)))
@@ -0,0 +1,362 @@
+import contextlib
+import math
+import mmap
+import os
+import struct
+import zlib
+
+import constants
+from AvailabilityStore import decode_measurement, encode_timestamp
+
+try:
+    import fcntl
+except ImportError:
+    # Without flock, as on Windows, the writers of a snapshot are not locked against each other.
+    fcntl = None
+
+# The header holds a magic number, the format version, the size of a record, the number of slots and the number of
+# devices. Every record holds a sequence number, the status (-1 for an empty slot), the device ID padded with NUL
+# bytes, the epoch microsecond times of the last probe and of the last status change, and the last average RTT in
+# seconds and packet loss in percent (NaN when not measured).
+HEADER = struct.Struct("<4sHHII")
+RECORD = struct.Struct(f"<Ib3x{constants.status_snapshot_device_id_size}sqqdd")
+MAGIC = b"DASS"
+VERSION = 1
+
+
+class StatusSnapshot:
+    """
+    Class responsible for the current status of every device, kept in a memory-mapped file of fixed-size records.
+    The records form an open-addressing hash table: a device is in the first slot at or after the CRC-32 of its ID
+    whose ID matches or that is empty, so a reader finds a device by looking at a slot or two, without an index or
+    the availability data. The monitor updates the record of every device in place after each probe. The table
+    is rebuilt with twice the slots, into a new file renamed over the old one, when more than
+    'status_snapshot_max_load' of its slots are used; readers that opened the old file keep reading it.
+    A record is written between two increments of its sequence number, which is odd while the record is being
+    written, so a reader retries a record whose sequence number is odd or changed while it was read, instead of
+    returning a half-written record. A record still odd after 'status_snapshot_read_retries' reads was left by a
+    writer that died while writing it: readers skip it, and the next writer to read it holding the lock makes its
+    sequence number even again. The file is never synced explicitly: the operating system writes the mapped
+    pages back in its own time, and a snapshot lost with the machine is filled again by the next probes.
+    Writers, such as the monitor and a command deleting a device, take an exclusive flock on the '.lock' file next to
+    the snapshot for every change. Once they hold it, they map the snapshot again if another writer replaced the file,
+    and look for the devices another writer added, so they never write to a replaced file or to a taken slot.
+    Rows older than the last probe of their device, such as imported availability data, leave its record unchanged.
+    Attributes:
+        filename (str): The filename of the snapshot.
+        writable (bool): Whether the snapshot is opened to be updated.
+        capacity (int): The number of slots, a power of two.
+        devices (int): The number of used slots.
+        slots (dict[str, int]): The slot of every device, only kept when writable.
+    Methods:
+        __init__(self, filename: str, writable: bool) -> None:
+            Initialize StatusSnapshot and open the snapshot file.
+        __str__(self) -> str:
+            Return a string representation of the StatusSnapshot object.
+        __repr__(self) -> str:
+            Return a string representation that can be used to recreate the StatusSnapshot object.
+        update(self, data: list[list]) -> None:
+            Update the records of the devices of a batch of ping results.
+        remove(self, device_ids: list[str]) -> int:
+            Remove devices from the snapshot.
+        get_status(self, device_id: str) -> dict | None:
+            Get the current status of a device.
+        get_statuses(self) -> dict[str, dict]:
+            Get the current status of every device of the snapshot.
+        close(self) -> None:
+            Close the snapshot file.
+    """
+
+    def __init__(self, filename: str = constants.device_status_snapshot_filename, writable: bool = False):
+        """
+        Initialize StatusSnapshot and open the snapshot file. A writable snapshot is created, or recreated if the file
+        is not a snapshot of this version.
+        Args:
+            filename (str): The filename of the snapshot.
+            writable (bool): Whether the snapshot is opened to be updated.
+        Raises:
+            FileNotFoundError: If the snapshot is opened for reading and does not exist.
+            ValueError: If the snapshot is opened for reading and is not a snapshot of this version.
+        """
+        self.filename: str = filename
+        self.writable: bool = writable
+        self.capacity: int = 0
+        self.devices: int = 0
+        self.slots: dict[str, int] = {}
+        # Device IDs too long for a record, reported once.
+        self.skipped_devices: set[str] = set()
+        self.map: mmap.mmap | None = None
+        # The device and inode of the mapped file, to tell when another writer replaced it.
+        self.file_id: tuple[int, int] | None = None
+        self.lock_file = open(f"{filename}.lock", "ab") if writable else None
+        # Whether the writer lock is held, when no other writer can be writing a record.
+        self.locked: bool = False
+        with self._lock():
+            try:
+                self._open()
+            except ValueError:
+                if not writable:
+                    raise
+                self._create(self.filename, constants.status_snapshot_initial_slots)
+                self._open()
+
+    def __str__(self):
+        """
+        Return a string representation of the StatusSnapshot object.
+        Returns:
+            str: String representation of the object.
+        """
+        return f"StatusSnapshot of {self.devices} devices"
+
+    def __repr__(self):
+        """
+        Return a string representation that can be used to recreate the StatusSnapshot object.
+        Returns:
+            str: String representation for recreation.
+        """
+        return f"StatusSnapshot({self.filename!r}, {self.writable})"
+
+    @staticmethod
+    def _create(filename: str, capacity: int, records: list[tuple] = ()) -> None:
+        """
+        Write a new snapshot file with 'capacity' empty slots and the given records, and rename it over 'filename'.
+        """
+        data = bytearray(HEADER.size) + RECORD.pack(0, -1, b"", 0, 0, math.nan, math.nan) * capacity
+        for record in records:
+            slot = StatusSnapshot._hash_slot(record[2], capacity)
+            while data[HEADER.size + slot * RECORD.size + 4] != 0xFF:
+                slot = (slot + 1) % capacity
+            RECORD.pack_into(data, HEADER.size + slot * RECORD.size, 0, *record[1:])
+        HEADER.pack_into(data, 0, MAGIC, VERSION, RECORD.size, capacity, len(records))
+        temporary_filename = f"{filename}.tmp"
+        with open(temporary_filename, "wb") as file:
+            file.write(data)
+        os.replace(temporary_filename, filename)
+
+    def _open(self) -> None:
+        if self.writable and not os.path.isfile(self.filename):
+            self._create(self.filename, constants.status_snapshot_initial_slots)
+        with open(self.filename, "r+b" if self.writable else "rb") as file:
+            file_stat = os.fstat(file.fileno())
+            try:
+                snapshot_map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_WRITE if self.writable
+                                         else mmap.ACCESS_READ)
+            except ValueError:
+                raise ValueError(f"{self.filename} is empty") from None
+        if len(snapshot_map) < HEADER.size:
+            snapshot_map.close()
+            raise ValueError(f"{self.filename} is not a status snapshot")
+        magic, version, record_size, capacity, devices = HEADER.unpack_from(snapshot_map, 0)
+        if (magic, version, record_size) != (MAGIC, VERSION, RECORD.size) or \
+                len(snapshot_map) != HEADER.size + capacity * record_size:
+            snapshot_map.close()
+            raise ValueError(f"{self.filename} is not a status snapshot of version {VERSION}")
+        self.map, self.capacity, self.devices = snapshot_map, capacity, devices
+        self.file_id = (file_stat.st_dev, file_stat.st_ino)
+        if self.writable:
+            self._load_slots()
+
+    def _load_slots(self) -> None:
+        self.slots = {record[2]: slot for slot in range(self.capacity)
+                      if (record := self._read_record(slot)) is not None}
+
+    @contextlib.contextmanager
+    def _lock(self):
+        """
+        Hold the writer lock of the snapshot, if it is opened for writing.
+        """
+        if self.lock_file is None:
+            yield
+            return
+        if fcntl is not None:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        self.locked = True
+        try:
+            yield
+        finally:
+            self.locked = False
+            if fcntl is not None:
+                fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+
+    def _refresh(self) -> None:
+        """
+        Catch up with the changes of the other writers, holding the writer lock: map the snapshot again if it was
+        replaced or deleted, otherwise look for the devices they added.
+        """
+        try:
+            file_stat = os.stat(self.filename)
+            replaced = (file_stat.st_dev, file_stat.st_ino) != self.file_id
+        except FileNotFoundError:
+            replaced = True
+        if replaced:
+            self._close_map()
+            try:
+                self._open()
+            except ValueError:
+                self._create(self.filename, constants.status_snapshot_initial_slots)
+                self._open()
+        elif struct.unpack_from("<I", self.map, HEADER.size - 4)[0] != self.devices:
+            self.devices = struct.unpack_from("<I", self.map, HEADER.size - 4)[0]
+            self._load_slots()
+
+    @staticmethod
+    def _hash_slot(device_id: bytes, capacity: int) -> int:
+        return zlib.crc32(device_id) & (capacity - 1)
+
+    def _read_record(self, slot: int) -> tuple | None:
+        """
+        Read the record of a slot, retrying while it is being written. Holding the writer lock, a record being written
+        was left by a writer that died, and its sequence number is made even again instead.
+        Returns:
+            tuple | None: The (sequence, status, device_id, last_probe, last_change, rtt, loss) record, with a str
+                device ID, or None if the slot is empty or still being written after 'status_snapshot_read_retries'
+                reads.
+        """
+        offset = HEADER.size + slot * RECORD.size
+        for _ in range(constants.status_snapshot_read_retries):
+            record = RECORD.unpack_from(self.map, offset)
+            if record[0] % 2 == 0 and struct.unpack_from("<I", self.map, offset)[0] == record[0]:
+                break
+            if self.locked:
+                record = ((record[0] + 1) & 0xFFFFFFFF,) + record[1:]
+                struct.pack_into("<I", self.map, offset, record[0])
+                break
+        else:
+            return None
+        if record[1] < 0:
+            return None
+        return (record[0], record[1], record[2].rstrip(b"\0").decode()) + record[3:]
+
+    def _find_record(self, device_id: str) -> tuple | None:
+        encoded_id = device_id.encode()
+        if len(encoded_id) > constants.status_snapshot_device_id_size:
+            return None
+        slot = self._hash_slot(encoded_id, self.capacity)
+        for _ in range(self.capacity):
+            record = self._read_record(slot)
+            if record is None or record[2] == device_id:
+                return record
+            slot = (slot + 1) % self.capacity
+        return None
+
+    def _rebuild(self, capacity: int, removed_device_ids: set[str] = frozenset()) -> None:
+        """
+        Rebuild the snapshot with 'capacity' slots and without the removed devices, and map the new file. Called with
+        the writer lock held.
+        """
+        records = [record for slot in range(self.capacity) if (record := self._read_record(slot)) is not None
+                   and record[2] not in removed_device_ids]
+        records = [(record[0], record[1], record[2].encode()) + record[3:] for record in records]
+        self._close_map()
+        self._create(self.filename, capacity, records)
+        self._open()
+
+    def update(self, data: list[list]) -> None:
+        """
+        Update the records of the devices of a batch of ping results, adding the devices that are not in the
+        snapshot yet.
+        Args:
+            data (list[list]): The [device_id, status, timestamp] rows of the ping results, optionally followed by the
+                measurements, in time order per device.
+        Returns:
+            None
+        """
+        with self._lock():
+            self._refresh()
+            self._update(data)
+
+    def _update(self, data: list[list]) -> None:
+        for row in data:
+            device_id = str(row[0])
+            slot: int | None = self.slots.get(device_id)
+            timestamp = encode_timestamp(row[2])
+            status = int(row[1])
+            rtt = decode_measurement(row[3]) if len(row) > 3 else None
+            loss = decode_measurement(row[7]) if len(row) > 7 else None
+            if slot is None:
+                encoded_id = device_id.encode()
+                if len(encoded_id) > constants.status_snapshot_device_id_size:
+                    if device_id not in self.skipped_devices:
+                        self.skipped_devices.add(device_id)
+                        print(f"{constants.status_snapshot_id_too_long}: {device_id}")
+                    continue
+                if self.devices + 1 > self.capacity * constants.status_snapshot_max_load:
+                    self._rebuild(self.capacity * 2)
+                slot = self._hash_slot(encoded_id, self.capacity)
+                while self.map[HEADER.size + slot * RECORD.size + 4] != 0xFF:
+                    slot = (slot + 1) % self.capacity
+                sequence, last_change = 0, timestamp
+                self.slots[device_id] = slot
+                self.devices += 1
+                struct.pack_into("<I", self.map, HEADER.size - 4, self.devices)
+            else:
+                sequence, previous_status, _, last_probe, last_change, _, _ = self._read_record(slot)
+                if timestamp < last_probe:
+                    continue
+                if previous_status != status:
+                    last_change = timestamp
+            offset = HEADER.size + slot * RECORD.size
+            struct.pack_into("<I", self.map, offset, (sequence + 1) & 0xFFFFFFFF)
+            RECORD.pack_into(self.map, offset, (sequence + 1) & 0xFFFFFFFF, status, device_id.encode(), timestamp,
+                             last_change, math.nan if rtt is None else rtt, math.nan if loss is None else loss)
+            struct.pack_into("<I", self.map, offset, (sequence + 2) & 0xFFFFFFFF)
+
+    def remove(self, device_ids: list[str]) -> int:
+        """
+        Remove devices from the snapshot, for example once they are deleted. The snapshot is rebuilt without them,
+        as a slot can not be emptied in place without hiding the devices stored after it.
+        Args:
+            device_ids (list[str]): The IDs of the devices to remove. Devices that are not in the snapshot are ignored.
+        Returns:
+            int: The number of devices removed.
+        """
+        with self._lock():
+            self._refresh()
+            removed_device_ids: set[str] = {device_id for device_id in device_ids if device_id in self.slots}
+            if removed_device_ids:
+                self._rebuild(self.capacity, removed_device_ids)
+        return len(removed_device_ids)
+
+    @staticmethod
+    def _format_record(record: tuple) -> dict:
+        return {"status": record[1], "last_probe": record[3], "last_change": record[4],
+                "rtt": None if math.isnan(record[5]) else record[5],
+                "loss": None if math.isnan(record[6]) else record[6]}
+
+    def get_status(self, device_id: str) -> dict | None:
+        """
+        Get the current status of a device.
+        Args:
+            device_id (str): The ID of the device.
+        Returns:
+            dict | None: The 'status', the epoch microsecond 'last_probe' and 'last_change' times, the last 'rtt' in
+                seconds and 'loss' in percent (None when not measured) of the device, or None if it is not in the
+                snapshot.
+        """
+        record = self._find_record(device_id)
+        return self._format_record(record) if record is not None else None
+
+    def get_statuses(self) -> dict[str, dict]:
+        """
+        Get the current status of every device of the snapshot.
+        Returns:
+            dict[str, dict]: The status of every device, see get_status, keyed by device ID.
+        """
+        return {record[2]: self._format_record(record) for slot in range(self.capacity)
+                if (record := self._read_record(slot)) is not None}
+
+    def _close_map(self) -> None:
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+    def close(self) -> None:
+        """
+        Close the snapshot file.
+        Returns:
+            None
+        """
+        self._close_map()
+        if self.lock_file is not None:
+            self.lock_file.close()
+            self.lock_file = None
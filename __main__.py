@@ -1,7 +1,15 @@
 import argparse
+from typing import TYPE_CHECKING
+
+import constants
 from DeviceDataManager import DeviceDataManager
-from DeviceAvailabilityDataManager import DeviceAvailabilityDataManager
-from IPAndPingManager import IPAndPingManager
+from ShardManager import ShardManager
+
+# The other managers are imported by the commands that use them, see get_device_availability_data_manager and
+# get_ip_and_ping_manager, so that the commands that do not ping or read the availability data start quickly.
+if TYPE_CHECKING:
+    from DeviceAvailabilityDataManager import DeviceAvailabilityDataManager
+    from IPAndPingManager import IPAndPingManager
 
 
 def setup_args_parser():
@@ -40,6 +48,18 @@ def setup_args_parser():
         type=str,
         help="Delete a device by specifying its ID"
     )
+    args_parsers.add_argument(
+        "--import-devices",
+        type=str,
+        metavar="<file>",
+        help="Add all the devices of a .csv, .json or .jsonl file (- for JSONL on standard input)"
+    )
+    args_parsers.add_argument(
+        "--export-devices",
+        type=str,
+        metavar="<file>",
+        help="Write all the devices to a .csv, .json or .jsonl file (- for JSONL on standard output)"
+    )
     args_parsers.add_argument(
         "--view-device-availability-data",
         action="store_true",
@@ -48,20 +68,196 @@ def setup_args_parser():
     args_parsers.add_argument(
         "--view-filtered-device-availability-data",
         nargs=2,
+        action="append",
         metavar=("<parameter_type>", "<value>"),
-        help="Search for availability data by parameter type and value. Example: --device-availability-data date " +
-             "<date>, --device-availability-data id <device-id>"
+        help="Search for availability data by parameter type and value. Parameter types are id, date, range and " +
+             "status. Repeat the option to combine filters. Example: --view-filtered-device-availability-data " +
+             "date <date>, --view-filtered-device-availability-data range <date>..<date> " +
+             "--view-filtered-device-availability-data id <device-id>"
     )
     args_parsers.add_argument(
         "--ping-devices",
         action="store_true",
         help="Start monitoring the devices"
     )
+    args_parsers.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Start monitoring the devices and serve their device data, current status and history as JSON on " +
+             f"http://{constants.daemon_host}:<port>"
+    )
+    args_parsers.add_argument(
+        "--metrics-port",
+        type=int,
+        help="With --ping-devices, serve the metrics of the ping loop in the Prometheus text format on " +
+             f"http://{constants.daemon_host}:<metrics_port>/metrics (--daemon serves them on /metrics of its API)"
+    )
+    args_parsers.add_argument(
+        "--port",
+        type=int,
+        default=constants.daemon_port,
+        help=f"Port of the --daemon HTTP API (default: {constants.daemon_port})"
+    )
+    args_parsers.add_argument(
+        "--shard",
+        help="Name of this monitor worker when the devices are split between several workers: --ping-devices and " +
+             "--daemon only ping the devices of this worker, and every command uses the availability data of the " +
+             f"worker, kept in {constants.shards_directory}/<shard>/. Use 'all' to read the merged availability " +
+             "data of every worker"
+    )
+    args_parsers.add_argument(
+        "--shard-workers",
+        help="Comma-separated names of all the monitor workers, the same for every worker. Required with --shard " +
+             "and --ping-devices or --daemon. Example: --shard-workers worker-1,worker-2,worker-3"
+    )
+    args_parsers.add_argument(
+        "--durability",
+        choices=["none", "flush", "fsync"],
+        default=constants.availability_writer_durability,
+        help="With --ping-devices or --daemon, how far every batch of ping results is written before the next one: " +
+             "to the process buffers, to the operating system, or to disk with fsync " +
+             f"(default: {constants.availability_writer_durability})"
+    )
+    args_parsers.add_argument(
+        "--adaptive-schedule",
+        action="store_true",
+        help="With --ping-devices or --daemon, ping every device on its own schedule: more often while it is " +
+             "flapping or down, less often while it is stable"
+    )
+    args_parsers.add_argument(
+        "--record-transitions-only",
+        action="store_true",
+        help="With --ping-devices or --daemon, save only the ping results where a device's status changed, plus " +
+             "an hourly heartbeat per device"
+    )
+    args_parsers.add_argument(
+        "--view-device-states-at",
+        type=str,
+        metavar="<time>",
+        help="View the status every device had at a time, given as 'YYYY-MM-DD HH:MM:SS' or 'YYYY-MM-DD'"
+    )
+    args_parsers.add_argument(
+        "--status",
+        nargs="?",
+        const="",
+        metavar="<device_id>",
+        help="View the current status of a device, or of every device, with the time it has had it since, from the " +
+             "status snapshot kept by --ping-devices and --daemon, without reading the availability data"
+    )
+    args_parsers.add_argument(
+        "--uptime-report",
+        nargs="+",
+        metavar=("<device_id>", "<period>"),
+        help="View the uptime, longest outage and mean RTT of a device, or of 'all' devices, for a day " +
+             "('YYYY-MM-DD', hour by hour) or a range of days ('YYYY-MM-DD..YYYY-MM-DD', day by day). " +
+             "Defaults to the last 7 days"
+    )
+    args_parsers.add_argument(
+        "--fleet-report",
+        nargs="?",
+        const="",
+        metavar="<period>",
+        help="View uptime percentiles, outage durations and correlated outages across all devices, optionally for a " +
+             "day ('YYYY-MM-DD') or a range of days ('YYYY-MM-DD..YYYY-MM-DD'). Requires NumPy"
+    )
+    args_parsers.add_argument(
+        "--rebuild-rollups",
+        action="store_true",
+        help="Recompute the rollups used by --uptime-report from the stored device availability data"
+    )
+    args_parsers.add_argument(
+        "--interval",
+        type=int,
+        default=constants.ping_interval,
+        help=f"Seconds between pings of a device (default: {constants.ping_interval}). With --adaptive-schedule, " +
+             "a device's own \"interval\" in the device data takes precedence"
+    )
     args_parsers.add_argument(
         "--ping-device",
         type=str,
         help="Ping a device by its ip"
     )
+    args_parsers.add_argument(
+        "--probe",
+        type=str,
+        metavar="<probe>",
+        help="How the device of --ping-device, --add-device or --update-device is pinged: icmp (the default), " +
+             "tcp:<port> to connect to a port, or udp or udp:<port> to wait for an answer to a datagram. TCP and UDP " +
+             "need no privileges and pass networks that filter ICMP"
+    )
+    args_parsers.add_argument(
+        "--import-device-availability-data",
+        type=str,
+        metavar="<csv_file>",
+        help="Import device availability data from a CSV file into the selected storage backend"
+    )
+    args_parsers.add_argument(
+        "--archive-device-availability-data",
+        type=str,
+        metavar="<csv_file>",
+        help="Convert a CSV file of device availability data, such as device_availability_data.csv, into the " +
+             "compressed archive read with --storage archive. The rows are appended to the archive"
+    )
+    args_parsers.add_argument(
+        "--prune-device-availability-data",
+        nargs=2,
+        type=int,
+        metavar=("<compress_after_days>", "<delete_after_days>"),
+        help="Compress the availability data older than <compress_after_days> days and delete the data older than " +
+             "<delete_after_days> days. Use 0 to skip a step."
+    )
+    args_parsers.add_argument(
+        "--storage",
+        choices=["csv", "sqlite", "partitioned", "archive"],
+        default=constants.availability_storage_backend,
+        help=f"Storage backend of the device availability data (default: {constants.availability_storage_backend})"
+    )
+    args_parsers.add_argument(
+        "--discover",
+        type=str,
+        metavar="<network>",
+        help="Ping every host of a network in CIDR notation (e.g. 10.0.0.0/22) and add the ones that reply as devices"
+    )
+    args_parsers.add_argument(
+        "--rate",
+        type=float,
+        help="Maximum number of pings started per second (default: unlimited, " +
+             f"{constants.discovery_rate} for --discover)"
+    )
+    args_parsers.add_argument(
+        "--concurrency",
+        type=int,
+        default=constants.ping_concurrency,
+        help=f"Maximum number of devices pinged at the same time (default: {constants.ping_concurrency})"
+    )
+    args_parsers.add_argument(
+        "--timeout",
+        type=float,
+        default=constants.ping_timeout,
+        help=f"Seconds to wait for each ping reply (default: {constants.ping_timeout})"
+    )
+    args_parsers.add_argument(
+        "--count",
+        type=int,
+        default=constants.ping_count,
+        help="Number of pings sent to every device each cycle; the device is up if any of them is answered, and " +
+             f"their round-trip times and loss are recorded (default: {constants.ping_count})"
+    )
+    args_parsers.add_argument(
+        "--processes",
+        type=int,
+        default=constants.ping_processes,
+        help="Number of prober processes the devices are split between, each pinging its part with --concurrency " +
+             "threads or a sweep, to use several cores for very large device sets " +
+             f"(default: {constants.ping_processes})"
+    )
+    args_parsers.add_argument(
+        "--ping-engine",
+        choices=["pool", "sweep"],
+        default=constants.ping_engine,
+        help="Ping devices through ping3 on a pool of threads, or all at once from one shared ICMP socket " +
+             f"(default: {constants.ping_engine})"
+    )
     return args_parsers
 
 
@@ -84,25 +280,80 @@ def get_valid_input(prompt: str, validation_func: callable, not_empty=True, erro
         print(error_message) if error_message is not None else print("Invalid input. Please try again.")
 
 
+def is_valid_ip(ip: str) -> bool:
+    """
+    Check if an IP is valid, see IPAndPingManager.is_valid_ip.
+    Args:
+        ip (str): IP to be validated
+    Returns:
+        bool: True if the IP is valid, otherwise False
+    """
+    from IPAndPingManager import IPAndPingManager
+    return IPAndPingManager.is_valid_ip(ip)
+
+
+def get_device_availability_data_manager(argument: argparse.Namespace) -> "DeviceAvailabilityDataManager":
+    """
+    Import and create the manager of the availability data selected by the command-line arguments.
+    Args:
+        argument (argparse.Namespace): The parsed command-line arguments.
+    Returns:
+        DeviceAvailabilityDataManager: The manager of the availability data of the selected storage backend and shard.
+    """
+    from DeviceAvailabilityDataManager import DeviceAvailabilityDataManager
+    recording_mode: str = "transitions" if argument.record_transitions_only else constants.availability_recording_mode
+    return DeviceAvailabilityDataManager(argument.storage, recording_mode, shard=argument.shard)
+
+
+def get_ip_and_ping_manager(argument: argparse.Namespace, device_data_manager: DeviceDataManager) -> "IPAndPingManager":
+    """
+    Import and create the ping manager configured by the command-line arguments, sharing the device data manager
+    of the command instead of creating its own.
+    Args:
+        argument (argparse.Namespace): The parsed command-line arguments.
+        device_data_manager (DeviceDataManager): The device data manager of the command.
+    Returns:
+        IPAndPingManager: The ping manager.
+    Raises:
+        ValueError: If the shard arguments are not valid, see IPAndPingManager.
+    """
+    from IPAndPingManager import IPAndPingManager
+    device_availability_data_manager: DeviceAvailabilityDataManager = get_device_availability_data_manager(argument)
+    # Only the ping loops need to know the other shard workers, the other commands just read or write the
+    # availability data of the selected shard.
+    monitoring: bool = argument.ping_devices or argument.daemon
+    return IPAndPingManager(
+        argument.concurrency, argument.timeout, argument.ping_engine, argument.storage, argument.rate,
+        recording_mode=device_availability_data_manager.recording_mode, count=argument.count,
+        shard=argument.shard if monitoring else None,
+        shard_workers=argument.shard_workers.split(",") if argument.shard_workers else None,
+        processes=argument.processes, device_data_manager=device_data_manager,
+        device_availability_data_manager=device_availability_data_manager)
+
+
 def main() -> None:
     """
     Main function to execute the Device Availability Monitoring program.
     Returns:
         None
     """
-    device_data_manager: DeviceDataManager = DeviceDataManager()
-    device_availability_data_manager: DeviceAvailabilityDataManager = DeviceAvailabilityDataManager()
-    ip_and_ping_manager: IPAndPingManager = IPAndPingManager()
     args_parsers = setup_args_parser()
     argument = args_parsers.parse_args()
+    if argument.shard is not None and argument.shard != "all" and not ShardManager.is_valid_worker_name(argument.shard):
+        print(constants.invalid_shard_name)
+        return
+    if argument.probe is not None and not DeviceDataManager.is_valid_probe(argument.probe):
+        print(constants.invalid_probe)
+        return
+    device_data_manager: DeviceDataManager = DeviceDataManager()
     if argument.add_device:
         device_id: str = get_valid_input("Enter Device ID (No Spaces Allowed): ",
                                          lambda deviceid: not device_data_manager.check_if_id_exists(deviceid)
                                          and " " not in deviceid, error_message="Device ID already exists or contains "
                                          "spaces. Please enter a unique Device ID.")
         device_name: str = get_valid_input("Enter Device Name: ", lambda name: name != "")
-        device_ip: str = get_valid_input("Enter Device IP: ", ip_and_ping_manager.is_valid_ip)
-        device_data_manager.add_device(device_id, device_name.strip(), device_ip)
+        device_ip: str = get_valid_input("Enter Device IP: ", is_valid_ip)
+        device_data_manager.add_device(device_id, device_name.strip(), device_ip, argument.probe)
     elif argument.view_devices:
         device_data_manager.print_all_device_data()
     elif argument.view_device:
@@ -123,8 +374,8 @@ def main() -> None:
         print(f"Enter Device IP: (Current is: {device_data['ip']})")
         device_ip: str = get_valid_input("(Leave Blank for same): ",
                                          lambda user_device_ip: True if user_device_ip == ""
-                                         else ip_and_ping_manager.is_valid_ip(user_device_ip), not_empty=False)
-        device_data_manager.update_device_data_by_id(device_id, device_name, device_ip)
+                                         else is_valid_ip(user_device_ip), not_empty=False)
+        device_data_manager.update_device_data_by_id(device_id, device_name, device_ip, argument.probe)
     elif argument.delete_device:
         device_id: str = argument.delete_device
         if not device_data_manager.check_if_id_exists(device_id):
@@ -136,29 +387,97 @@ def main() -> None:
             match confirmation:
                 case 'y':
                     device_data_manager.delete_device_by_id(device_id)
+                    from DeviceAvailabilityDataManager import DeviceAvailabilityDataManager
+                    DeviceAvailabilityDataManager.remove_device_statuses([device_id])
                     return
                 case 'n':
                     return
                 case _:
                     confirmation = input("Please enter valid operation (y/n): ")
+    elif argument.import_devices:
+        device_data_manager.import_devices(argument.import_devices, is_valid_ip)
+    elif argument.export_devices:
+        device_data_manager.export_devices(argument.export_devices)
     elif argument.view_device_availability_data:
-        device_availability_data_manager.print_all_device_availability_data()
+        get_device_availability_data_manager(argument).print_all_device_availability_data()
     elif argument.view_filtered_device_availability_data:
-        parameter, value = argument.view_filtered_device_availability_data
-        if parameter == "id" and not device_data_manager.check_if_id_exists(value):
+        for parameter, value in argument.view_filtered_device_availability_data:
+            if parameter == "id" and not device_data_manager.check_if_id_exists(value):
+                print("Invalid Id")
+                return
+        get_device_availability_data_manager(argument).print_device_availability_data_by_parameters(
+            argument.view_filtered_device_availability_data)
+    elif argument.view_device_states_at:
+        get_device_availability_data_manager(argument).print_device_states_at(argument.view_device_states_at)
+    elif argument.status is not None:
+        get_device_availability_data_manager(argument).print_device_statuses(argument.status or None,
+                                                                             device_data_manager.load_device_data_file)
+    elif argument.uptime_report:
+        if len(argument.uptime_report) > 2:
+            print("Please provide a device ID and at most one day or range of days.")
+            return
+        if argument.uptime_report[0] != "all" and not device_data_manager.check_if_id_exists(argument.uptime_report[0]):
             print("Invalid Id")
             return
-        device_availability_data_manager.print_device_availability_data_by_parameter(parameter, value)
+        get_device_availability_data_manager(argument).print_uptime_report(*argument.uptime_report)
+    elif argument.fleet_report is not None:
+        get_device_availability_data_manager(argument).print_fleet_report(argument.fleet_report or None)
+    elif argument.rebuild_rollups:
+        get_device_availability_data_manager(argument).rebuild_rollups()
+    elif argument.import_device_availability_data:
+        get_device_availability_data_manager(argument).import_device_availability_data_file(
+            argument.import_device_availability_data)
+    elif argument.archive_device_availability_data:
+        get_device_availability_data_manager(argument).archive_device_availability_data_file(
+            argument.archive_device_availability_data)
+    elif argument.prune_device_availability_data:
+        get_device_availability_data_manager(argument).prune_device_availability_data(
+            *argument.prune_device_availability_data)
     elif argument.ping_device:
         device_ip: str = argument.ping_device
-        if not ip_and_ping_manager.is_valid_ip(device_ip):
+        if not is_valid_ip(device_ip):
             print("Invalid IP")
-            device_ip: str = get_valid_input("Enter Device IP: ", ip_and_ping_manager.is_valid_ip)
-        ip_and_ping_manager.ping_device(device_ip)
-    elif argument.ping_devices:
-        ip_and_ping_manager.ping_all_devices()
+            device_ip: str = get_valid_input("Enter Device IP: ", is_valid_ip)
+        from IPAndPingManager import IPAndPingManager
+        IPAndPingManager.ping_device(device_ip, argument.timeout, probe=argument.probe or "icmp")
+    elif argument.discover or argument.daemon or argument.ping_devices:
+        try:
+            ip_and_ping_manager: IPAndPingManager = get_ip_and_ping_manager(argument, device_data_manager)
+        except ValueError as error:
+            print(error)
+            return
+        if argument.discover:
+            ip_and_ping_manager.rate = argument.rate or constants.discovery_rate
+            ip_and_ping_manager.verbose = False
+            ip_and_ping_manager.discover_devices(argument.discover)
+            ip_and_ping_manager.close()
+        elif argument.daemon:
+            from MonitoringDaemon import MonitoringDaemon
+            ip_and_ping_manager.device_availability_data_manager.start_writer(argument.durability)
+            try:
+                MonitoringDaemon(ip_and_ping_manager, port=argument.port).run(argument.interval,
+                                                                              argument.adaptive_schedule)
+            finally:
+                ip_and_ping_manager.close()
+                ip_and_ping_manager.device_availability_data_manager.close_writer()
+        else:
+            if argument.metrics_port is not None:
+                ip_and_ping_manager.metrics_manager.start_server(port=argument.metrics_port)
+            ip_and_ping_manager.device_availability_data_manager.start_writer(argument.durability)
+            try:
+                if argument.adaptive_schedule:
+                    ip_and_ping_manager.ping_all_devices_scheduled(argument.interval)
+                else:
+                    ip_and_ping_manager.ping_all_devices(argument.interval)
+            except KeyboardInterrupt:
+                print("Stopping, waiting for the saved ping results to be written")
+            finally:
+                ip_and_ping_manager.close()
+                ip_and_ping_manager.device_availability_data_manager.close_writer()
     else:
         args_parsers.print_help()
 
 
-main()
+# The prober processes of --processes import this module, and must not run the command again.
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark the NumPy availability analytics on a synthetic availability history.
+
+    python benchmarks/bench_availability_analytics.py --rows 100000000 --devices 10000
+    python benchmarks/bench_availability_analytics.py --rows 1000000 --devices 1000 --baseline-rows 1000000
+
+The history is generated the way the monitor writes it: one row per device every cycle, in time order. Every device
+has its own probability of failing a ping, and a number of correlated outages take a random tenth of the devices down
+for a few cycles. The arrays take 13 bytes per row and sorting them needs about twice as much again, so 100M rows
+need a little over 4 GB of memory.
+The analytics are compared with a plain Python loop over a list of rows, as produced by
+load_device_availability_data_file, on the first --baseline-rows rows.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from AvailabilityAnalyticsManager import AvailabilityAnalyticsManager  # noqa: E402
+
+
+def generate_history(rows: int, devices: int, interval: int, correlated_outages: int, seed: int):
+    """
+    Generate a synthetic availability history.
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: The device index, status and timestamp arrays, in time order.
+    """
+    rng = np.random.default_rng(seed)
+    cycles = rows // devices
+    start = 1_700_000_000 * 1_000_000
+    timestamps = np.repeat(start + np.arange(cycles, dtype=np.int64) * interval * 1_000_000, devices)
+    device_index = np.tile(np.arange(devices, dtype=np.int32), cycles)
+    failure_probability = rng.beta(0.5, 50, devices).astype(np.float32)
+    status = np.empty(cycles * devices, dtype=bool)
+    chunk = max(1, 10_000_000 // devices) * devices
+    for first in range(0, len(status), chunk):
+        last = min(first + chunk, len(status))
+        status[first:last] = rng.random(last - first, dtype=np.float32) >= failure_probability[device_index[first:last]]
+    for cycle in rng.integers(0, cycles, correlated_outages):
+        affected = rng.choice(devices, max(1, devices // 10), replace=False)
+        for outage_cycle in range(cycle, min(cycles, cycle + int(rng.integers(1, 6)))):
+            status[outage_cycle * devices + affected] = False
+    return device_index, status, timestamps
+
+
+def python_baseline(rows: list[list]) -> float:
+    """
+    Compute the outages and the uptime of every device with a Python loop, as done before the analytics module.
+    Returns:
+        float: The median uptime, so the work cannot be skipped.
+    """
+    end = max(row[2] for row in rows)
+    first_seen: dict[str, int] = {}
+    down_since: dict[str, int] = {}
+    down_seconds: dict[str, float] = {}
+    for device_id, status, timestamp in sorted(rows, key=lambda row: (row[0], row[2])):
+        first_seen.setdefault(device_id, timestamp)
+        if not status and device_id not in down_since:
+            down_since[device_id] = timestamp
+        elif status and device_id in down_since:
+            outage = (timestamp - down_since.pop(device_id)) / 1_000_000
+            down_seconds[device_id] = down_seconds.get(device_id, 0) + outage
+    for device_id, timestamp in down_since.items():
+        down_seconds[device_id] = down_seconds.get(device_id, 0) + (end - timestamp) / 1_000_000
+    uptime = sorted(100 * (1 - down_seconds.get(device_id, 0) / max(1, (end - first) / 1_000_000))
+                    for device_id, first in first_seen.items())
+    return uptime[len(uptime) // 2]
+
+
+def timed(label: str, function, rows: int):
+    started = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<32} {elapsed:>8.2f} s  {rows / elapsed / 1e6:>8.1f} M rows/s")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000_000)
+    parser.add_argument("--devices", type=int, default=10_000)
+    parser.add_argument("--interval", type=int, default=300, help="Seconds between two cycles")
+    parser.add_argument("--correlated-outages", type=int, default=50)
+    parser.add_argument("--baseline-rows", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    arguments = parser.parse_args()
+
+    started = time.perf_counter()
+    device_index, status, timestamps = generate_history(arguments.rows, arguments.devices, arguments.interval,
+                                                        arguments.correlated_outages, arguments.seed)
+    rows = len(timestamps)
+    print(f"Generated {rows} rows of {arguments.devices} devices in {time.perf_counter() - started:.2f} s")
+    baseline_rows = min(arguments.baseline_rows, rows)
+    baseline = [[f"device-{device}", int(device_status), int(timestamp)] for device, device_status, timestamp in
+                zip(device_index[:baseline_rows].tolist(), status[:baseline_rows].tolist(),
+                    timestamps[:baseline_rows].tolist())]
+
+    print(f"\n{baseline_rows} rows:")
+    timed("Python loop uptime", lambda: python_baseline(baseline), baseline_rows)
+    small = timed("Analytics load from rows", lambda: AvailabilityAnalyticsManager.from_rows(baseline), baseline_rows)
+    timed("Analytics uptime", lambda: small.get_uptime_percentiles(), baseline_rows)
+    del baseline, small
+
+    print(f"\n{rows} rows:")
+    device_ids = [f"device-{device}" for device in range(arguments.devices)]
+    analytics = timed("Sort into arrays", lambda: AvailabilityAnalyticsManager(device_ids, device_index, status,
+                                                                                timestamps), rows)
+    del device_index, status, timestamps
+    outages = timed("Outages", analytics.get_outages, rows)
+    percentiles = timed("Uptime percentiles", analytics.get_uptime_percentiles, rows)
+    histogram = timed("Outage histogram", analytics.get_outage_histogram, rows)
+    correlated = timed("Correlated outages", analytics.get_correlated_outages, rows)
+    print(f"\n{len(outages[0])} outages, uptime percentiles {np.round(percentiles, 3).tolist()}, "
+          f"histogram {histogram.tolist()}, {len(correlated)} correlated outages")
+
+
+if __name__ == "__main__":
+    main()
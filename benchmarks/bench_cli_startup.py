@@ -0,0 +1,111 @@
+"""
+Benchmark the startup of the command-line interface: the wall time of short commands, and the modules they import
+with the time spent importing each, from python -X importtime.
+
+    python benchmarks/bench_cli_startup.py
+    python benchmarks/bench_cli_startup.py --runs 21 --top 20
+
+The commands run in a throwaway working directory holding a small device registry and its status snapshot. Commands
+that neither ping nor read the availability data should not import the ping, storage or analytics modules; the
+modules listed in FORBIDDEN are reported when a command imports them. bench_suite.py runs the same measurement as
+its 'startup' scenario, to compare it with the baseline.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from DeviceDataManager import DeviceDataManager  # noqa: E402
+from StatusSnapshot import StatusSnapshot  # noqa: E402
+from simulation import generate_availability_rows, generate_registry  # noqa: E402
+
+MAIN_FILENAME = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "__main__.py")
+COMMANDS = {"help": ["--help"],
+            "view_device": ["--view-device", "device-0"],
+            "view_availability": ["--view-filtered-device-availability-data", "id", "device-0"],
+            "status": ["--status", "device-0"]}
+# Modules that only the commands pinging or analysing the availability data need.
+FORBIDDEN = {"help": ["ping3", "numpy", "IPAndPingManager", "DeviceAvailabilityDataManager"],
+             "view_device": ["ping3", "numpy", "IPAndPingManager", "DeviceAvailabilityDataManager"],
+             "view_availability": ["ping3", "numpy", "IPAndPingManager", "multiprocessing"],
+             "status": ["ping3", "numpy", "IPAndPingManager", "multiprocessing"]}
+
+
+def parse_importtime(output: str) -> dict[str, tuple[int, int]]:
+    """
+    Parse the report of python -X importtime.
+    Returns:
+        dict[str, tuple[int, int]]: The self and cumulative import time of every module in microseconds, and the
+            total under the key "" (the cumulative time of the modules imported by the script itself).
+    """
+    modules: dict[str, tuple[int, int]] = {}
+    total = 0
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(own), int(cumulative))
+        if not name[1:].startswith(" "):
+            total += int(cumulative)
+    modules[""] = (0, total)
+    return modules
+
+
+def measure_startup(command: list[str], runs: int) -> tuple[float, dict[str, tuple[int, int]]]:
+    """
+    Run a command of the command-line interface 'runs' times in the current directory.
+    Returns:
+        tuple[float, dict[str, tuple[int, int]]]: The median wall time in seconds, and the imports of the last run,
+            see parse_importtime.
+    """
+    durations = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        process = subprocess.run([sys.executable, "-X", "importtime", MAIN_FILENAME, *command],
+                                 stdin=subprocess.DEVNULL, capture_output=True, text=True)
+        durations.append(time.perf_counter() - started)
+    return statistics.median(durations), parse_importtime(process.stderr)
+
+
+def prepare_directory(devices: int = 100) -> None:
+    """
+    Save a registry of 'devices' generated devices, and a status snapshot of them, in the current directory.
+    """
+    DeviceDataManager().save_device_data_file(generate_registry(devices))
+    status_snapshot = StatusSnapshot(writable=True)
+    status_snapshot.update(next(generate_availability_rows(devices, devices)))
+    status_snapshot.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=11)
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest imports listed for every command")
+    arguments = parser.parse_args()
+
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], check=True)
+    print(f"Interpreter alone: {(time.perf_counter() - started) * 1000:.1f} ms")
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        prepare_directory()
+        for name, command in COMMANDS.items():
+            duration, modules = measure_startup(command, arguments.runs)
+            print(f"\n{name}: {duration * 1000:.1f} ms, {modules[''][1] / 1000:.1f} ms importing "
+                  f"{len(modules) - 1} modules")
+            slowest = sorted(((cumulative, module) for module, (_, cumulative) in modules.items() if module),
+                             reverse=True)[:arguments.top]
+            for cumulative, module in slowest:
+                print(f"  {cumulative / 1000:>8.1f} ms  {module}")
+            imported = [module for module in FORBIDDEN[name] if module in modules]
+            if imported:
+                print(f"  Imports {', '.join(imported)}, which this command does not need")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark the shared-socket ICMP sweep against the per-device ping path.
+
+    python benchmarks/bench_icmp_sweep.py --mode fake --devices 5000
+    python benchmarks/bench_icmp_sweep.py --mode loopback --devices 2000
+
+The 'fake' mode needs no network or privileges: the sweep runs against FakeICMPSocket and the per-device path is
+emulated with one fake socket per probe on a thread pool, which is what ping3 does with real sockets.
+The 'loopback' mode pings real addresses from 127.0.0.0/8 (all of which answer on Linux) with both
+IPAndPingManager engines, and needs permission to open ICMP sockets.
+"""
+import argparse
+import contextlib
+import heapq
+import io
+import os
+import random
+import socket
+import struct
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ICMPSweepManager import ICMPSweepManager, ICMP_ECHO_REPLY  # noqa: E402
+from IPAndPingManager import IPAndPingManager  # noqa: E402
+
+
+class FakeICMPSocket:
+    """
+    Socket stand-in that answers ICMP echo requests after a simulated latency.
+    Attributes:
+        type (int): Reported socket type, so replies are matched as on a raw socket.
+        latency (tuple[float, float]): Range of the simulated round-trip time in seconds.
+        loss (float): Probability that a request is never answered.
+        unreachable (set[str]): Addresses that never answer.
+    """
+    type = socket.SOCK_RAW
+
+    def __init__(self, latency: tuple[float, float] = (0.001, 0.02), loss: float = 0.0,
+                 unreachable: set[str] = frozenset()):
+        self.latency = latency
+        self.loss = loss
+        self.unreachable = unreachable
+        self.replies: list[tuple[float, int, bytes, str]] = []
+        self.blocking_timeout: float | None = None
+        self.sent = 0
+
+    def setblocking(self, flag: bool) -> None:
+        self.blocking_timeout = None if flag else 0.0
+
+    def settimeout(self, value: float | None) -> None:
+        self.blocking_timeout = value
+
+    def sendto(self, packet: bytes, address: tuple[str, int]) -> int:
+        self.sent += 1
+        if address[0] in self.unreachable or random.random() < self.loss:
+            return len(packet)
+        identifier, sequence = struct.unpack("!HH", packet[4:8])
+        reply = struct.pack("!BBHHH", ICMP_ECHO_REPLY, 0, 0, identifier, sequence) + packet[8:]
+        due = time.perf_counter() + random.uniform(*self.latency)
+        heapq.heappush(self.replies, (due, self.sent, reply, address[0]))
+        return len(packet)
+
+    def recvfrom(self, size: int) -> tuple[bytes, tuple[str, int]]:
+        now = time.perf_counter()
+        if not self.replies or self.replies[0][0] > now:
+            wait_until = self.replies[0][0] if self.replies else float("inf")
+            if self.blocking_timeout is not None:
+                wait_until = min(wait_until, now + self.blocking_timeout)
+            if self.blocking_timeout == 0.0 or wait_until == float("inf"):
+                raise BlockingIOError
+            time.sleep(max(0.0, wait_until - now))
+            if not self.replies or self.replies[0][0] > time.perf_counter():
+                raise socket.timeout
+        _, _, reply, address = heapq.heappop(self.replies)
+        return reply, (address, 0)
+
+    def close(self) -> None:
+        self.replies.clear()
+
+
+def benchmark(name: str, function: callable) -> None:
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        answered, total = function()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<30} {elapsed:>8.3f} s {total / elapsed:>12.0f} probes/s {answered:>8}/{total} answered")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["fake", "loopback"], default="fake")
+    parser.add_argument("--devices", type=int, default=2000)
+    parser.add_argument("--unreachable", type=float, default=0.05, help="Fraction of devices that never answer")
+    parser.add_argument("--timeout", type=float, default=1.0)
+    parser.add_argument("--concurrency", type=int, default=256)
+    arguments = parser.parse_args()
+
+    ips = [f"127.{i // 62500 % 250}.{i // 250 % 250}.{i % 250 + 1}" for i in range(arguments.devices)]
+    unreachable = set(random.sample(ips, int(len(ips) * arguments.unreachable)))
+    devices_data = {f"device-{i}": {"ip": ip} for i, ip in enumerate(ips)}
+    print(f"{arguments.devices} devices, {len(unreachable)} unreachable, timeout {arguments.timeout} s")
+
+    if arguments.mode == "fake":
+        def per_device():
+            def ping(ip: str) -> bool:
+                manager = ICMPSweepManager(arguments.timeout, socket_factory=lambda family: FakeICMPSocket(
+                    unreachable=unreachable))
+                return manager.sweep([ip])[ip]["rtt"] is not None
+            with ThreadPoolExecutor(arguments.concurrency) as executor:
+                return sum(executor.map(ping, ips)), len(ips)
+
+        def sweep():
+            manager = ICMPSweepManager(arguments.timeout, socket_factory=lambda family: FakeICMPSocket(
+                unreachable=unreachable))
+            results = manager.sweep(ips)
+            return sum(result["rtt"] is not None for result in results.values()), len(ips)
+    else:
+        # Loopback addresses always answer, so unreachable devices are moved to a blackholed range.
+        for index, device_id in enumerate(devices_data):
+            if devices_data[device_id]["ip"] in unreachable:
+                devices_data[device_id] = {"ip": f"10.255.{index // 250 % 250}.{index % 250 + 1}"}
+
+        def run(engine: str) -> callable:
+            def ping_devices():
+                rows = IPAndPingManager(arguments.concurrency, arguments.timeout, engine).ping_devices(devices_data)
+                return sum(row[1] for row in rows), len(rows)
+            return ping_devices
+        per_device, sweep = run("pool"), run("sweep")
+
+    benchmark("per-device (thread pool)", per_device)
+    benchmark("shared-socket sweep", sweep)
+
+
+if __name__ == "__main__":
+    main()
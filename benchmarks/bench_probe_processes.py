@@ -0,0 +1,63 @@
+"""
+Benchmark how the probe throughput of IPAndPingManager scales with the number of prober processes.
+
+    python benchmarks/bench_probe_processes.py --devices 50000
+    python benchmarks/bench_probe_processes.py --devices 50000 --processes 1,2,4,8 --latency 0.002
+
+Every probe goes to a SimulatedNetwork: it builds an ICMP echo request and parses the matching reply like the sweep
+engine does, then waits for a random round-trip time. Waiting costs no CPU, so with enough concurrency the
+throughput of one process is bound by the Python work of every probe and row, and should grow with the number of
+processes up to the number of cores. The results are written to a throwaway CSV store by the main process, as the
+monitor does.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from AvailabilityStore import CSVAvailabilityStore  # noqa: E402
+from IPAndPingManager import IPAndPingManager  # noqa: E402
+from simulation import SimulatedNetwork, generate_registry  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=50_000)
+    parser.add_argument("--processes", default=",".join(str(2 ** power) for power in range(8)
+                                                         if 2 ** power <= (os.cpu_count() or 1)),
+                        help="Comma-separated numbers of processes to compare (default: powers of 2 up to the "
+                             "number of cores)")
+    parser.add_argument("--concurrency", type=int, default=256, help="Threads of every process")
+    parser.add_argument("--count", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.001, help="Median simulated round-trip time")
+    arguments = parser.parse_args()
+
+    devices_data = generate_registry(arguments.devices)
+    print(f"{arguments.devices} devices, {arguments.count} probes each, {os.cpu_count()} cores")
+    baseline: float | None = None
+    with tempfile.TemporaryDirectory() as directory:
+        store = CSVAvailabilityStore(os.path.join(directory, "availability.csv"))
+        for processes in [int(value) for value in arguments.processes.split(",")]:
+            ip_and_ping_manager = IPAndPingManager(arguments.concurrency, 1, verbose=False, count=arguments.count,
+                                                   processes=processes)
+            ip_and_ping_manager.prober = SimulatedNetwork(arguments.latency, "uniform")
+            try:
+                # Start the prober processes before timing.
+                ip_and_ping_manager.ping_devices(dict(list(devices_data.items())[:processes]))
+                started = time.perf_counter()
+                rows = ip_and_ping_manager.ping_devices(devices_data)
+                store.save_rows(rows)
+                elapsed = time.perf_counter() - started
+            finally:
+                ip_and_ping_manager.close()
+            throughput = arguments.devices * arguments.count / elapsed
+            baseline = baseline or throughput
+            print(f"{processes:>3} processes: {elapsed:>7.2f} s  {throughput:>9.0f} probes/s  "
+                  f"{throughput / baseline:>5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
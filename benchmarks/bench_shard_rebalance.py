@@ -0,0 +1,74 @@
+"""
+Measure how evenly the ShardManager splits the devices between workers and how many devices move when a worker is
+added or removed.
+
+    python benchmarks/bench_shard_rebalance.py --devices 100000 --workers 4
+    python benchmarks/bench_shard_rebalance.py --devices 100000 --workers 8 --virtual-nodes 40
+
+With consistent hashing, adding a worker to N workers should move about 1/(N+1) of the devices, all of them to the
+new worker, and removing one should move only the devices of the removed worker.
+"""
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import constants  # noqa: E402
+from ShardManager import ShardManager  # noqa: E402
+
+
+def assign(shard_manager: ShardManager, device_ids: list[str]) -> dict[str, str]:
+    return {device_id: shard_manager.get_worker(device_id) for device_id in device_ids}
+
+
+def describe(label: str, assignment: dict[str, str], workers: list[str]) -> None:
+    counts = Counter(assignment.values())
+    mean = len(assignment) / len(workers)
+    print(f"{label}: {len(workers)} workers, smallest slice {min(counts[worker] for worker in workers) / mean:.2f} "
+          f"and largest {max(counts[worker] for worker in workers) / mean:.2f} times the mean")
+
+
+def moved(before: dict[str, str], after: dict[str, str]) -> tuple[int, Counter]:
+    moves = Counter((before[device_id], after[device_id]) for device_id in before
+                    if before[device_id] != after[device_id])
+    return sum(moves.values()), moves
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--virtual-nodes", type=int, default=constants.shard_virtual_nodes)
+    arguments = parser.parse_args()
+
+    device_ids = [f"device-{device}" for device in range(arguments.devices)]
+    workers = [f"worker-{worker}" for worker in range(1, arguments.workers + 1)]
+    started = time.perf_counter()
+    before = assign(ShardManager(workers, arguments.virtual_nodes), device_ids)
+    elapsed = time.perf_counter() - started
+    print(f"Assigned {arguments.devices} devices in {elapsed:.2f} s ({elapsed / arguments.devices * 1e6:.1f} us per "
+          "device)")
+    describe("Before", before, workers)
+
+    added_workers = workers + [f"worker-{arguments.workers + 1}"]
+    after = assign(ShardManager(added_workers, arguments.virtual_nodes), device_ids)
+    describe("Added a worker", after, added_workers)
+    count, moves = moved(before, after)
+    print(f"  {count} devices moved ({count / arguments.devices:.2%}, ideal {1 / len(added_workers):.2%}), "
+          f"{sum(number for (_, target), number in moves.items() if target == added_workers[-1])} of them to the "
+          "new worker")
+
+    removed_workers = workers[1:]
+    after = assign(ShardManager(removed_workers, arguments.virtual_nodes), device_ids)
+    describe("Removed a worker", after, removed_workers)
+    count, moves = moved(before, after)
+    print(f"  {count} devices moved ({count / arguments.devices:.2%}, ideal {1 / len(workers):.2%}), "
+          f"{sum(number for (source, _), number in moves.items() if source == workers[0])} of them from the "
+          "removed worker")
+
+
+if __name__ == "__main__":
+    main()
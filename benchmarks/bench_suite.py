@@ -0,0 +1,222 @@
+"""
+Benchmark the ping loop, the storage writes and the availability data queries at scale, against a simulated network,
+and the startup of the command-line interface, and compare the results with a stored baseline.
+
+    python benchmarks/bench_suite.py
+    python benchmarks/bench_suite.py --devices 1000,100000,1000000 --rows 100000000 --storage sqlite
+    python benchmarks/bench_suite.py --latency 0.02 --loss 0.01 --unreachable 0.05 --timeout 0.5
+    python benchmarks/bench_suite.py --save-baseline
+
+Every scenario runs in a fresh process, in a throwaway working directory, so its peak RSS is its own:
+    cycle: ping_all_devices over a generated registry of each --devices size, with SimulatedNetwork as the prober,
+        for --cycles cycles. Reports the wall time of a cycle, the time spent probing and the probes per second, and
+        the time spent saving the results.
+    storage: save_device_availability_data_file of --rows generated rows spread over three days, one cycle of the
+        largest --devices size at a time, then print_device_availability_data_by_parameter by 'id', 'status' and
+        'date' (the second day) with the output discarded. Reports the rows written per second and the latency of
+        every query.
+    startup: the short commands of bench_cli_startup.py, run as separate processes. Reports the median wall time
+        of every command and the time it spends importing modules.
+The results are compared with benchmarks/baseline.json, and the run fails when a metric is worse than the baseline by
+more than --tolerance. Baselines are only comparable on the same machine: --save-baseline records the results of
+this run, with the number of cores and the Python version they were measured with.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from multiprocessing import get_context
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import constants  # noqa: E402
+from bench_cli_startup import COMMANDS, measure_startup, prepare_directory  # noqa: E402
+from DeviceAvailabilityDataManager import DeviceAvailabilityDataManager  # noqa: E402
+from DeviceDataManager import DeviceDataManager  # noqa: E402
+from IPAndPingManager import IPAndPingManager  # noqa: E402
+from simulation import (LATENCY_DISTRIBUTIONS, SimulatedNetwork, generate_availability_rows,  # noqa: E402
+                        generate_registry)
+
+BASELINE_FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# Metrics where a higher value is better; for every other metric, lower is better.
+HIGHER_IS_BETTER = ("probes_per_second", "write_rows_per_second")
+# The number of days the rows of the storage scenario are spread over.
+STORAGE_DAYS = 3
+
+
+def run_cycle_scenario(arguments: argparse.Namespace, devices: int) -> dict:
+    DeviceDataManager().save_device_data_file(generate_registry(devices))
+    ip_and_ping_manager = IPAndPingManager(arguments.concurrency, arguments.timeout, "pool", arguments.storage,
+                                           verbose=False, count=arguments.count, processes=arguments.processes)
+    ip_and_ping_manager.device_availability_data_manager.rollups_enabled = arguments.rollups
+    ip_and_ping_manager.prober = SimulatedNetwork(arguments.latency, arguments.distribution, arguments.spread,
+                                                  arguments.loss, arguments.unreachable, arguments.seed)
+    metrics: dict = ip_and_ping_manager.metrics_manager.metrics
+    # The time, and the total time spent probing and saving, at the end of every cycle.
+    cycles: list[tuple[float, float, float]] = []
+
+    def stop_after_cycles(devices_status_data: list[list], saved_rows: list[list]) -> None:
+        cycles.append((time.perf_counter(), metrics["monitor_ping_cycle_duration_seconds"]["series"][()][1],
+                       metrics["monitor_storage_write_seconds"]["series"][()][1]))
+        if len(cycles) > arguments.cycles:
+            ip_and_ping_manager.stop_event.set()
+
+    ip_and_ping_manager.results_callback = stop_after_cycles
+    # The first cycle loads the registry and starts the prober processes, and is not counted.
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            ip_and_ping_manager.ping_all_devices(0)
+    finally:
+        ip_and_ping_manager.close()
+    (first_end, first_probe, first_write), (last_end, last_probe, last_write) = cycles[0], cycles[-1]
+    return {"cycle_seconds": (last_end - first_end) / arguments.cycles,
+            "probe_seconds": (last_probe - first_probe) / arguments.cycles,
+            "probes_per_second": devices * arguments.count * arguments.cycles / (last_probe - first_probe),
+            "write_seconds": (last_write - first_write) / arguments.cycles}
+
+
+def run_storage_scenario(arguments: argparse.Namespace, devices: int) -> dict:
+    device_availability_data_manager = DeviceAvailabilityDataManager(arguments.storage,
+                                                                     rollups_enabled=arguments.rollups)
+    # Spread the cycles over STORAGE_DAYS days, from a midnight early enough for them to end before now, so the
+    # retention keeps them and the 'date' query selects a part of the rows only.
+    interval = max(1, STORAGE_DAYS * 86400 // -(-arguments.rows // devices))
+    start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=STORAGE_DAYS)
+    started = time.perf_counter()
+    for batch in generate_availability_rows(devices, arguments.rows, interval, count=arguments.count,
+                                            seed=arguments.seed, start=start):
+        device_availability_data_manager.save_device_availability_data_file(batch)
+    write_time = time.perf_counter() - started
+    results = {"write_seconds": write_time, "write_rows_per_second": arguments.rows / write_time}
+    # Query the second of the days, which holds about a third of the rows.
+    day = (start + timedelta(days=1)).strftime("%Y-%m-%d")
+    for parameter, value in (("id", f"device-{devices // 2}"), ("status", "0"), ("date", day)):
+        started = time.perf_counter()
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            device_availability_data_manager.print_device_availability_data_by_parameter(parameter, value)
+        results[f"query_{parameter}_seconds"] = time.perf_counter() - started
+    return results
+
+
+def run_startup_scenario(arguments: argparse.Namespace, devices: int) -> dict:
+    prepare_directory()
+    results = {}
+    for name, command in COMMANDS.items():
+        results[f"startup_{name}_seconds"], modules = measure_startup(command, arguments.startup_runs)
+        results[f"imports_{name}_seconds"] = modules[""][1] / 1e6
+    # The commands run in child processes; report the largest of them.
+    results["peak_rss_mib"] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return results
+
+
+SCENARIOS = {"cycle": run_cycle_scenario, "storage": run_storage_scenario, "startup": run_startup_scenario}
+
+
+def run_scenario(name: str, arguments: argparse.Namespace, devices: int) -> dict:
+    """
+    Run a scenario in a throwaway working directory. Called in a fresh process, so the peak RSS is the scenario's.
+    Returns:
+        dict: The metrics of the scenario, including its peak RSS in MiB.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        results = SCENARIOS[name](arguments, devices)
+    # ru_maxrss is in KiB on Linux.
+    results.setdefault("peak_rss_mib", resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+    return results
+
+
+def compare(key: str, results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Print the metrics of a scenario next to its baseline.
+    Returns:
+        list[str]: The metrics worse than the baseline by more than 'tolerance'.
+    """
+    regressions = []
+    for metric, value in results.items():
+        reference: float | None = baseline.get(metric)
+        line = f"  {metric:<34} {value:>14.4f}"
+        if reference:
+            change = value / reference - 1
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            line += f"  baseline {reference:>14.4f}  {change:>+8.1%}"
+            if worse > tolerance:
+                line += "  REGRESSION"
+                regressions.append(f"{key} {metric}")
+        print(line)
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated scenarios to run")
+    parser.add_argument("--devices", default="1000,10000", help="Comma-separated registry sizes (1k to 1M)")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Rows written by the storage scenario")
+    parser.add_argument("--storage", choices=["csv", "sqlite", "partitioned", "archive"],
+                        default=constants.availability_storage_backend)
+    parser.add_argument("--rollups", action=argparse.BooleanOptionalAction,
+                        default=constants.availability_rollups_enabled, help="Update the rollups when saving")
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=constants.ping_concurrency)
+    parser.add_argument("--processes", type=int, default=constants.ping_processes)
+    parser.add_argument("--count", type=int, default=constants.ping_count)
+    parser.add_argument("--timeout", type=float, default=0.2, help="Simulated ping timeout in seconds")
+    parser.add_argument("--latency", type=float, default=0.001, help="Median simulated round-trip time in seconds")
+    parser.add_argument("--distribution", choices=LATENCY_DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--spread", type=float, default=0.5, help="Spread of the lognormal round-trip times")
+    parser.add_argument("--loss", type=float, default=0.0, help="Probability that a ping is lost")
+    parser.add_argument("--unreachable", type=float, default=0.01, help="Fraction of devices that never answer")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--startup-runs", type=int, default=11, help="Runs of every command of the startup scenario")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown against the baseline")
+    parser.add_argument("--baseline", default=BASELINE_FILENAME)
+    parser.add_argument("--save-baseline", action="store_true", help="Record the results of this run as the baseline")
+    arguments = parser.parse_args()
+
+    environment = {"cpus": os.cpu_count(), "python": platform.python_version()}
+    stored: dict = {"environment": environment, "results": {}}
+    if os.path.isfile(arguments.baseline):
+        with open(arguments.baseline) as file:
+            stored = json.load(file)
+        if stored.get("environment") != environment:
+            print(f"The baseline was measured with {stored.get('environment')}, this run with {environment}: the "
+                  "comparison is only indicative.")
+    device_counts = [int(value) for value in arguments.devices.split(",")]
+    runs = ([("cycle", devices) for devices in device_counts] + [("storage", max(device_counts))]
+            + [("startup", None)])
+    regressions: list[str] = []
+    for name, devices in runs:
+        if name not in arguments.scenarios.split(","):
+            continue
+        match name:
+            case "cycle":
+                key = f"cycle {arguments.storage} devices={devices}"
+            case "storage":
+                key = f"storage {arguments.storage} devices={devices} rows={arguments.rows}"
+            case _:
+                key = "startup"
+        print(key)
+        with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as executor:
+            results = executor.submit(run_scenario, name, arguments, devices).result()
+        regressions += compare(key, results, stored["results"].get(key, {}), arguments.tolerance)
+        stored["results"][key] = results
+    if arguments.save_baseline:
+        stored["environment"] = environment
+        with open(arguments.baseline, "w") as file:
+            json.dump(stored, file, indent=4, sort_keys=True)
+        print(f"Saved the baseline to {arguments.baseline}")
+    elif regressions:
+        print(f"{len(regressions)} regressions: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Simulated network and synthetic data shared by the benchmarks.
+
+SimulatedNetwork replaces IPAndPingManager.prober, so the ping loops can be measured at any scale without a network
+or privileges. generate_registry and generate_availability_rows produce device data and availability data shaped
+like the ones of a real fleet, from a seed, so two runs measure the same work.
+"""
+import math
+import os
+import random
+import struct
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Iterator
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ICMPSweepManager import ICMP_ECHO_REPLY, ICMPSweepManager  # noqa: E402
+
+LATENCY_DISTRIBUTIONS = ("constant", "uniform", "exponential", "lognormal")
+
+
+class SimulatedNetwork:
+    """
+    Prober of a simulated network, to be set as the 'prober' of an IPAndPingManager.
+    Every probe builds an ICMP echo request and parses the matching reply like the sweep engine does, then waits for
+    a round-trip time drawn from the latency distribution. A probe is not answered, and waits the whole timeout like
+    a real ping, when its device is unreachable, when the request is lost, or when its round-trip time is longer than
+    the timeout, so the timeouts of a cycle follow from the loss and the tail of the latency distribution.
+    It is sent to the prober processes of IPAndPingManager, so it is a picklable object rather than a closure.
+    Attributes:
+        latency (float): The median round-trip time in seconds.
+        distribution (str): The distribution of the round-trip times, one of LATENCY_DISTRIBUTIONS. "uniform" draws
+            between 0 and twice the median, and "lognormal" has a long tail set by 'spread'.
+        spread (float): The standard deviation of the logarithm of the round-trip time, for "lognormal".
+        loss (float): The probability that a request is never answered.
+        unreachable (float): The fraction of the devices that never answer, chosen from a hash of their IP.
+    """
+
+    def __init__(self, latency: float = 0.001, distribution: str = "lognormal", spread: float = 0.5,
+                 loss: float = 0.0, unreachable: float = 0.0, seed: int | None = None):
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution {distribution!r}, use one of {LATENCY_DISTRIBUTIONS}")
+        self.latency: float = latency
+        self.distribution: str = distribution
+        self.spread: float = spread
+        self.loss: float = loss
+        self.unreachable: float = unreachable
+        self.random: random.Random = random.Random(seed)
+        self.probes: int = 0
+
+    def __repr__(self):
+        return (f"SimulatedNetwork({self.latency}, {self.distribution!r}, {self.spread}, {self.loss}, "
+                f"{self.unreachable})")
+
+    def is_unreachable(self, ip: str) -> bool:
+        return zlib.crc32(ip.encode()) / 2 ** 32 < self.unreachable
+
+    def sample_latency(self) -> float:
+        match self.distribution:
+            case "constant":
+                return self.latency
+            case "uniform":
+                return self.random.uniform(0, 2 * self.latency)
+            case "exponential":
+                return self.random.expovariate(math.log(2) / self.latency) if self.latency > 0 else 0.0
+            case _:
+                return self.random.lognormvariate(math.log(self.latency), self.spread) if self.latency > 0 else 0.0
+
+    def __call__(self, ip: str, timeout: float, verbose: bool = True) -> float | None:
+        self.probes += 1
+        sequence = self.probes & 0xFFFF
+        request = ICMPSweepManager.build_echo_request(os.getpid() & 0xFFFF, sequence)
+        reply = struct.pack("!BB", ICMP_ECHO_REPLY, 0) + request[2:]
+        rtt = self.sample_latency()
+        if (ICMPSweepManager.parse_echo_reply(reply) is None or self.is_unreachable(ip)
+                or self.random.random() < self.loss or rtt > timeout):
+            time.sleep(timeout)
+            return None
+        time.sleep(rtt)
+        return rtt
+
+
+def generate_registry(devices: int) -> dict[str, dict]:
+    """
+    Generate the device data of a fleet, with one address of 10.0.0.0/8 per device.
+    Args:
+        devices (int): The number of devices, at most 2 ** 24.
+    Returns:
+        dict[str, dict]: Device data with device IDs as keys, as returned by the DeviceDataManager.
+    """
+    return {f"device-{device}": {"name": f"Device {device}",
+                                 "ip": f"10.{device >> 16 & 255}.{device >> 8 & 255}.{device & 255}"}
+            for device in range(devices)}
+
+
+def generate_availability_rows(devices: int, rows: int, interval: int = 300, batch_size: int | None = None,
+                               failure: float = 0.02, count: int = 3, seed: int = 0,
+                               start: datetime = datetime(2024, 1, 1)) -> Iterator[list[list]]:
+    """
+    Generate availability data the way the monitor saves it: one row per device every 'interval' seconds from
+    'start', in time order, with the measurements of a burst of 'count' pings. Every device has its own probability
+    of failing a burst, drawn around 'failure'. The rows are yielded in batches, so any number of them can be
+    written without holding them in memory.
+    Args:
+        devices (int): The number of devices, named like generate_registry names them.
+        rows (int): The number of rows to generate.
+        interval (int): Seconds between two cycles.
+        batch_size (int, optional): The number of rows of every batch, one cycle by default.
+        failure (float): The mean probability that a device does not answer a burst.
+        count (int): The number of pings of a burst, which sets the possible packet losses.
+        seed (int): The seed of the random numbers.
+        start (datetime): The time of the first cycle.
+    Yields:
+        list[list]: Batches of [device_id, status, timestamp, rtt_avg, rtt_min, rtt_max, jitter, loss] rows.
+    """
+    rng = random.Random(seed)
+    device_ids = [f"device-{device}" for device in range(devices)]
+    failure_probability = [min(1.0, rng.expovariate(1 / failure)) if failure > 0 else 0.0 for _ in device_ids]
+    base_rtt = [rng.lognormvariate(math.log(0.002), 1) for _ in device_ids]
+    batch_size = batch_size or devices
+    batch: list[list] = []
+    for row in range(rows):
+        device = row % devices
+        if device == 0:
+            timestamp = start + timedelta(seconds=row // devices * interval)
+        if rng.random() < failure_probability[device]:
+            batch.append([device_ids[device], 0, timestamp, None, None, None, None, 100.0])
+        else:
+            rtt = base_rtt[device] * (1 + rng.random())
+            lost = rng.randrange(count) if rng.random() < 0.05 else 0
+            batch.append([device_ids[device], 1, timestamp, rtt, rtt * 0.8, rtt * 1.3, rtt * 0.1,
+                          round(100 * lost / count, 6)])
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
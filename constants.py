@@ -1,5 +1,12 @@
 device_data_filename: str = "device_data.json"
+device_data_journal_filename: str = "device_data.journal"
 device_data_availability_filename: str = "device_availability_data.csv"
+device_availability_database_filename: str = "device_availability_data.db"
+device_availability_partitions_directory: str = "device_availability_data"
+device_availability_rollups_filename: str = "device_availability_rollups.db"
+device_availability_archive_filename: str = "device_availability_data.archive"
+device_status_snapshot_filename: str = "device_status.snapshot"
+shards_directory: str = "shards"
 device_not_found_message: str = "DEVICE WITH THIS ID NOT FOUND"
 nothing_to_update_message: str = "DEVICE NAME AND IP IS NOT PROVIDED SO THERE IS NOTHING TO UPDATE"
 device_id_not_provided: str = "DEVICE ID NOT PROVIDED"
@@ -9,5 +16,82 @@ device_name_ip_not_provided: str = "DEVICE NAME OR IP IS NOT PROVIDED"
 device_added_successfully: str = "DEVICE ADDED SUCCESSFULLY"
 device_deleted_successfully: str = "DEVICE DELETED SUCCESSFULLY"
 device_updated_successfully: str = "DEVICE UPDATED SUCCESSFULLY"
+devices_imported_successfully: str = "DEVICES IMPORTED SUCCESSFULLY"
+devices_exported_successfully: str = "DEVICES EXPORTED SUCCESSFULLY TO"
+unsupported_device_file_format: str = "UNSUPPORTED FILE FORMAT, PLEASE USE A .csv, .json OR .jsonl FILE"
+invalid_device_file: str = "THE DEVICE FILE COULD NOT BE READ"
 no_device_availability_data_found: str = "NO DEVICE AVAILABILITY DATA FOUND"
+device_availability_data_imported_successfully: str = "DEVICE AVAILABILITY DATA ROWS IMPORTED SUCCESSFULLY"
+device_availability_data_archived_successfully: str = "DEVICE AVAILABILITY DATA ROWS ARCHIVED SUCCESSFULLY"
+archive_block_corrupt: str = "A BLOCK OF THE AVAILABILITY ARCHIVE IS CORRUPT AND WAS SKIPPED, AT OFFSET"
 invalid_ip: str = "PROVIDED IP IS NOT VALID"
+icmp_socket_unavailable: str = "UNABLE TO OPEN AN ICMP SOCKET"
+icmp_not_permitted: str = "NOT PERMITTED TO SEND ICMP PINGS, RUN AS A PRIVILEGED USER OR USE A tcp:<port> OR udp PROBE"
+icmp_ping_failed: str = "UNABLE TO PING"
+invalid_probe: str = "PROVIDED PROBE IS NOT VALID, PLEASE USE icmp, tcp:<port>, udp OR udp:<port>"
+device_data_file_corrupt: str = "DEVICE DATA FILE IS CORRUPT, IT HAS BEEN MOVED TO"
+invalid_network: str = "PROVIDED NETWORK IS NOT VALID, PLEASE USE CIDR NOTATION SUCH AS 10.0.0.0/22"
+network_too_large: str = "PROVIDED NETWORK IS TOO LARGE, THE MAXIMUM NUMBER OF ADDRESSES IS"
+retention_not_supported: str = "THE SELECTED STORAGE BACKEND DOES NOT SUPPORT A RETENTION POLICY"
+rollups_rebuilt_successfully: str = "DEVICE AVAILABILITY DATA ROWS ADDED TO THE ROLLUPS SUCCESSFULLY"
+numpy_not_installed: str = "NUMPY IS NOT INSTALLED, PLEASE INSTALL IT WITH pip install numpy"
+availability_write_failed: str = "UNABLE TO SAVE THE DEVICE AVAILABILITY DATA, RETRYING"
+availability_write_dropped: str = "UNABLE TO SAVE THE DEVICE AVAILABILITY DATA, ROWS DROPPED"
+availability_flush_failed: str = "UNABLE TO SAVE THE QUEUED DEVICE AVAILABILITY DATA, IT IS LEFT OUT"
+shard_workers_not_provided: str = "THE SHARD WORKERS ARE NOT PROVIDED, PLEASE LIST THEM WITH --shard-workers"
+shard_not_in_workers: str = "THE SHARD IS NOT ONE OF THE SHARD WORKERS"
+invalid_shard_name: str = "INVALID SHARD NAME, PLEASE USE LETTERS, DIGITS, - AND _ ONLY"
+merged_store_read_only: str = "THE MERGED AVAILABILITY DATA OF ALL THE SHARDS IS READ ONLY"
+status_snapshot_not_found: str = "NO DEVICE STATUS FOUND, START MONITORING WITH --ping-devices OR --daemon TO RECORD IT"
+status_snapshot_id_too_long: str = "DEVICE ID TOO LONG FOR THE STATUS SNAPSHOT, ITS STATUS IS NOT KEPT"
+device_not_pinged_yet: str = "THIS DEVICE HAS NOT BEEN PINGED YET"
+ping_interval: int = 300
+ping_timeout: float = 4
+ping_concurrency: int = 256
+ping_count: int = 3
+ping_processes: int = 1
+probe_pool_chunks_per_process: int = 4
+ping_engine: str = "pool"
+reachability_probe_concurrency: int = 4096
+reachability_probe_reserved_files: int = 64
+udp_probe_port: int = 33434
+availability_storage_backend: str = "csv"
+availability_recording_mode: str = "all"
+availability_heartbeat_interval: int = 3600
+availability_rollups_enabled: bool = True
+rollup_max_sample_interval: int = 3600
+status_snapshot_enabled: bool = True
+status_snapshot_initial_slots: int = 1024
+status_snapshot_max_load: float = 0.5
+status_snapshot_device_id_size: int = 64
+status_snapshot_read_retries: int = 100000
+archive_block_rows: int = 65536
+archive_compression_level: int = 6
+availability_compress_after_days: int = 7
+availability_delete_after_days: int = 365
+availability_writer_durability: str = "flush"
+availability_writer_queue_size: int = 100000
+availability_writer_batch_size: int = 5000
+availability_writer_flush_interval: float = 1
+availability_writer_flush_retries: int = 3
+device_data_journal_compaction_threshold: int = 1000
+discovery_max_hosts: int = 65536
+discovery_rate: float = 2000
+discovered_device_id_prefix: str = "host"
+scheduler_min_interval: float = 30
+scheduler_fast_factor: float = 0.25
+scheduler_backoff_after: int = 6
+scheduler_max_backoff: float = 4
+scheduler_jitter: float = 0.1
+scheduler_max_sleep: float = 5
+analytics_uptime_percentiles: list[float] = [1, 5, 10, 25, 50]
+analytics_outage_histogram_bins: list[float] = [0, 60, 300, 900, 3600, 14400, 86400]
+analytics_correlated_outage_fraction: float = 0.05
+daemon_host: str = "127.0.0.1"
+daemon_port: int = 8600
+daemon_history_size: int = 288
+metrics_port: int = 9600
+metrics_rtt_buckets: list[float] = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5]
+metrics_cycle_duration_buckets: list[float] = [0.5, 1, 2.5, 5, 10, 30, 60, 120, 300]
+metrics_storage_write_buckets: list[float] = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1]
+shard_virtual_nodes: int = 160
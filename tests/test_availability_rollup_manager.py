@@ -0,0 +1,75 @@
+"""
+Tests of the hourly and daily uptime rollups.
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import constants  # noqa: E402
+from AvailabilityRollupManager import AvailabilityRollupManager  # noqa: E402
+
+
+class AvailabilityRollupManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.manager = AvailabilityRollupManager(os.path.join(self.directory.name, "rollups.db"))
+        self.day = datetime(2024, 1, 1)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def day_rollup(self) -> list:
+        rollups = self.manager.get_rollups("router", "day", self.day, self.day + timedelta(days=1))
+        self.assertEqual(len(rollups), 1)
+        return rollups[0]
+
+    def test_uptime_is_weighted_by_the_time_until_the_next_sample(self):
+        # Up for 9 hours probed every 5 minutes, then down for 1 hour probed 4 times as often.
+        rows = [["router", 1, self.day + timedelta(seconds=second), 0.001] for second in range(0, 9 * 3600, 300)]
+        rows += [["router", 0, self.day + timedelta(seconds=second), None] for second in range(9 * 3600, 10 * 3600, 75)]
+        rows.append(["router", 1, self.day + timedelta(hours=10), 0.001])
+        self.manager.update_rollups(rows)
+        samples, up_samples, observed_seconds, up_seconds = (self.day_rollup()[index] for index in (2, 3, 7, 8))
+        self.assertEqual((samples, up_samples), (157, 109))
+        self.assertEqual((observed_seconds, up_seconds), (10 * 3600, 9 * 3600))
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.manager.print_uptime_report("router", "2024-01-01")
+        self.assertIn("90.00%", output.getvalue().splitlines()[-1])
+
+    def test_time_is_split_between_hours_and_capped_when_the_monitor_stopped(self):
+        self.manager.update_rollups([["router", 0, self.day + timedelta(minutes=50)]])
+        self.manager.update_rollups([["router", 1, self.day + timedelta(minutes=70)]])
+        # The monitor stopped for 5 hours: only the first 'rollup_max_sample_interval' seconds are observed.
+        self.manager.update_rollups([["router", 1, self.day + timedelta(minutes=70, hours=5)]])
+        hours = {rollup[1]: rollup[7:] for rollup in
+                 self.manager.get_rollups("router", "hour", self.day, self.day + timedelta(days=1))}
+        self.assertEqual(len(hours), 4)
+        self.assertEqual(sum(observed for observed, _ in hours.values()),
+                         1200 + constants.rollup_max_sample_interval)
+        self.assertEqual(self.day_rollup()[7:], [1200 + constants.rollup_max_sample_interval,
+                                                 constants.rollup_max_sample_interval])
+
+    def test_samples_added_in_several_updates_or_rebuilt_give_the_same_rollups(self):
+        rows = [["router", second % 7 != 0, self.day + timedelta(seconds=second), 0.25]
+                for second in range(0, 4 * 3600, 120)]
+        for start in range(0, len(rows), 25):
+            self.manager.update_rollups(rows[start:start + 25])
+        updated = self.manager.get_rollups("router", "hour", self.day, self.day + timedelta(days=1))
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.manager.rebuild_rollups(rows, batch_size=1000)
+        rebuilt = self.manager.get_rollups("router", "hour", self.day, self.day + timedelta(days=1))
+        self.assertEqual(updated, rebuilt)
+        self.assertEqual(sum(rollup[2] for rollup in rebuilt), len(rows))
+        self.assertEqual(sum(rollup[3] for rollup in rebuilt), sum(row[1] for row in rows))
+
+
+if __name__ == "__main__":
+    unittest.main()
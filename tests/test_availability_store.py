@@ -0,0 +1,237 @@
+"""
+Tests of the availability stores: the rows they give back, their archive format and their retention policy.
+"""
+import os
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+from io import StringIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import constants  # noqa: E402
+from AvailabilityStore import (ArchiveAvailabilityStore, AvailabilityStore,  # noqa: E402
+                               CSVAvailabilityStore, PartitionedCSVAvailabilityStore, SQLiteAvailabilityStore,
+                               decode_measurement, encode_timestamp)
+
+LEGACY_CSV = "Device Id,Status,Timestamp\nmobile,1,2023-07-28 16:18:09.901870\n"
+
+
+def make_rows(count: int, start: datetime) -> list[list]:
+    """
+    Build 'count' rows of three devices, one second apart, with every third row down and without measurements.
+    """
+    rows: list[list] = []
+    for number in range(count):
+        timestamp = start + timedelta(seconds=number, microseconds=number)
+        if number % 3 == 2:
+            rows.append([f"device-{number % 3}", 0, timestamp, None, None, None, None, 100.0])
+        else:
+            rows.append([f"device-{number % 3}", 1, timestamp, (1000 + number) / 1_000_000, (500 + number) / 1_000_000,
+                         (2000 + number) / 1_000_000, 0.000125, 0.0])
+    return rows
+
+
+def normalize(row: list) -> list:
+    """
+    Convert a row, as saved or as read from any store, into [device_id, status, epoch microseconds, measurements].
+    """
+    return [str(row[0]), int(row[1]), encode_timestamp(row[2])] + [decode_measurement(value) for value in row[3:8]]
+
+
+class AvailabilityStoreRoundTripTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.rows = make_rows(30, datetime(2024, 1, 1, 23, 59, 50))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def stores(self) -> list[AvailabilityStore]:
+        return [CSVAvailabilityStore(os.path.join(self.directory.name, "availability.csv")),
+                SQLiteAvailabilityStore(os.path.join(self.directory.name, "availability.db")),
+                PartitionedCSVAvailabilityStore(os.path.join(self.directory.name, "partitions"), 0, 0),
+                ArchiveAvailabilityStore(os.path.join(self.directory.name, "availability.archive"), block_rows=8)]
+
+    def test_every_store_gives_back_the_rows_it_saved(self):
+        for store in self.stores():
+            with self.subTest(store=store):
+                store.save_rows(self.rows[:20])
+                store.save_rows(self.rows[20:])
+                self.assertEqual([normalize(row) for row in store.iter_rows()],
+                                 [normalize(AvailabilityStore.encode_row(row)) for row in self.rows])
+
+    def test_every_store_applies_the_same_filters(self):
+        start, end = self.rows[5][2], self.rows[25][2]
+        expected = [normalize(row) for row in self.rows
+                    if row[0] == "device-1" and start <= row[2] < end]
+        down = [normalize(row) for row in self.rows if row[1] == 0]
+        for store in self.stores():
+            with self.subTest(store=store):
+                store.save_rows(self.rows)
+                self.assertEqual([normalize(row) for row in store.iter_rows("device-1", start, end)], expected)
+                self.assertEqual([normalize(row) for row in store.iter_rows(status=0)], down)
+                self.assertEqual(list(store.iter_rows("unknown")), [])
+                self.assertEqual(normalize(store.latest_rows()["device-2"]), normalize(self.rows[-1]))
+
+
+class RowFilterTest(unittest.TestCase):
+
+    def test_time_filters_compare_iso_and_epoch_timestamps_alike(self):
+        times = [datetime(2024, 1, 1, 12, 0, second) for second in range(6)]
+        # Legacy rows hold str(datetime) timestamps, later rows epoch microseconds.
+        rows = [["a", "1", str(timestamp)] for timestamp in times[:3]]
+        rows += [["a", "1", str(encode_timestamp(timestamp))] for timestamp in times[3:]]
+        matches = AvailabilityStore.row_filter(None, times[1], times[4], None)
+        self.assertEqual([row[2] for row in rows if matches(row)],
+                         [str(times[1]), str(times[2]), str(encode_timestamp(times[3]))])
+        matches = AvailabilityStore.row_filter("a", None, times[3], 1)
+        self.assertEqual(len([row for row in rows if matches(row)]), 3)
+        matches = AvailabilityStore.row_filter("b", None, None, None)
+        self.assertFalse(any(matches(row) for row in rows))
+
+    def test_csv_store_filters_legacy_and_new_rows(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "availability.csv")
+            with open(filename, "w") as file:
+                file.write(LEGACY_CSV)
+            store = CSVAvailabilityStore(filename)
+            store.save_rows([["router", 0, datetime(2024, 1, 1)]])
+            self.assertEqual([row[0] for row in store.iter_rows(start=datetime(2023, 7, 28, 16))], ["mobile", "router"])
+            self.assertEqual([row[0] for row in store.iter_rows(start=datetime(2023, 7, 29))], ["router"])
+            self.assertEqual([row[0] for row in store.iter_rows(end=datetime(2023, 7, 29))], ["mobile"])
+
+
+class ArchiveAvailabilityStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, "availability.archive")
+        self.store = ArchiveAvailabilityStore(self.filename, block_rows=10)
+        self.rows = make_rows(30, datetime(2024, 1, 1))
+        self.store.save_rows(self.rows)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def block_offsets(self) -> list[tuple[int, tuple]]:
+        with open(self.filename, "rb") as file:
+            return list(self.store._iter_blocks(file))
+
+    def read_rows(self) -> tuple[list[list], str]:
+        output = StringIO()
+        with redirect_stdout(output):
+            rows = [normalize(row) for row in ArchiveAvailabilityStore(self.filename).iter_rows()]
+        return rows, output.getvalue()
+
+    def test_block_headers_hold_the_counts_and_time_range_of_their_rows(self):
+        headers = [header for _, header in self.block_offsets()]
+        self.assertEqual([header[:2] for header in headers], [(10, 7), (10, 7), (10, 6)])
+        self.assertEqual([header[2] for header in headers], [3, 3, 3])
+        self.assertEqual(headers[1][3:5], (encode_timestamp(self.rows[10][2]), encode_timestamp(self.rows[19][2])))
+
+    def test_block_with_a_crc_mismatch_is_skipped_and_reported(self):
+        offset, header = self.block_offsets()[1]
+        corrupt_at = offset + ArchiveAvailabilityStore.block_header.size + header[5] + header[6] // 2
+        with open(self.filename, "r+b") as file:
+            file.seek(corrupt_at)
+            byte = file.read(1)
+            file.seek(corrupt_at)
+            file.write(bytes([byte[0] ^ 0xFF]))
+        rows, output = self.read_rows()
+        self.assertEqual(rows, [normalize(row) for row in self.rows[:10] + self.rows[20:]])
+        self.assertIn(f"{constants.archive_block_corrupt} {offset}", output)
+
+    def test_truncated_trailing_block_is_ignored_then_overwritten(self):
+        with open(self.filename, "r+b") as file:
+            file.truncate(os.path.getsize(self.filename) - 5)
+        rows, _ = self.read_rows()
+        self.assertEqual(rows, [normalize(row) for row in self.rows[:20]])
+        more_rows = make_rows(3, datetime(2024, 1, 2))
+        ArchiveAvailabilityStore(self.filename).save_rows(more_rows)
+        rows, output = self.read_rows()
+        self.assertEqual(rows, [normalize(row) for row in self.rows[:20] + more_rows])
+        self.assertEqual(output, "")
+        self.assertEqual(len(self.block_offsets()), 3)
+
+    def test_file_that_is_not_an_archive_is_refused(self):
+        with open(self.filename, "wb") as file:
+            file.write(b"Device Id,Status,Timestamp\n")
+        with self.assertRaises(ValueError):
+            list(self.store.iter_rows())
+
+
+class CSVAvailabilityStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, "availability.csv")
+        with open(self.filename, "w") as file:
+            file.write(LEGACY_CSV)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def read_lines(self) -> list[str]:
+        with open(self.filename) as file:
+            return file.read().splitlines()
+
+    def test_headers_of_a_legacy_file_are_replaced_before_appending(self):
+        store = CSVAvailabilityStore(self.filename)
+        store.save_rows([["router", 0, datetime(2024, 1, 1), None, None, None, None, 100.0]])
+        lines = self.read_lines()
+        self.assertEqual(lines[0], ",".join(AvailabilityStore.headers))
+        self.assertEqual(lines[1], "mobile,1,2023-07-28 16:18:09.901870")
+        self.assertEqual([row[0] for row in store.iter_rows()], ["mobile", "router"])
+
+    def test_writer_replaces_the_headers_of_a_legacy_file(self):
+        store = CSVAvailabilityStore(self.filename)
+        writer = store.open_writer()
+        try:
+            writer.write_rows([["router", 1, datetime(2024, 1, 1), 0.001, 0.001, 0.001, 0.0, 0.0]])
+        finally:
+            writer.close()
+        self.assertEqual(self.read_lines()[0], ",".join(AvailabilityStore.headers))
+        self.assertEqual(len(self.read_lines()), 3)
+
+
+class PartitionedCSVAvailabilityStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = PartitionedCSVAvailabilityStore(self.directory.name, compress_after_days=7)
+        # Old enough to be compressed, but not deleted, by the retention policy.
+        self.time = datetime.combine(datetime.now().date() - timedelta(days=20), datetime.min.time())
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def device_ids(self) -> list[str]:
+        return [row[0] for row in self.store.iter_rows()]
+
+    def test_rows_written_to_a_compressed_day_are_merged_into_it(self):
+        self.store.save_rows([["a", 1, self.time]])
+        self.assertEqual(os.listdir(self.directory.name), [f"{self.time.date()}.csv.gz"])
+        self.store.save_rows([["b", 1, self.time + timedelta(seconds=1)]])
+        self.assertEqual(os.listdir(self.directory.name), [f"{self.time.date()}.csv.gz"])
+        self.assertEqual(self.device_ids(), ["a", "b"])
+        self.store.save_rows([["c", 1, self.time + timedelta(seconds=2)]])
+        self.assertEqual([row[:3] for row in self.store.iter_rows()],
+                         [[device_id, "1", str(encode_timestamp(self.time + timedelta(seconds=second)))]
+                          for second, device_id in enumerate("abc")])
+
+    def test_rows_of_a_compressed_day_and_of_its_plain_partition_are_both_read(self):
+        self.store.save_rows([["a", 1, self.time]])
+        # Rows written late, before the retention policy merges them.
+        self.store.compress_after_days = 0
+        self.store.save_rows([["b", 1, self.time + timedelta(seconds=1)]])
+        self.assertEqual(sorted(os.listdir(self.directory.name)),
+                         [f"{self.time.date()}.csv", f"{self.time.date()}.csv.gz"])
+        self.assertEqual(self.device_ids(), ["a", "b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
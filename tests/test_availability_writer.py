@@ -0,0 +1,149 @@
+"""
+Tests of the retries of the AvailabilityWriter, and of the store writers leaving nothing of a failed batch behind.
+"""
+import os
+import sys
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import AvailabilityStore  # noqa: E402
+from AvailabilityStore import (ArchiveAvailabilityStore, AvailabilityStoreWriter,  # noqa: E402
+                               CSVAvailabilityStore, PartitionedCSVAvailabilityStore)
+from AvailabilityWriter import AvailabilityWriter  # noqa: E402
+
+
+# Two seconds before midnight, so that a batch spans two partitions that the retention policy keeps.
+MIDNIGHT: datetime = datetime.combine(date.today(), datetime.min.time())
+
+
+def rows(count: int, start: datetime = MIDNIGHT - timedelta(seconds=2)) -> list[list]:
+    return [[f"device-{number}", 1, start + timedelta(seconds=number)] for number in range(count)]
+
+
+class FailingWrites:
+    """
+    Makes the next 'failures' appends of the store writers write the first half of their data, and then fail like a
+    full disk.
+    """
+
+    def __init__(self, failures: int):
+        self.failures: int = failures
+        self.append_rows = AvailabilityStoreWriter._append_rows
+
+    def __enter__(self):
+        def append_rows(file, rows_to_append) -> None:
+            rows_to_append = list(rows_to_append)
+            if self.failures and rows_to_append and rows_to_append[0][0] != "device_id":
+                self.failures -= 1
+                self.append_rows(file, rows_to_append[:len(rows_to_append) // 2])
+                raise OSError(28, "No space left on device")
+            self.append_rows(file, rows_to_append)
+
+        AvailabilityStoreWriter._append_rows = staticmethod(append_rows)
+        return self
+
+    def __exit__(self, *exc_info):
+        AvailabilityStoreWriter._append_rows = staticmethod(self.append_rows)
+
+
+class AvailabilityWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_with_failures(self, store, failures: int, flush_retries: int = 5) -> AvailabilityWriter:
+        writer = AvailabilityWriter(store, flush_interval=0.01, flush_retries=flush_retries)
+        with FailingWrites(failures):
+            writer.submit(rows(10))
+            writer.flush()
+        return writer
+
+    def test_retried_csv_batch_is_written_once(self):
+        store = CSVAvailabilityStore(os.path.join(self.directory.name, "availability.csv"))
+        self.write_with_failures(store, failures=2).close()
+        self.assertEqual([row[0] for row in store.iter_rows()], [f"device-{number}" for number in range(10)])
+
+    def test_retried_partitioned_batch_is_written_once(self):
+        # The rows of the batch span two days, so two partitions are appended to.
+        store = PartitionedCSVAvailabilityStore(os.path.join(self.directory.name, "partitions"))
+        store.save_rows(rows(1, MIDNIGHT - timedelta(hours=1)))
+        self.write_with_failures(store, failures=1).close()
+        self.assertEqual(sorted(row[0] for row in store.iter_rows()),
+                         sorted(["device-0"] + [f"device-{number}" for number in range(10)]))
+
+    def test_failed_archive_batch_leaves_no_block(self):
+        store = ArchiveAvailabilityStore(os.path.join(self.directory.name, "availability.archive"), block_rows=4)
+        store.save_rows(rows(2))
+        size = os.path.getsize(store.filename)
+
+        class HalfWrittenFile:
+            """
+            File writing half of its first write, and failing like a full disk afterwards.
+            """
+
+            def __init__(self, file):
+                self.file = file
+                self.writes = 0
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc_info):
+                self.file.close()
+
+            def __getattr__(self, name):
+                return getattr(self.file, name)
+
+            def write(self, data) -> int:
+                self.writes += 1
+                if self.writes > 1:
+                    raise OSError(28, "No space left on device")
+                return self.file.write(data[:len(data) // 2])
+
+        AvailabilityStore.open = lambda *args, **kwargs: HalfWrittenFile(open(*args, **kwargs))
+        try:
+            with self.assertRaises(OSError):
+                store.save_rows(rows(10))
+        finally:
+            del AvailabilityStore.open
+        self.assertEqual(os.path.getsize(store.filename), size)
+        store.save_rows(rows(10))
+        self.assertEqual(len(list(store.iter_rows())), 12)
+
+    def test_flush_gives_up_after_the_retries(self):
+        store = CSVAvailabilityStore(os.path.join(self.directory.name, "availability.csv"))
+        writer = AvailabilityWriter(store, flush_interval=0.01, flush_retries=2)
+        try:
+            with FailingWrites(failures=1000):
+                writer.submit(rows(10))
+                with self.assertRaises(OSError):
+                    writer.flush()
+            # The rows stay queued and are saved once the writes succeed again.
+            writer.flush(timeout=5)
+        finally:
+            writer.close()
+        self.assertEqual(len(list(store.iter_rows())), 10)
+
+    def test_batch_that_cannot_be_encoded_is_dropped_without_stopping_the_writer(self):
+        store = CSVAvailabilityStore(os.path.join(self.directory.name, "availability.csv"))
+        writer = AvailabilityWriter(store, queue_size=4, flush_interval=0.01)
+        try:
+            writer.submit([["device-0", "not a status", MIDNIGHT]])
+            with self.assertRaises(ValueError):
+                writer.flush(timeout=5)
+            # More rows than the queue holds, which only returns while the writer thread runs.
+            writer.submit(rows(10))
+            writer.flush(timeout=5)
+        finally:
+            writer.close()
+        self.assertEqual(len(list(store.iter_rows())), 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+"""
+Tests of the rows the DeviceAvailabilityDataManager gives back to its callers.
+"""
+import os
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from datetime import datetime
+from io import StringIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import constants  # noqa: E402
+from DeviceAvailabilityDataManager import DeviceAvailabilityDataManager  # noqa: E402
+
+
+class DeviceAvailabilityDataManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.working_directory = os.getcwd()
+        os.chdir(self.directory.name)
+        with open(constants.device_data_availability_filename, "w") as file:
+            file.write("Device Id,Status,Timestamp\nmobile,1,2023-07-28 16:18:09.901870\n")
+
+    def tearDown(self):
+        os.chdir(self.working_directory)
+        self.directory.cleanup()
+
+    def test_loaded_rows_hold_datetime_strings_whatever_the_backend(self):
+        for storage_backend in ("csv", "sqlite", "archive"):
+            with self.subTest(storage_backend=storage_backend), redirect_stdout(StringIO()):
+                manager = DeviceAvailabilityDataManager(storage_backend=storage_backend)
+                manager.save_device_availability_data_file([["router", 1, datetime(2024, 1, 1, 12, 0, 0, 5)]])
+                rows = manager.load_device_availability_data_file()
+                self.assertEqual(rows[-1][:3], ["router", rows[-1][1], "2024-01-01 12:00:00.000005"])
+                self.assertEqual(datetime.fromisoformat(rows[-1][2]), datetime(2024, 1, 1, 12, 0, 0, 5))
+        self.assertEqual(rows[0][:3], ["Device Id", "Status", "Timestamp"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,168 @@
+"""
+Tests of the device data journal shared by several processes, and of the bulk import and export of devices.
+"""
+import ipaddress
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import constants  # noqa: E402
+from DeviceDataManager import DeviceDataManager  # noqa: E402
+
+
+class DeviceDataManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.working_directory = os.getcwd()
+        os.chdir(self.directory.name)
+        self.output = redirect_stdout(StringIO())
+        self.output.__enter__()
+
+    def tearDown(self):
+        self.output.__exit__(None, None, None)
+        os.chdir(self.working_directory)
+        self.directory.cleanup()
+
+    def test_compaction_waits_for_and_keeps_the_entries_of_another_process(self):
+        first, second = DeviceDataManager(), DeviceDataManager()
+        for number in range(1, constants.device_data_journal_compaction_threshold - 1):
+            first.add_device(f"device-{number}", f"Device {number}", f"10.0.0.{number % 250}")
+        # The next append of the first process compacts the journal.
+        with first.lock_device_data_files():
+            appending = threading.Thread(target=second.add_device, args=("other-device", "Other", "10.0.1.1"))
+            appending.start()
+            appending.join(0.2)
+            self.assertTrue(appending.is_alive())
+        appending.join()
+        first.add_device("last-device", "Last", "10.0.1.2")
+        self.assertFalse(os.path.isfile(constants.device_data_journal_filename))
+        devices_data: dict[str, dict] = DeviceDataManager().load_device_data_file()
+        self.assertEqual(len(devices_data), constants.device_data_journal_compaction_threshold)
+        self.assertIn("other-device", devices_data)
+
+    @mock.patch("DeviceDataManager.fcntl", None)
+    def test_append_without_flock_keeps_the_entries_appended_by_another_process(self):
+        first, second = DeviceDataManager(), DeviceDataManager()
+        first.add_device("device-1", "Device 1", "10.0.0.1")
+        second.load_device_data_file()
+        first_load = first.load_device_data_file
+        appended: list[bool] = []
+
+        def load_then_let_second_append() -> dict[str, dict]:
+            # The other process appends between the load and the append of this one.
+            devices_data = first_load()
+            if not appended:
+                appended.append(True)
+                second.add_device("device-2", "Device 2", "10.0.0.2")
+            return devices_data
+
+        first.load_device_data_file = load_then_let_second_append
+        try:
+            first.append_device_data_journal([{"op": "set", "id": "device-3",
+                                               "data": {"name": "Device 3", "ip": "10.0.0.3"}}])
+        finally:
+            del first.load_device_data_file
+        self.assertEqual(set(first.load_device_data_file()), {"device-1", "device-2", "device-3"})
+        self.assertEqual(set(DeviceDataManager().load_device_data_file()), {"device-1", "device-2", "device-3"})
+
+    def test_entry_cut_short_is_skipped_on_load_and_cut_off_on_append(self):
+        manager = DeviceDataManager()
+        manager.add_device("device-1", "Device 1", "10.0.0.1")
+        with open(constants.device_data_journal_filename, "a") as journal:
+            journal.write('{"op": "set", "id": "device-')
+        journal_size = os.path.getsize(constants.device_data_journal_filename)
+        reader = DeviceDataManager()
+        self.assertEqual(set(reader.load_device_data_file()), {"device-1"})
+        self.assertEqual(os.path.getsize(constants.device_data_journal_filename), journal_size)
+        reader.add_device("device-2", "Device 2", "10.0.0.2")
+        self.assertEqual(set(DeviceDataManager().load_device_data_file()), {"device-1", "device-2"})
+
+
+
+def is_valid_ip(ip: str) -> bool:
+    try:
+        ipaddress.ip_address(ip)
+        return True
+    except ValueError:
+        return False
+
+
+class DeviceImportExportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.working_directory = os.getcwd()
+        os.chdir(self.directory.name)
+        self.output = StringIO()
+        self.redirect = redirect_stdout(self.output)
+        self.redirect.__enter__()
+
+    def tearDown(self):
+        self.redirect.__exit__(None, None, None)
+        os.chdir(self.working_directory)
+        self.directory.cleanup()
+
+    def test_invalid_records_are_skipped_and_the_rest_added_in_one_journal_entry_batch(self):
+        with open("devices.csv", "w") as file:
+            file.write("id,name,ip,probe,site\n"
+                       "router,Router,10.0.0.1,,paris\n"
+                       "router,Duplicate,10.0.0.2,,\n"
+                       "bad id,Spaces,10.0.0.3,,\n"
+                       "nameless,,10.0.0.4,,\n"
+                       "printer,Printer,not-an-ip,,\n"
+                       "web,Web,10.0.0.5,tcp:443,\n"
+                       "odd,Odd probe,10.0.0.6,carrier-pigeon,\n")
+        manager = DeviceDataManager()
+        manager.import_devices("devices.csv", is_valid_ip)
+        self.assertEqual(DeviceDataManager().load_device_data_file(),
+                         {"router": {"name": "Router", "ip": "10.0.0.1", "site": "paris"},
+                          "web": {"name": "Web", "ip": "10.0.0.5", "probe": "tcp:443"}})
+        self.assertIn(f"2 {constants.devices_imported_successfully}, 5 skipped", self.output.getvalue())
+        with open(constants.device_data_journal_filename) as journal:
+            self.assertEqual(len(journal.readlines()), 2)
+
+    def test_exported_devices_are_imported_back_unchanged_in_every_format(self):
+        manager = DeviceDataManager()
+        manager.add_devices([{"id": "router", "name": "Router", "ip": "10.0.0.1", "site": "paris"},
+                             {"id": "web", "name": "Web", "ip": "2001:db8::1", "probe": "tcp:443"}], is_valid_ip)
+        devices_data = dict(manager.load_device_data_file())
+        for filename in ("devices.csv", "devices.json", "devices.jsonl"):
+            with self.subTest(filename=filename), tempfile.TemporaryDirectory() as directory:
+                manager.export_devices(filename)
+                os.chdir(directory)
+                try:
+                    importer = DeviceDataManager()
+                    importer.import_devices(os.path.join(self.directory.name, filename), is_valid_ip)
+                    self.assertEqual(importer.load_device_data_file(), devices_data)
+                finally:
+                    os.chdir(self.directory.name)
+
+    def test_json_file_holding_a_list_of_devices_is_imported(self):
+        with open("devices.json", "w") as file:
+            json.dump([{"id": "router", "name": "Router", "ip": "10.0.0.1"}, "not a device"], file)
+        DeviceDataManager().import_devices("devices.json", is_valid_ip)
+        self.assertEqual(set(DeviceDataManager().load_device_data_file()), {"router"})
+        self.assertIn("Record 2: Skipped", self.output.getvalue())
+
+    def test_unreadable_and_unsupported_files_add_nothing(self):
+        with open("devices.json", "w") as file:
+            file.write('"just a string"')
+        manager = DeviceDataManager()
+        manager.import_devices("devices.json", is_valid_ip)
+        manager.import_devices("devices.txt", is_valid_ip)
+        self.assertIn(constants.invalid_device_file, self.output.getvalue())
+        self.assertIn(constants.unsupported_device_file_format, self.output.getvalue())
+        self.assertEqual(manager.load_device_data_file(), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+"""
+Tests of the reply matching of the ICMPSweepManager, against a fake socket that answers the recorded requests.
+"""
+import os
+import socket
+import struct
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ICMPSweepManager import (ICMP_ECHO_REPLY, ICMPV6_ECHO_REPLY, ICMPV6_ECHO_REQUEST,  # noqa: E402
+                              ICMPSweepManager)
+
+
+def reply_to(packet: bytes, icmp_type: int = ICMP_ECHO_REPLY, identifier: int | None = None,
+             sequence: int | None = None) -> bytes:
+    """
+    Build the echo reply to an echo request, optionally with another identifier or sequence number.
+    """
+    _, _, _, request_identifier, request_sequence = struct.unpack("!BBHHH", packet[:8])
+    return struct.pack("!BBHHH", icmp_type, 0, 0, request_identifier if identifier is None else identifier,
+                       request_sequence if sequence is None else sequence) + packet[8:]
+
+
+class FakeICMPSocket:
+    """
+    Socket recording the echo requests of a sweep, and delivering the replies built by 'respond' from all of them
+    once the sweep starts receiving.
+    """
+
+    def __init__(self, respond: callable, socket_type: int = socket.SOCK_RAW):
+        self.respond: callable = respond
+        self.type: int = socket_type
+        self.sent: list[tuple[bytes, str]] = []
+        self.replies: list[tuple[bytes, tuple[str, int]]] | None = None
+        self.blocking: bool = True
+
+    def setblocking(self, blocking: bool) -> None:
+        self.blocking = blocking
+
+    def settimeout(self, timeout: float) -> None:
+        self.blocking = True
+
+    def sendto(self, packet: bytes, address: tuple[str, int]) -> int:
+        self.sent.append((packet, address[0]))
+        return len(packet)
+
+    def recvfrom(self, size: int) -> tuple[bytes, tuple[str, int]]:
+        if self.replies is None:
+            self.replies = [(reply, (source, 0)) for reply, source in self.respond(self.sent)]
+        if not self.replies:
+            raise socket.timeout if self.blocking else BlockingIOError
+        return self.replies.pop(0)
+
+    def close(self) -> None:
+        pass
+
+
+class ICMPSweepManagerTest(unittest.TestCase):
+
+    def sweep(self, ips: list[str], respond: callable, count: int = 1,
+              socket_type: int = socket.SOCK_RAW) -> dict[str, dict]:
+        manager = ICMPSweepManager(timeout=0.05, count=count,
+                                   socket_factory=lambda family: FakeICMPSocket(respond, socket_type))
+        return manager.sweep(ips)
+
+    def test_replies_are_matched_in_any_order(self):
+        results = self.sweep(["10.0.0.1", "10.0.0.2", "10.0.0.3"],
+                             lambda sent: [(reply_to(packet), ip) for packet, ip in reversed(sent)], count=2)
+        for result in results.values():
+            self.assertEqual(len(result["rtts"]), 2)
+            self.assertEqual(result["loss"], 0.0)
+
+    def test_reply_is_matched_by_source_address_and_sequence(self):
+        # 10.0.0.2 answers with the sequence number of the request sent to 10.0.0.1, which 10.0.0.1 never answers.
+        def respond(sent):
+            sequences = {ip: struct.unpack("!H", packet[6:8])[0] for packet, ip in sent}
+            packet = next(packet for packet, ip in sent if ip == "10.0.0.2")
+            return [(reply_to(packet, sequence=sequences["10.0.0.1"]), "10.0.0.2"), (reply_to(packet), "10.0.0.2")]
+
+        results = self.sweep(["10.0.0.1", "10.0.0.2"], respond)
+        self.assertIsNone(results["10.0.0.1"]["rtt"])
+        self.assertEqual(results["10.0.0.1"]["loss"], 100.0)
+        self.assertEqual(len(results["10.0.0.2"]["rtts"]), 1)
+
+    def test_duplicate_replies_are_counted_once(self):
+        results = self.sweep(["10.0.0.1"], lambda sent: [(reply_to(sent[0][0]), "10.0.0.1")] * 3, count=2)
+        self.assertEqual(len(results["10.0.0.1"]["rtts"]), 1)
+        self.assertEqual(results["10.0.0.1"]["loss"], 50.0)
+
+    def test_identifier_is_checked_on_raw_sockets_only(self):
+        def respond(sent):
+            return [(reply_to(packet, identifier=0xBEEF ^ struct.unpack("!H", packet[4:6])[0]), ip)
+                    for packet, ip in sent]
+
+        self.assertIsNone(self.sweep(["10.0.0.1"], respond)["10.0.0.1"]["rtt"])
+        self.assertIsNotNone(self.sweep(["10.0.0.1"], respond, socket_type=socket.SOCK_DGRAM)["10.0.0.1"]["rtt"])
+
+    def test_ipv6_replies_are_matched_by_canonical_address(self):
+        # A raw ICMPv6 socket pinging a local address also receives its own echo request.
+        def respond(sent):
+            self.assertTrue(all(packet[0] == ICMPV6_ECHO_REQUEST for packet, _ in sent))
+            return [reply for packet, ip in sent
+                    for reply in ((packet, ip), (reply_to(packet, ICMPV6_ECHO_REPLY), ip))]
+
+        results = self.sweep(["0:0::1", "::1", "2001:DB8::1"], respond, count=2)
+        self.assertEqual(len(results["0:0::1"]["rtts"]), 2)
+        self.assertEqual(results["::1"]["rtts"], results["0:0::1"]["rtts"])
+        self.assertEqual(results["2001:DB8::1"]["loss"], 0.0)
+
+    def test_invalid_addresses_are_reported_lost(self):
+        results = self.sweep(["not-an-ip"], lambda sent: [])
+        self.assertEqual(results["not-an-ip"], {"rtt": None, "rtts": [], "loss": 100.0})
+
+    def test_parse_echo_reply_strips_the_ipv4_header(self):
+        reply = reply_to(ICMPSweepManager.build_echo_request(7, 9))
+        ipv4_header = bytes([0x45]) + bytes(19)
+        self.assertEqual(ICMPSweepManager.parse_echo_reply(ipv4_header + reply), (7, 9))
+        self.assertEqual(ICMPSweepManager.parse_echo_reply(reply), (7, 9))
+        self.assertIsNone(ICMPSweepManager.parse_echo_reply(ICMPSweepManager.build_echo_request(7, 9)))
+        self.assertIsNone(ICMPSweepManager.parse_echo_reply(reply, ICMPV6_ECHO_REPLY))
+
+
+if __name__ == "__main__":
+    unittest.main()
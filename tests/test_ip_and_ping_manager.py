@@ -0,0 +1,46 @@
+"""
+Tests of the prober processes of the IPAndPingManager.
+"""
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import IPAndPingManager  # noqa: E402
+
+
+def reply_from_even_addresses(device_ip: str, timeout: float, verbose: bool) -> float | None:
+    return 0.002 if int(device_ip.rsplit(".", 1)[1]) % 2 == 0 else None
+
+
+class ProbeProcessTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.working_directory = os.getcwd()
+        os.chdir(self.directory.name)
+
+    def tearDown(self):
+        os.chdir(self.working_directory)
+        self.directory.cleanup()
+
+    def test_prober_process_only_pings_and_opens_no_data(self):
+        settings = {"concurrency": 4, "timeout": 1, "ping_engine": "pool", "rate": None, "verbose": False, "count": 2}
+        with mock.patch("IPAndPingManager.signal.signal"):
+            IPAndPingManager.init_probe_process(settings, reply_from_even_addresses)
+        manager = IPAndPingManager.probe_process_manager
+        self.assertIsNone(manager.device_data_manager)
+        self.assertIsNone(manager.device_availability_data_manager)
+        self.assertEqual(manager.processes, 1)
+        rows = IPAndPingManager.probe_devices_chunk({"even": {"name": "Even", "ip": "10.0.0.2"},
+                                                     "odd": {"name": "Odd", "ip": "10.0.0.3"}})
+        self.assertEqual([row[:2] + row[3:] for row in rows],
+                         [["even", 1, 0.002, 0.002, 0.002, 0.0, 0.0], ["odd", 0, None, None, None, None, 100.0]])
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+"""
+Tests of the Prometheus text rendering of the metrics.
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from MetricsManager import MetricsManager  # noqa: E402
+
+
+class MetricsManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics_manager = MetricsManager()
+
+    def samples(self) -> list[str]:
+        return [line for line in self.metrics_manager.render().splitlines() if not line.startswith("#")]
+
+    def test_labeled_metrics_without_series_have_no_sample(self):
+        lines = self.metrics_manager.render().splitlines()
+        self.assertIn("# TYPE device_up gauge", lines)
+        self.assertIn("# TYPE monitor_probes_total counter", lines)
+        self.assertFalse([line for line in self.samples()
+                          if line.split("{")[0].split(" ")[0] in ("device_up", "device_packet_loss_percent",
+                                                                  "monitor_probes_total")])
+        self.assertIn("monitor_probe_queue_depth 0", self.samples())
+        self.assertIn("monitor_ping_cycle_overruns_total 0", self.samples())
+
+    def test_labeled_metrics_render_their_series(self):
+        self.metrics_manager.set_gauge("device_up", 0, device_id="router")
+        self.metrics_manager.increment("monitor_probes_total", status="down")
+        self.metrics_manager.observe("device_rtt_seconds", 0.002, device_id="router")
+        samples = self.samples()
+        self.assertIn('device_up{device_id="router"} 0', samples)
+        self.assertIn('monitor_probes_total{status="down"} 1', samples)
+        self.assertIn('device_rtt_seconds_count{device_id="router"} 1', samples)
+        self.assertNotIn("device_up 0", samples)
+
+
+if __name__ == "__main__":
+    unittest.main()
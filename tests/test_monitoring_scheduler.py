@@ -0,0 +1,65 @@
+"""
+Tests of the adaptive per-device schedule of the monitoring loop.
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from MonitoringScheduler import MonitoringScheduler  # noqa: E402
+
+
+class MonitoringSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        # Without jitter, every due time is exact.
+        self.scheduler = MonitoringScheduler(default_interval=100, min_interval=10, fast_factor=0.25,
+                                             backoff_after=2, max_backoff=4, jitter=0)
+        self.scheduler.sync_devices({"stable": {}, "down": {}, "slow": {"interval": 400}}, now=0)
+
+    def intervals(self, device_id: str, statuses: list[int]) -> list[float]:
+        intervals: list[float] = []
+        for status in statuses:
+            due = self.scheduler.devices_state[device_id]["due"]
+            intervals.append(self.scheduler.record_result(device_id, status, now=due) - due)
+        return intervals
+
+    def test_stable_device_backs_off_up_to_the_maximum(self):
+        self.assertEqual(self.intervals("stable", [1] * 8), [100, 100, 200, 200, 400, 400, 400, 400])
+
+    def test_device_down_or_flapping_is_pinged_fast_until_stable_again(self):
+        self.assertEqual(self.intervals("down", [0, 0, 0, 0]), [25, 25, 100, 100])
+        self.assertEqual(self.intervals("down", [1, 0, 1, 1, 1]), [25, 25, 25, 25, 100])
+        self.assertEqual(self.intervals("stable", [1, 1, 1, 0]), [100, 100, 200, 25])
+
+    def test_fast_interval_is_not_below_the_minimum(self):
+        self.scheduler.fast_factor = 0.01
+        self.assertEqual(self.intervals("down", [0]), [10])
+
+    def test_due_devices_are_popped_in_due_order(self):
+        self.assertEqual(sorted(self.scheduler.pop_due_devices(now=0)), ["down", "slow", "stable"])
+        self.scheduler.record_result("stable", 1, now=0)
+        self.scheduler.record_result("down", 0, now=0)
+        self.scheduler.record_result("slow", 1, now=0)
+        self.assertEqual(self.scheduler.next_due_time(), 25)
+        self.assertEqual(self.scheduler.pop_due_devices(now=24), [])
+        self.assertEqual(self.scheduler.pop_due_devices(now=500), ["down", "stable", "slow"])
+
+    def test_schedule_does_not_drift_and_does_not_catch_up(self):
+        self.scheduler.pop_due_devices(now=0)
+        # A ping that ends late is scheduled from its due time, not from the time it ended.
+        self.assertEqual(self.scheduler.record_result("stable", 1, now=30), 100)
+        self.scheduler.pop_due_devices(now=100)
+        # A ping that overran its next slot is scheduled from now, without pinging again to catch up.
+        self.assertEqual(self.scheduler.record_result("stable", 1, now=250), 250)
+
+    def test_deleted_devices_are_no_longer_due(self):
+        self.scheduler.sync_devices({"stable": {}}, now=0)
+        self.assertEqual(self.scheduler.pop_due_devices(now=0), ["stable"])
+        self.assertEqual(self.scheduler.record_result("down", 0, now=0), 0)
+        self.assertIsNone(self.scheduler.next_due_time())
+
+
+if __name__ == "__main__":
+    unittest.main()
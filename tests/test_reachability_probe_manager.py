@@ -0,0 +1,72 @@
+"""
+Tests of the TCP and UDP probes of the ReachabilityProbeManager, against sockets of the loopback interface.
+"""
+import os
+import socket
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ReachabilityProbeManager import ReachabilityProbeManager  # noqa: E402
+
+
+def closed_port(socket_type: int) -> int:
+    """
+    Return a port of 127.0.0.1 that nothing listens on.
+    """
+    with socket.socket(socket.AF_INET, socket_type) as probe_socket:
+        probe_socket.bind(("127.0.0.1", 0))
+        return probe_socket.getsockname()[1]
+
+
+class ReachabilityProbeManagerTest(unittest.TestCase):
+
+    def probe(self, probe: str, count: int = 1) -> list[float]:
+        return ReachabilityProbeManager(timeout=1.0, count=count).probe_devices(
+            {"device": {"ip": "127.0.0.1", "probe": probe}})["device"]
+
+    def test_tcp_accepted_connection_is_up(self):
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as listener:
+            listener.bind(("127.0.0.1", 0))
+            listener.listen()
+            self.assertEqual(len(self.probe(f"tcp:{listener.getsockname()[1]}", count=2)), 2)
+
+    def test_tcp_refused_connection_is_down(self):
+        self.assertEqual(self.probe(f"tcp:{closed_port(socket.SOCK_STREAM)}"), [])
+
+    def test_udp_port_unreachable_is_up(self):
+        # The ICMP port unreachable error comes from the device, which is therefore up.
+        self.assertEqual(len(self.probe(f"udp:{closed_port(socket.SOCK_DGRAM)}")), 1)
+
+    def test_udp_answer_is_up(self):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as server:
+            server.bind(("127.0.0.1", 0))
+            server.settimeout(1.0)
+
+            def answer() -> None:
+                payload, address = server.recvfrom(2048)
+                server.sendto(payload, address)
+
+            answering = threading.Thread(target=answer)
+            answering.start()
+            rtts = self.probe(f"udp:{server.getsockname()[1]}")
+            answering.join()
+        self.assertEqual(len(rtts), 1)
+
+    def test_icmp_and_invalid_probes_are_not_probed(self):
+        results = ReachabilityProbeManager(timeout=0.1).probe_devices(
+            {"icmp": {"ip": "127.0.0.1"}, "invalid": {"ip": "127.0.0.1", "probe": "tcp:http"}})
+        self.assertEqual(results, {"icmp": [], "invalid": []})
+
+    def test_parse_probe(self):
+        self.assertEqual(ReachabilityProbeManager.parse_probe(None), ("icmp", None))
+        self.assertEqual(ReachabilityProbeManager.parse_probe(" TCP:22 "), ("tcp", 22))
+        self.assertEqual(ReachabilityProbeManager.parse_probe("udp")[0], "udp")
+        for probe in ("tcp", "tcp:0", "tcp:65536", "icmp:1", "http:80"):
+            self.assertIsNone(ReachabilityProbeManager.parse_probe(probe), probe)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+"""
+Tests of the split of the devices between workers by the ShardManager, and of its stability when workers change.
+"""
+import os
+import sys
+import unittest
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ShardManager import ShardManager  # noqa: E402
+
+DEVICE_IDS = [f"device-{device}" for device in range(20000)]
+WORKERS = [f"worker-{worker}" for worker in range(1, 5)]
+
+
+def assign(shard_manager: ShardManager) -> dict[str, str]:
+    return {device_id: shard_manager.get_worker(device_id) for device_id in DEVICE_IDS}
+
+
+class ShardManagerTest(unittest.TestCase):
+
+    def test_adding_a_worker_moves_about_one_in_n_plus_one_devices_to_it(self):
+        before = assign(ShardManager(WORKERS))
+        after = assign(ShardManager(WORKERS + ["worker-5"]))
+        moved = [device_id for device_id in DEVICE_IDS if before[device_id] != after[device_id]]
+        # 1/(N+1) of the devices, 20% of them, within the unevenness of the virtual nodes.
+        self.assertAlmostEqual(len(moved) / len(DEVICE_IDS), 1 / 5, delta=0.05)
+        self.assertEqual({after[device_id] for device_id in moved}, {"worker-5"})
+
+    def test_removing_a_worker_only_moves_its_devices(self):
+        before = assign(ShardManager(WORKERS))
+        after = assign(ShardManager(WORKERS[:-1]))
+        moved = {device_id for device_id in DEVICE_IDS if before[device_id] != after[device_id]}
+        self.assertEqual(moved, {device_id for device_id in DEVICE_IDS if before[device_id] == WORKERS[-1]})
+
+    def test_the_split_does_not_depend_on_the_order_of_the_workers(self):
+        self.assertEqual(assign(ShardManager(WORKERS)), assign(ShardManager(WORKERS[::-1])))
+
+    def test_every_worker_gets_a_slice_close_to_the_mean(self):
+        counts = Counter(assign(ShardManager(WORKERS)).values())
+        mean = len(DEVICE_IDS) / len(WORKERS)
+        self.assertEqual(set(counts), set(WORKERS))
+        self.assertTrue(all(0.7 * mean < count < 1.3 * mean for count in counts.values()), counts)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+"""
+Tests of the StatusSnapshot shared by several writers, and of the removal of devices.
+"""
+import os
+import struct
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import constants  # noqa: E402
+from StatusSnapshot import HEADER, RECORD, StatusSnapshot  # noqa: E402
+
+
+class StatusSnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, constants.device_status_snapshot_filename)
+        self.time = datetime(2024, 1, 1)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def rows(self, device_ids: list[str], status: int = 1) -> list[list]:
+        self.time += timedelta(seconds=1)
+        return [[device_id, status, self.time, 0.001, 0.001, 0.001, 0.0, 0.0] for device_id in device_ids]
+
+    def test_writer_follows_the_file_replaced_by_another_writer(self):
+        first, second = StatusSnapshot(self.filename, True), StatusSnapshot(self.filename, True)
+        try:
+            first.update(self.rows(["device-0"]))
+            # Enough devices for the first writer to grow the snapshot into a new file.
+            first.update(self.rows([f"device-{number}" for number in range(constants.status_snapshot_initial_slots)]))
+            second.update(self.rows(["device-0", "other-device"], status=0))
+        finally:
+            first.close()
+            second.close()
+        reader = StatusSnapshot(self.filename)
+        try:
+            statuses = reader.get_statuses()
+        finally:
+            reader.close()
+        self.assertEqual(len(statuses), constants.status_snapshot_initial_slots + 1)
+        self.assertEqual(statuses["device-0"]["status"], 0)
+        self.assertEqual(statuses["other-device"]["status"], 0)
+
+    def test_writer_sees_the_devices_added_by_another_writer(self):
+        first, second = StatusSnapshot(self.filename, True), StatusSnapshot(self.filename, True)
+        try:
+            first.update(self.rows(["device-0"]))
+            second.update(self.rows(["device-0"], status=0))
+            self.assertEqual(second.devices, 1)
+            self.assertEqual(first.get_status("device-0")["status"], 0)
+        finally:
+            first.close()
+            second.close()
+
+    def test_removed_devices_are_not_listed(self):
+        monitor = StatusSnapshot(self.filename, True)
+        try:
+            monitor.update(self.rows(["device-0", "device-1", "device-2"]))
+            deleting = StatusSnapshot(self.filename, True)
+            try:
+                self.assertEqual(deleting.remove(["device-1", "unknown-device"]), 1)
+            finally:
+                deleting.close()
+            monitor.update(self.rows(["device-2"], status=0))
+            self.assertEqual(set(monitor.get_statuses()), {"device-0", "device-2"})
+            self.assertIsNone(monitor.get_status("device-1"))
+            self.assertEqual(monitor.get_status("device-2")["status"], 0)
+        finally:
+            monitor.close()
+
+    def test_record_left_odd_by_a_dead_writer_is_skipped_then_repaired(self):
+        monitor = StatusSnapshot(self.filename, True)
+        try:
+            monitor.update(self.rows(["device-0", "device-1"]))
+            # A writer killed between the two increments of the sequence number of the record of device-0.
+            offset = HEADER.size + monitor.slots["device-0"] * RECORD.size
+            struct.pack_into("<I", monitor.map, offset, struct.unpack_from("<I", monitor.map, offset)[0] + 1)
+        finally:
+            monitor.close()
+        read_retries = constants.status_snapshot_read_retries
+        constants.status_snapshot_read_retries = 100
+        try:
+            reader = StatusSnapshot(self.filename)
+            try:
+                self.assertIsNone(reader.get_status("device-0"))
+                self.assertEqual(set(reader.get_statuses()), {"device-1"})
+                monitor = StatusSnapshot(self.filename, True)
+                try:
+                    monitor.update(self.rows(["device-0"], status=0))
+                finally:
+                    monitor.close()
+                self.assertEqual(reader.get_status("device-0")["status"], 0)
+                self.assertEqual(set(reader.get_statuses()), {"device-0", "device-1"})
+            finally:
+                reader.close()
+        finally:
+            constants.status_snapshot_read_retries = read_retries
+
+
+if __name__ == "__main__":
+    unittest.main()